@@ -0,0 +1,233 @@
+import os
+import pathlib
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from creation_bdd import utilise_dates_compactes
+from instrumentation import instrumenter_connexion
+
+# Accès partagé à la base : WAL, connexions en lecture seule pour les
+# rapports (mode=ro) et un seul écrivain par processus. En WAL, les lecteurs
+# ne bloquent pas l'écrivain et ne sont pas bloqués par lui ; entre deux
+# écrivains (processus différents), SQLite fait attendre jusqu'à
+# delai_attente secondes au lieu d'échouer immédiatement sur "database is locked".
+CHEMIN_BDD = 'ventes_magasin.db'
+DELAI_ATTENTE = 30.0    # en secondes
+
+def activer_wal(conn):
+    """Passe la base en WAL (réglage persistant, stocké dans le fichier)"""
+    mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+    if mode.lower() != 'wal':
+        raise sqlite3.OperationalError(f"Impossible de passer la base en WAL (mode {mode})")
+
+def ouvrir_connexion(chemin_bdd=CHEMIN_BDD, lecture_seule=False, delai_attente=DELAI_ATTENTE,
+                     check_same_thread=True):
+    """Ouvre une connexion à la base.
+
+    En lecture seule, la base est ouverte par une URI mode=ro : toute écriture
+    lève sqlite3.OperationalError. Sinon la base est passée en WAL, avec
+    synchronous=NORMAL (sûr en WAL, un fsync par checkpoint seulement).
+    """
+    if lecture_seule:
+        uri = pathlib.Path(chemin_bdd).absolute().as_uri() + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, timeout=delai_attente, check_same_thread=check_same_thread)
+    else:
+        if not os.path.exists(chemin_bdd):
+            raise FileNotFoundError(f"Base introuvable : {chemin_bdd}")
+        conn = sqlite3.connect(chemin_bdd, timeout=delai_attente, check_same_thread=check_same_thread)
+        activer_wal(conn)
+        conn.execute("PRAGMA synchronous = NORMAL")
+    # Sans effet si l'instrumentation (--profil) n'est pas activée
+    return instrumenter_connexion(conn)
+
+class PoolLecture:
+    """Pool de connexions en lecture seule, partageable entre threads.
+
+    Au plus taille connexions sont ouvertes ; un thread qui en demande une
+    alors qu'elles sont toutes prises attend qu'une soit rendue.
+    """
+
+    def __init__(self, chemin_bdd=CHEMIN_BDD, taille=4, delai_attente=DELAI_ATTENTE):
+        self.chemin_bdd = chemin_bdd
+        self.delai_attente = delai_attente
+        self.libres = queue.LifoQueue()
+        self.places = threading.BoundedSemaphore(taille)
+        self.ouvertes = []
+        self.verrou = threading.Lock()
+
+    @contextmanager
+    def connexion(self):
+        self.places.acquire()
+        try:
+            try:
+                conn = self.libres.get_nowait()
+            except queue.Empty:
+                conn = ouvrir_connexion(self.chemin_bdd, lecture_seule=True, delai_attente=self.delai_attente,
+                                        check_same_thread=False)
+                with self.verrou:
+                    self.ouvertes.append(conn)
+            try:
+                yield conn
+            finally:
+                # Une transaction de lecture laissée ouverte figerait l'instantané
+                # et empêcherait les checkpoints du WAL
+                if conn.in_transaction:
+                    conn.rollback()
+                self.libres.put(conn)
+        finally:
+            self.places.release()
+
+    def fermer(self):
+        with self.verrou:
+            for conn in self.ouvertes:
+                conn.close()
+            self.ouvertes = []
+        self.libres = queue.LifoQueue()
+
+class Ecrivain:
+    """Connexion d'écriture unique du processus ; les écritures des threads sont sérialisées"""
+
+    def __init__(self, chemin_bdd=CHEMIN_BDD, delai_attente=DELAI_ATTENTE):
+        self.conn = ouvrir_connexion(chemin_bdd, delai_attente=delai_attente, check_same_thread=False)
+        self.verrou = threading.Lock()
+
+    @contextmanager
+    def transaction(self):
+        """Exécute le bloc dans une transaction validée à la sortie, annulée en cas d'erreur"""
+        with self.verrou:
+            try:
+                yield self.conn
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+
+    def fermer(self):
+        with self.verrou:
+            self.conn.close()
+
+def copier_base(chemin_bdd, destination):
+    """Copie cohérente de la base (API de sauvegarde de SQLite, WAL compris)"""
+    source = sqlite3.connect(chemin_bdd)
+    copie = sqlite3.connect(destination)
+    source.backup(copie)
+    copie.close()
+    source.close()
+
+def percentile(valeurs, p):
+    if not valeurs:
+        return 0.0
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(p / 100 * len(valeurs)))]
+
+def mesurer_contention(chemin_bdd, nb_lecteurs, duree, journal, taille_lot_ecriture, delai_attente):
+    """Fait tourner nb_lecteurs threads de rapports contre un écrivain pendant duree secondes"""
+    from rapports import requetes_rapports
+
+    conn = sqlite3.connect(chemin_bdd)
+    conn.execute(f"PRAGMA journal_mode = {journal}")
+    requetes = list(requetes_rapports(conn).values())
+    colonne_date = 'jour_vente' if utilise_dates_compactes(conn) else 'date_vente'
+    conn.close()
+    # L'écrivain recopie les premières ventes de la table
+    insertion = f"""
+    INSERT INTO Ventes (id_produit, id_client, {colonne_date}, quantite, montant_total, mode_paiement)
+    SELECT id_produit, id_client, {colonne_date}, quantite, montant_total, mode_paiement
+    FROM Ventes ORDER BY id_vente LIMIT ?
+    """
+
+    pool = PoolLecture(chemin_bdd, taille=nb_lecteurs, delai_attente=delai_attente)
+    fin = time.perf_counter() + duree
+    latences, erreurs, ecritures = [], [], [0]
+    verrou = threading.Lock()
+
+    def lecteur(num):
+        i = num
+        while time.perf_counter() < fin:
+            debut = time.perf_counter()
+            try:
+                with pool.connexion() as conn:
+                    conn.execute(requetes[i % len(requetes)]).fetchall()
+                with verrou:
+                    latences.append(time.perf_counter() - debut)
+            except sqlite3.OperationalError as e:
+                with verrou:
+                    erreurs.append(str(e))
+            i += 1
+
+    def ecrivain():
+        # Même connexion que Ecrivain, mais sans forcer le WAL pour pouvoir comparer
+        conn = sqlite3.connect(chemin_bdd, timeout=delai_attente)
+        while time.perf_counter() < fin:
+            try:
+                conn.execute(insertion, (taille_lot_ecriture,))
+                conn.commit()
+                ecritures[0] += taille_lot_ecriture
+            except sqlite3.OperationalError as e:
+                conn.rollback()
+                with verrou:
+                    erreurs.append(str(e))
+        conn.close()
+
+    threads = [threading.Thread(target=lecteur, args=(num,)) for num in range(nb_lecteurs)]
+    threads.append(threading.Thread(target=ecrivain))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pool.fermer()
+
+    return {
+        'journal': journal,
+        'lectures_par_seconde': len(latences) / duree,
+        'latence_p50_ms': percentile(latences, 50) * 1000,
+        'latence_p95_ms': percentile(latences, 95) * 1000,
+        'ventes_ecrites_par_seconde': ecritures[0] / duree,
+        'erreurs': len(erreurs),
+    }
+
+def benchmark_contention(chemin_bdd=CHEMIN_BDD, nb_lecteurs=4, duree=5.0, taille_lot_ecriture=1000,
+                         delai_attente=DELAI_ATTENTE):
+    """Compare journal DELETE et WAL : nb_lecteurs threads de rapports contre un écrivain.
+
+    Le benchmark travaille sur une copie temporaire de la base, qui n'est
+    donc pas modifiée.
+    """
+    import tempfile
+
+    resultats = []
+    with tempfile.TemporaryDirectory() as dossier:
+        for journal in ('DELETE', 'WAL'):
+            copie = os.path.join(dossier, f"bench_{journal.lower()}.db")
+            copier_base(chemin_bdd, copie)
+            resultats.append(mesurer_contention(copie, nb_lecteurs, duree, journal, taille_lot_ecriture,
+                                                delai_attente))
+
+    print(f"{nb_lecteurs} lecteur(s) contre 1 écrivain pendant {duree:.0f} s")
+    print(f"{'journal':<8} {'lectures/s':>11} {'p50 (ms)':>9} {'p95 (ms)':>9} {'ventes écrites/s':>17} {'erreurs':>8}")
+    for r in resultats:
+        print(f"{r['journal']:<8} {r['lectures_par_seconde']:>11.1f} {r['latence_p50_ms']:>9.1f} "
+              f"{r['latence_p95_ms']:>9.1f} {r['ventes_ecrites_par_seconde']:>17,.0f} {r['erreurs']:>8}")
+    return resultats
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Accès partagé à la base et benchmark de contention")
+    parser.add_argument("action", choices=["wal", "benchmark"],
+                        help="wal : passer la base en WAL ; benchmark : N lecteurs contre 1 écrivain")
+    parser.add_argument("--lecteurs", type=int, default=4)
+    parser.add_argument("--duree", type=float, default=5.0, help="durée de chaque mesure en secondes")
+    parser.add_argument("--lot-ecriture", type=int, default=1000, help="ventes insérées par transaction")
+    parser.add_argument("--delai-attente", type=float, default=DELAI_ATTENTE,
+                        help="attente maximale d'un verrou en secondes")
+    args = parser.parse_args()
+
+    if args.action == "wal":
+        ouvrir_connexion(delai_attente=args.delai_attente).close()
+        print("Base passée en WAL.")
+    else:
+        benchmark_contention(nb_lecteurs=args.lecteurs, duree=args.duree, taille_lot_ecriture=args.lot_ecriture,
+                             delai_attente=args.delai_attente)
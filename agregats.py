@@ -0,0 +1,282 @@
+import pandas as pd
+from acces_bdd import ouvrir_connexion, Ecrivain
+
+# Tables d'agrégats journaliers par dimension. Les agrégats mensuels et par
+# catégorie s'en déduisent en ne lisant que ces petites tables.
+DIMENSIONS = {
+    "Agregat_jour_produit": "id_produit",
+    "Agregat_jour_client": "id_client",
+    "Agregat_jour_paiement": "mode_paiement",
+}
+
+# Les ventes sont intégrées par rafraichir_agregats() jusqu'à dernier_id_vente ;
+# les triggers ne répercutent que les modifications des ventes déjà intégrées.
+SCHEMA_ETAT = """
+CREATE TABLE IF NOT EXISTS Agregats_etat (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    dernier_id_vente INTEGER NOT NULL
+);
+"""
+
+SCHEMA_AGREGAT = """
+CREATE TABLE IF NOT EXISTS {table} (
+    jour TEXT NOT NULL,
+    cle NOT NULL,
+    ca REAL NOT NULL,
+    quantite INTEGER NOT NULL,
+    nb_ventes INTEGER NOT NULL,
+    PRIMARY KEY (jour, cle)
+) WITHOUT ROWID;
+"""
+
+# Agrégation d'une plage de ventes ; les ventes sans client (ou sans mode de
+# paiement) sont ignorées par la dimension correspondante, comme dans les rapports
+REQUETE_PLAGE = """
+SELECT date_vente, {cle}, SUM(montant_total), SUM(quantite), COUNT(*)
+FROM Ventes
+WHERE id_vente > ? AND id_vente <= ? AND {cle} IS NOT NULL
+GROUP BY date_vente, {cle}
+"""
+
+UPSERT_AGREGAT = """
+ON CONFLICT (jour, cle) DO UPDATE SET
+    ca = ca + excluded.ca,
+    quantite = quantite + excluded.quantite,
+    nb_ventes = nb_ventes + excluded.nb_ventes
+"""
+
+TRIGGERS_AGREGAT = """
+CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON Ventes
+WHEN NEW.id_vente <= (SELECT dernier_id_vente FROM Agregats_etat) AND NEW.{cle} IS NOT NULL
+BEGIN
+    INSERT INTO {table} VALUES (NEW.date_vente, NEW.{cle}, NEW.montant_total, NEW.quantite, 1)
+    {upsert};
+END;
+
+CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON Ventes
+WHEN OLD.id_vente <= (SELECT dernier_id_vente FROM Agregats_etat) AND OLD.{cle} IS NOT NULL
+BEGIN
+    UPDATE {table} SET ca = ca - OLD.montant_total, quantite = quantite - OLD.quantite,
+                       nb_ventes = nb_ventes - 1
+    WHERE jour = OLD.date_vente AND cle = OLD.{cle};
+    DELETE FROM {table} WHERE jour = OLD.date_vente AND cle = OLD.{cle} AND nb_ventes = 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS {table}_update_ancien AFTER UPDATE ON Ventes
+WHEN OLD.id_vente <= (SELECT dernier_id_vente FROM Agregats_etat) AND OLD.{cle} IS NOT NULL
+BEGIN
+    UPDATE {table} SET ca = ca - OLD.montant_total, quantite = quantite - OLD.quantite,
+                       nb_ventes = nb_ventes - 1
+    WHERE jour = OLD.date_vente AND cle = OLD.{cle};
+    DELETE FROM {table} WHERE jour = OLD.date_vente AND cle = OLD.{cle} AND nb_ventes = 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS {table}_update_nouveau AFTER UPDATE ON Ventes
+WHEN NEW.id_vente <= (SELECT dernier_id_vente FROM Agregats_etat) AND NEW.{cle} IS NOT NULL
+BEGIN
+    INSERT INTO {table} VALUES (NEW.date_vente, NEW.{cle}, NEW.montant_total, NEW.quantite, 1)
+    {upsert};
+END;
+"""
+
+# Requêtes des rapports servies par les agrégats (mêmes colonnes que les
+# requêtes de visualisation.py). Les totaux toutes ventes confondues sont lus
+# dans Agregat_jour_produit, id_produit n'étant jamais NULL.
+REQUETE_CA_MENSUEL_AGREGATS = """
+SELECT substr(jour, 1, 7) as mois,
+       SUM(ca) as ca_total,
+       SUM(nb_ventes) as nb_ventes
+FROM Agregat_jour_produit
+GROUP BY mois
+ORDER BY mois
+"""
+
+REQUETE_TOP_PRODUITS_AGREGATS = """
+SELECT p.nom_produit,
+       SUM(a.ca) as ca_total,
+       SUM(a.quantite) as quantite_totale
+FROM Agregat_jour_produit a
+JOIN Produits p ON a.cle = p.id_produit
+GROUP BY p.nom_produit
+ORDER BY ca_total DESC
+LIMIT 5
+"""
+
+REQUETE_HEATMAP_AGREGATS = """
+SELECT strftime('%w', jour) as jour_semaine,
+       '00' as heure,
+       SUM(nb_ventes) as nb_ventes
+FROM Agregat_jour_produit
+GROUP BY jour_semaine
+ORDER BY jour_semaine
+"""
+
+REQUETE_CLIENTS_AGREGATS = """
+SELECT c.frequence_achat,
+       SUM(a.nb_ventes) as nb_achats,
+       SUM(a.ca) as ca_total,
+       SUM(a.ca) / SUM(a.nb_ventes) as panier_moyen
+FROM Agregat_jour_client a
+JOIN Clients c ON a.cle = c.id_client
+GROUP BY c.frequence_achat
+"""
+
+REQUETE_TOP_CLIENTS_AGREGATS = """
+SELECT c.nom,
+       SUM(a.ca) as ca_total,
+       SUM(a.nb_ventes) as nb_achats
+FROM Agregat_jour_client a
+JOIN Clients c ON a.cle = c.id_client
+GROUP BY c.nom
+ORDER BY ca_total DESC
+LIMIT 5
+"""
+
+def agregats_actifs(conn):
+    """Indique si les tables d'agrégats existent dans la base"""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Agregats_etat'").fetchone() is not None
+
+def creer_triggers_agregats(conn):
+    """(Re)crée les triggers sur Ventes, par exemple après une reconstruction de la table"""
+    for table, cle in DIMENSIONS.items():
+        conn.executescript(TRIGGERS_AGREGAT.format(table=table, cle=cle, upsert=UPSERT_AGREGAT))
+
+def creer_agregats(chemin_bdd='ventes_magasin.db'):
+    """Crée les tables d'agrégats et leurs triggers, puis intègre toutes les ventes existantes"""
+    conn = ouvrir_connexion(chemin_bdd)
+    conn.execute(SCHEMA_ETAT)
+    conn.execute("INSERT OR IGNORE INTO Agregats_etat VALUES (1, 0)")
+    for table in DIMENSIONS:
+        conn.execute(SCHEMA_AGREGAT.format(table=table))
+    conn.commit()
+    creer_triggers_agregats(conn)
+    nb = rafraichir_agregats(conn)
+    conn.close()
+    print(f"Agrégats créés ({nb} ventes intégrées).")
+
+def rafraichir_agregats(conn):
+    """Intègre aux agrégats les ventes ajoutées depuis le dernier rafraîchissement.
+
+    Le coût dépend du nombre de nouvelles ventes, pas de l'historique.
+    Retourne le nombre de ventes intégrées.
+    """
+    dernier = conn.execute("SELECT dernier_id_vente FROM Agregats_etat").fetchone()[0]
+    nouveau = conn.execute("SELECT MAX(id_vente) FROM Ventes").fetchone()[0] or 0
+    if nouveau <= dernier:
+        return 0
+
+    for table, cle in DIMENSIONS.items():
+        conn.execute(f"INSERT INTO {table} " + REQUETE_PLAGE.format(cle=cle) + UPSERT_AGREGAT,
+                     (dernier, nouveau))
+    nb = conn.execute("SELECT COUNT(*) FROM Ventes WHERE id_vente > ? AND id_vente <= ?",
+                      (dernier, nouveau)).fetchone()[0]
+    conn.execute("UPDATE Agregats_etat SET dernier_id_vente = ?", (nouveau,))
+    conn.commit()
+    return nb
+
+def rafraichir_si_actifs(chemin_bdd='ventes_magasin.db'):
+    """Rafraîchit les agrégats avant une lecture, s'ils existent et qu'il y a de nouvelles ventes.
+
+    La vérification se fait en lecture seule ; la connexion d'écriture
+    (Ecrivain) n'est ouverte que s'il y a des ventes à intégrer, de sorte
+    qu'une base inchangée n'est pas modifiée. Retourne le nombre de ventes intégrées.
+    """
+    conn = ouvrir_connexion(chemin_bdd, lecture_seule=True)
+    en_retard = agregats_actifs(conn) and conn.execute(
+        "SELECT (SELECT MAX(id_vente) FROM Ventes) > dernier_id_vente FROM Agregats_etat").fetchone()[0]
+    conn.close()
+    if not en_retard:
+        return 0
+    ecrivain = Ecrivain(chemin_bdd)
+    with ecrivain.transaction() as ecriture:
+        nb = rafraichir_agregats(ecriture)
+    ecrivain.fermer()
+    return nb
+
+def verifier_agregats(chemin_bdd='ventes_magasin.db'):
+    """Compare chaque table d'agrégats à un recalcul complet depuis Ventes.
+
+    Les montants sont comparés au centime près. Retourne True si tout concorde.
+    """
+    conn = ouvrir_connexion(chemin_bdd, lecture_seule=True)
+    dernier = conn.execute("SELECT dernier_id_vente FROM Agregats_etat").fetchone()[0]
+    coherent = True
+    for table, cle in DIMENSIONS.items():
+        recalcul = REQUETE_PLAGE.format(cle=cle).replace("SUM(montant_total)", "ROUND(SUM(montant_total), 2)")
+        agregat = f"SELECT jour, cle, ROUND(ca, 2), quantite, nb_ventes FROM {table}"
+        ecarts = conn.execute(f"""
+        SELECT (SELECT COUNT(*) FROM (SELECT * FROM ({agregat}) EXCEPT SELECT * FROM ({recalcul})))
+             + (SELECT COUNT(*) FROM (SELECT * FROM ({recalcul}) EXCEPT SELECT * FROM ({agregat})))
+        """, (0, dernier, 0, dernier)).fetchone()[0]
+        if ecarts:
+            coherent = False
+        print(f"{table}: {'OK' if not ecarts else f'{ecarts} écart(s)'}")
+    conn.close()
+    return coherent
+
+def analyser_agregats(conn):
+    """Calcule produits_ca, categories_ca, ca_mensuel et ventes_client depuis les agrégats.
+
+    Les DataFrames ont la même forme que ceux de analyse_ventes.analyser_ventes().
+    """
+    produits_ca = pd.read_sql_query("""
+    SELECT p.nom_produit, SUM(a.quantite) as quantite, SUM(a.ca) as montant_total
+    FROM Agregat_jour_produit a
+    JOIN Produits p ON a.cle = p.id_produit
+    JOIN Categories cat ON p.id_categorie = cat.id_categorie
+    GROUP BY p.nom_produit
+    """, conn, index_col='nom_produit').sort_values('montant_total', ascending=False)
+
+    categories_ca = pd.read_sql_query("""
+    SELECT cat.nom_categorie, SUM(a.quantite) as quantite, SUM(a.ca) as montant_total,
+           SUM(a.nb_ventes) as nb_ventes
+    FROM Agregat_jour_produit a
+    JOIN Produits p ON a.cle = p.id_produit
+    JOIN Categories cat ON p.id_categorie = cat.id_categorie
+    GROUP BY cat.nom_categorie
+    """, conn, index_col='nom_categorie')
+    categories_ca.columns = pd.MultiIndex.from_tuples(
+        [('quantite', 'sum'), ('montant_total', 'sum'), ('montant_total', 'count')])
+    categories_ca = categories_ca.sort_values(('montant_total', 'sum'), ascending=False)
+
+    ca_mensuel = pd.read_sql_query("""
+    SELECT substr(a.jour, 1, 7) as mois, SUM(a.ca) as CA_total, SUM(a.nb_ventes) as nb_ventes
+    FROM Agregat_jour_produit a
+    JOIN Produits p ON a.cle = p.id_produit
+    JOIN Categories cat ON p.id_categorie = cat.id_categorie
+    GROUP BY mois
+    ORDER BY mois
+    """, conn)
+    ca_mensuel['mois'] = pd.PeriodIndex(ca_mensuel['mois'], freq='M')
+    ca_mensuel = ca_mensuel.set_index('mois')
+
+    ventes_client = pd.read_sql_query("""
+    SELECT c.nom as nom_client, c.prenom as prenom_client, SUM(a.ca) as CA_total,
+           SUM(a.nb_ventes) as nb_achats
+    FROM Agregat_jour_client a
+    JOIN Clients c ON a.cle = c.id_client
+    WHERE c.prenom IS NOT NULL
+    GROUP BY c.nom, c.prenom
+    """, conn, index_col=['nom_client', 'prenom_client']).sort_values('CA_total', ascending=False)
+
+    return produits_ca, categories_ca, ca_mensuel, ventes_client
+
+def main(argv=None, prog=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog=prog, description="Gestion des tables d'agrégats")
+    parser.add_argument("action", choices=["creer", "rafraichir", "verifier"])
+    args = parser.parse_args(argv)
+
+    if args.action == "creer":
+        creer_agregats()
+    elif args.action == "rafraichir":
+        conn = ouvrir_connexion('ventes_magasin.db')
+        print(f"{rafraichir_agregats(conn)} ventes intégrées.")
+        conn.close()
+    else:
+        verifier_agregats()
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,24 @@
-import sqlite3
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from datetime import datetime
+from creation_bdd import utilise_dates_compactes
+from agregats import agregats_actifs, analyser_agregats, rafraichir_si_actifs
+from cache_requetes import CacheRequetes
+from acces_bdd import ouvrir_connexion
+from statistiques import afficher_statistiques, statistiques_de_base
+import instrumentation
+from instrumentation import mesurer, compter_lignes, lire_sql
 
-def analyser_ventes():
-    # Connexion à la base de données
-    conn = sqlite3.connect('ventes_magasin.db')
-    
-    # 1. Extraction des données dans des DataFrames Pandas
-    # Requête pour obtenir les données de ventes avec les noms des produits et clients
-    query = """
-    SELECT 
+def requete_ventes(compact, avec_frequence=False):
+    """Jointure des ventes avec les noms des produits, clients et catégories"""
+    frequence = "c.frequence_achat," if avec_frequence else ""
+    return f"""
+    SELECT
         v.id_vente,
-        v.date_vente,
+        {'v.jour_vente as date_vente' if compact else 'v.date_vente'},
         p.nom_produit,
         p.prix_unitaire,
         c.nom as nom_client,
         c.prenom as prenom_client,
+        {frequence}
         v.quantite,
         v.montant_total,
         v.mode_paiement,
@@ -27,11 +28,373 @@ def analyser_ventes():
     LEFT JOIN Clients c ON v.id_client = c.id_client
     JOIN Categories cat ON p.id_categorie = cat.id_categorie
     """
+
+def sauvegarder_csv(produits_ca, categories_ca, ca_mensuel, ventes_client):
+    """Sauvegarde des résultats dans des fichiers CSV pour la visualisation.
+
+    Les montants sont arrondis au centime : les derniers chiffres d'une somme
+    de flottants dépendent de l'ordre d'addition, donc du mode d'analyse.
+    """
+    produits_ca.round(2).to_csv('produits_ca.csv')
+    categories_ca.round(2).to_csv('categories_ca.csv')
+    ca_mensuel.round(2).to_csv('ca_mensuel.csv')
+    ventes_client.round(2).to_csv('ventes_client.csv')
+
+COLONNES_CATEGORIELLES = ['nom_produit', 'nom_client', 'prenom_client', 'mode_paiement', 'nom_categorie']
+
+def convertir_dates(ventes_df, compact):
+    """Convertit date_vente en datetime (sans analyse de texte pour le schéma compact)"""
+    if compact:
+        ventes_df['date_vente'] = pd.to_datetime(ventes_df['date_vente'], unit='D')
+    else:
+        ventes_df['date_vente'] = pd.to_datetime(ventes_df['date_vente'], format='%Y-%m-%d')
+
+def compacter_ventes(ventes_df):
+    """Réduit l'empreinte mémoire de ventes_df.
+
+    Les colonnes texte à faible cardinalité deviennent catégorielles et les
+    entiers sont réduits ; montant_total reste en float64 pour que les sommes
+    soient identiques à celles du mode par défaut.
+    """
+    for colonne in COLONNES_CATEGORIELLES:
+        ventes_df[colonne] = ventes_df[colonne].astype('category')
+    ventes_df['id_vente'] = pd.to_numeric(ventes_df['id_vente'], downcast='integer')
+    ventes_df['quantite'] = pd.to_numeric(ventes_df['quantite'], downcast='integer')
+    ventes_df['prix_unitaire'] = ventes_df['prix_unitaire'].astype('float32')
+    return ventes_df
+
+def afficher_resultats(nb_ventes, ca_total, quantite_totale, produits_ca, categories_ca, ca_mensuel, ventes_client):
+    """Affiche les résultats des modes d'analyse qui ne chargent pas le détail des ventes"""
+    afficher_statistiques(nb_ventes, ca_total, quantite_totale)
+
+    print("\n=== Analyse par produit ===")
+    print("\nTop 10 des produits par chiffre d'affaires:")
+    print(produits_ca.head(10))
+    print("\n=== Analyse par catégorie ===")
+    print("\nChiffre d'affaires par catégorie:")
+    print(categories_ca)
+    print("\n=== Analyse temporelle ===")
+    print("\nChiffre d'affaires mensuel:")
+    print(ca_mensuel)
+    print("\n=== Analyse des clients ===")
+    print("\nTop 10 des clients par chiffre d'affaires:")
+    print(ventes_client.head(10))
+
+# Étapes du mode par défaut de analyser_ventes(), chronométrées aussi
+# séparément par benchmark.py
+
+def lire_ventes_df(conn, compact):
+    """Détail des ventes joint aux noms des produits, clients et catégories"""
+    return lire_sql(requete_ventes(compact), conn)
+
+def preparer_ventes_df(ventes_df, compact):
+    """Conversion de la date en datetime et typage compact des colonnes"""
+    convertir_dates(ventes_df, compact)
+    return compacter_ventes(ventes_df)
+
+def agreger_produits(ventes_df):
+    return ventes_df.groupby('nom_produit', observed=True).agg({
+        'quantite': 'sum',
+        'montant_total': 'sum'
+    }).sort_values('montant_total', ascending=False)
+
+def agreger_categories(ventes_df):
+    return ventes_df.groupby('nom_categorie', observed=True).agg({
+        'quantite': 'sum',
+        'montant_total': ['sum', 'count']
+    }).sort_values(('montant_total', 'sum'), ascending=False)
+
+def agreger_mois(ventes_df):
+    """CA et nombre de ventes par mois (ajoute la colonne mois à ventes_df)"""
+    ventes_df['mois'] = ventes_df['date_vente'].dt.to_period('M')
+    return ventes_df.groupby('mois').agg({
+        'montant_total': 'sum',
+        'id_vente': 'count'
+    }).rename(columns={'montant_total': 'CA_total', 'id_vente': 'nb_ventes'})
+
+def agreger_clients(ventes_df):
+    return ventes_df.groupby(['nom_client', 'prenom_client'], observed=True).agg({
+        'montant_total': 'sum',
+        'id_vente': 'count'
+    }).sort_values('montant_total', ascending=False).rename(columns={
+        'montant_total': 'CA_total',
+        'id_vente': 'nb_achats'
+    })
+
+def analyser_ventes_agregats(conn):
+    """Variante de analyser_ventes() servie par les tables d'agrégats.
+
+    Le détail des ventes n'est pas chargé : ventes_df vaut None. Les
+    agrégats doivent avoir été rafraîchis (rafraichir_si_actifs).
+    """
+    produits_ca, categories_ca, ca_mensuel, ventes_client = analyser_agregats(conn)
+
+    afficher_resultats(categories_ca[('montant_total', 'count')].sum(),
+                       categories_ca[('montant_total', 'sum')].sum(),
+                       categories_ca[('quantite', 'sum')].sum(),
+                       produits_ca, categories_ca, ca_mensuel, ventes_client)
+
+    return None, produits_ca, categories_ca, ca_mensuel, ventes_client
+
+def cumuler(total, partiel):
+    """Fusionne deux agrégats partiels (sommes et comptages) indexés par la clé de regroupement"""
+    if total is None:
+        return partiel
+    return pd.concat([total, partiel]).groupby(level=list(range(partiel.index.nlevels))).sum()
+
+def en_centimes(montants):
+    """Montants en centimes entiers : leurs sommes ne dépendent ni de l'ordre ni du découpage en blocs"""
+    return (montants.astype('float64') * 100).round().astype('int64')
+
+def agreger_chunk(chunk, compact):
+    """Agrégats partiels d'un bloc de la jointure (montants en centimes) : produits, catégories, mois, clients"""
+    convertir_dates(chunk, compact)
+    chunk['montant_total'] = en_centimes(chunk['montant_total'])
+    chunk['quantite'] = chunk['quantite'].astype('int64')
+    chunk['mois'] = chunk['date_vente'].dt.to_period('M')
+    return (
+        chunk.groupby('nom_produit').agg({
+            'quantite': 'sum',
+            'montant_total': 'sum'
+        }),
+        chunk.groupby('nom_categorie').agg({
+            'quantite': 'sum',
+            'montant_total': ['sum', 'count']
+        }),
+        chunk.groupby('mois').agg({
+            'montant_total': 'sum',
+            'id_vente': 'count'
+        }),
+        chunk.groupby(['nom_client', 'prenom_client']).agg({
+            'montant_total': 'sum',
+            'id_vente': 'count'
+        }),
+    )
+
+def analyser_ventes_par_chunks(conn, query, compact, taille_chunk):
+    """Variante de analyser_ventes() qui lit la jointure par blocs de taille_chunk lignes.
+
+    Chaque bloc est réduit en agrégats partiels (sommes et comptages) fusionnés
+    au fur et à mesure : la mémoire dépend de taille_chunk et du nombre de
+    groupes, pas du nombre de ventes. Les montants sont cumulés en centimes
+    entiers, puis ramenés en euros. ventes_df vaut None.
+    """
+    nb_ventes, centimes_total, quantite_totale = 0, 0, 0
+    # Agrégats vides mais typés comme ceux d'un bloc : point de départ, et
+    # résultat si la table Ventes est vide
+    partiels = agreger_chunk(pd.read_sql_query(query + " LIMIT 0", conn), compact)
+
+    for chunk in pd.read_sql_query(query, conn, chunksize=taille_chunk):
+        compter_lignes(conn, len(chunk))
+        with mesurer("agrégation d'un bloc", 'pandas', lignes=len(chunk)):
+            bloc = agreger_chunk(chunk, compact)
+            nb_ventes += len(chunk)
+            centimes_total += int(chunk['montant_total'].sum())
+            quantite_totale += int(chunk['quantite'].sum())
+            partiels = [cumuler(total, partiel) for total, partiel in zip(partiels, bloc)]
+
+    produits_ca, categories_ca, ca_mensuel, ventes_client = partiels
+    ca_total = centimes_total / 100
+    produits_ca['montant_total'] /= 100
+    categories_ca[('montant_total', 'sum')] /= 100
+    ca_mensuel['montant_total'] /= 100
+    ventes_client['montant_total'] /= 100
+
+    produits_ca = produits_ca.sort_values('montant_total', ascending=False)
+    categories_ca = categories_ca.sort_values(('montant_total', 'sum'), ascending=False)
+    ca_mensuel = ca_mensuel.rename(columns={'montant_total': 'CA_total', 'id_vente': 'nb_ventes'})
+    ventes_client = ventes_client.sort_values('montant_total', ascending=False).rename(columns={
+        'montant_total': 'CA_total',
+        'id_vente': 'nb_achats'
+    })
+
+    afficher_resultats(nb_ventes, ca_total, quantite_totale,
+                       produits_ca, categories_ca, ca_mensuel, ventes_client)
+
+    return None, produits_ca, categories_ca, ca_mensuel, ventes_client
+
+# Produits vendus absents de Produits, ou dont la catégorie n'existe pas :
+# leurs ventes sont écartées, comme par les jointures du mode pandas. La
+# recherche ne lit que l'index idx_ventes_produit_montant.
+REQUETE_PRODUITS_ORPHELINS = """
+SELECT id_produit
+FROM (SELECT DISTINCT id_produit FROM Ventes)
+WHERE id_produit NOT IN (SELECT p.id_produit
+                         FROM Produits p
+                         JOIN Categories cat ON p.id_categorie = cat.id_categorie)
+"""
+
+def calculer_ventes_sql(base):
+    """Agrégations SQL de analyser_ventes_sql(), sans affichage.
+
+    Les requêtes passent par base (CacheRequetes, ou tout objet offrant
+    lire() et appeler()). Retourne ((nb_ventes, ca_total, quantite_totale),
+    produits_ca, categories_ca, ca_mensuel, ventes_client).
+
+    Comme en mode pandas, seules comptent les ventes dont le produit et sa
+    catégorie existent. Sans produit orphelin (cas normal), les requêtes
+    restent servies par les index couvrants ; sinon, un filtre les écarte.
+    """
+    compact = base.appeler('dates_compactes', utilise_dates_compactes)
+    orphelins = tuple(base.lire(REQUETE_PRODUITS_ORPHELINS)['id_produit'].tolist())
+    exclusion = f" AND id_produit NOT IN ({', '.join('?' * len(orphelins))})" if orphelins else ""
+
+    produits_ca = base.lire("""
+    SELECT p.id_produit, p.nom_produit, a.quantite, a.montant_total
+    FROM (SELECT id_produit, SUM(quantite) as quantite, SUM(montant_total) as montant_total
+          FROM Ventes
+          GROUP BY id_produit) a
+    JOIN Produits p ON a.id_produit = p.id_produit
+    JOIN Categories cat ON p.id_categorie = cat.id_categorie
+    ORDER BY a.montant_total DESC
+    """).set_index(['id_produit', 'nom_produit'])
+
+    # Agrégation par produit puis report sur les catégories (quelques centaines de lignes)
+    categories_ca = base.lire("""
+    SELECT cat.id_categorie, cat.nom_categorie, SUM(a.quantite) as quantite,
+           SUM(a.montant_total) as montant_total, SUM(a.nb_ventes) as nb_ventes
+    FROM (SELECT id_produit, SUM(quantite) as quantite, SUM(montant_total) as montant_total,
+                 COUNT(*) as nb_ventes
+          FROM Ventes
+          GROUP BY id_produit) a
+    JOIN Produits p ON a.id_produit = p.id_produit
+    JOIN Categories cat ON p.id_categorie = cat.id_categorie
+    GROUP BY cat.id_categorie
+    ORDER BY montant_total DESC
+    """).set_index(['id_categorie', 'nom_categorie'])
+    categories_ca.columns = pd.MultiIndex.from_tuples(
+        [('quantite', 'sum'), ('montant_total', 'sum'), ('montant_total', 'count')])
+
+    # Totaux des ventes retenues : somme des catégories, sans relire Ventes
+    nb_ventes = categories_ca[('montant_total', 'count')].sum()
+    ca_total = categories_ca[('montant_total', 'sum')].sum()
+    quantite_totale = categories_ca[('quantite', 'sum')].sum()
+
+    # Le mois n'est calculé qu'une fois par jour distinct ; une vente sans
+    # date n'a pas de mois (écartée par groupby en mode pandas)
+    colonne_date = 'jour_vente' if compact else 'date_vente'
+    format_mois = "strftime('%Y-%m', jour * 86400, 'unixepoch')" if compact else "substr(jour, 1, 7)"
+    ca_mensuel = base.lire(f"""
+    SELECT {format_mois} as mois, SUM(ca_jour) as CA_total, SUM(nb_jour) as nb_ventes
+    FROM (SELECT {colonne_date} as jour, SUM(montant_total) as ca_jour, COUNT(*) as nb_jour
+          FROM Ventes
+          WHERE {colonne_date} IS NOT NULL{exclusion}
+          GROUP BY {colonne_date})
+    GROUP BY mois
+    ORDER BY mois
+    """, orphelins)
+    ca_mensuel = ca_mensuel.assign(mois=pd.PeriodIndex(ca_mensuel['mois'], freq='M'))
+    ca_mensuel = ca_mensuel.set_index('mois')
+
+    ventes_client = base.lire(f"""
+    SELECT c.id_client, c.nom as nom_client, c.prenom as prenom_client, a.CA_total, a.nb_achats
+    FROM (SELECT id_client, SUM(montant_total) as CA_total, COUNT(*) as nb_achats
+          FROM Ventes
+          WHERE id_client IS NOT NULL{exclusion}
+          GROUP BY id_client) a
+    JOIN Clients c ON a.id_client = c.id_client
+    ORDER BY a.CA_total DESC
+    """, orphelins).set_index(['id_client', 'nom_client', 'prenom_client'])
+
+    return ((int(nb_ventes), float(ca_total or 0.0), int(quantite_totale or 0)),
+            produits_ca, categories_ca, ca_mensuel, ventes_client)
+
+def analyser_ventes_sql(base):
+    """Variante de analyser_ventes() où chaque analyse est une requête d'agrégation SQL.
+
+    Les regroupements se font sur les identifiants ; les noms ne sont joints
+    qu'au résultat agrégé. Deux produits (ou clients) homonymes restent donc
+    distincts : les index des DataFrames commencent par l'identifiant.
+    Les requêtes passent par base (CacheRequetes). ventes_df vaut None.
+    """
+    statistiques, produits_ca, categories_ca, ca_mensuel, ventes_client = calculer_ventes_sql(base)
+    afficher_resultats(*statistiques, produits_ca, categories_ca, ca_mensuel, ventes_client)
+
+    return None, produits_ca, categories_ca, ca_mensuel, ventes_client
+
+def comparer_pandas_sql(repetitions=3):
+    """Chronomètre analyser_ventes() en mode pandas puis en mode SQL sans cache (meilleur temps sur repetitions)"""
+    import io
+    import time
+    from contextlib import redirect_stdout
+
+    temps = {}
+    for en_sql in (False, True):
+        meilleur = float('inf')
+        for _ in range(repetitions):
+            debut = time.perf_counter()
+            with redirect_stdout(io.StringIO()):
+                analyser_ventes(en_sql=en_sql, utiliser_cache=False)
+            meilleur = min(meilleur, time.perf_counter() - debut)
+        temps['sql' if en_sql else 'pandas'] = meilleur
+
+    print(f"pandas : {temps['pandas']:.3f} s")
+    print(f"sql    : {temps['sql']:.3f} s (x{temps['pandas'] / temps['sql']:.1f})")
+    return temps
+
+def analyser_ventes_arrow(dossier):
+    """Variante de analyser_ventes() qui lit l'export Arrow de export_arrow.py au lieu de SQLite.
+
+    ventes_df vaut None.
+    """
+    from export_arrow import analyser_arrow
+
+    produits_ca, categories_ca, ca_mensuel, ventes_client = analyser_arrow(dossier)
+    afficher_resultats(categories_ca[('montant_total', 'count')].sum(),
+                       categories_ca[('montant_total', 'sum')].sum(),
+                       categories_ca[('quantite', 'sum')].sum(),
+                       produits_ca, categories_ca, ca_mensuel, ventes_client)
+
+    return None, produits_ca, categories_ca, ca_mensuel, ventes_client
+
+def analyser_ventes(depuis_agregats=False, taille_chunk=None, en_sql=False, dossier_arrow=None,
+                    utiliser_cache=True):
+    # Lecture de l'export colonnaire si demandé (SQLite n'est pas ouvert)
+    if dossier_arrow:
+        return analyser_ventes_arrow(dossier_arrow)
+
+    # Agrégations entièrement faites par SQLite, avec cache des résultats, si demandé
+    if en_sql:
+        base = CacheRequetes('ventes_magasin.db', actif=utiliser_cache)
+        resultats = analyser_ventes_sql(base)
+        base.fermer()
+        base.afficher_statistiques()
+        return resultats
+
+    # Lecture des agrégats pré-calculés (voir agregats.py) si demandé ; ils
+    # sont rafraîchis par l'écrivain, puis lus en lecture seule
+    if depuis_agregats:
+        rafraichir_si_actifs('ventes_magasin.db')
+        conn = ouvrir_connexion('ventes_magasin.db', lecture_seule=True)
+        if not agregats_actifs(conn):
+            conn.close()
+            raise ValueError("Les tables d'agrégats n'existent pas dans cette base : créez-les avec "
+                             "`python agregats.py creer` (ou `python ventes.py agregats creer`)")
+        resultats = analyser_ventes_agregats(conn)
+        conn.close()
+        return resultats
+
+    # Connexion à la base de données en lecture seule
+    conn = ouvrir_connexion('ventes_magasin.db', lecture_seule=True)
+
+    compact = utilise_dates_compactes(conn)
+
+    # Lecture en flux par blocs si demandé (mémoire bornée)
+    if taille_chunk:
+        resultats = analyser_ventes_par_chunks(conn, requete_ventes(compact), compact, taille_chunk)
+        conn.close()
+        return resultats
+
+    # 1. Extraction des données dans des DataFrames Pandas
+    # Requête pour obtenir les données de ventes avec les noms des produits et clients
+    ventes_df = lire_ventes_df(conn, compact)
+    memoire_initiale = ventes_df.memory_usage(deep=True).sum()
     
-    ventes_df = pd.read_sql_query(query, conn)
-    
-    # Conversion de la date en type datetime
-    ventes_df['date_vente'] = pd.to_datetime(ventes_df['date_vente'])
+    # Conversion de la date en type datetime et typage compact des colonnes
+    with mesurer("conversion des types", 'pandas'):
+        ventes_df = preparer_ventes_df(ventes_df, compact)
+    print(f"Mémoire ventes_df: {memoire_initiale / 1024 ** 2:.1f} Mo -> "
+          f"{ventes_df.memory_usage(deep=True).sum() / 1024 ** 2:.1f} Mo")
     
     # 2. Analyse statistique de base
     print("\n=== Statistiques de base ===")
@@ -42,31 +405,24 @@ def analyser_ventes():
     
     # 3. Analyse par produit
     print("\n=== Analyse par produit ===")
-    produits_ca = ventes_df.groupby('nom_produit').agg({
-        'quantite': 'sum',
-        'montant_total': 'sum'
-    }).sort_values('montant_total', ascending=False)
+    with mesurer("agrégation par produit", 'pandas'):
+        produits_ca = agreger_produits(ventes_df)
     
     print("\nTop 10 des produits par chiffre d'affaires:")
     print(produits_ca.head(10))
     
     # 4. Analyse par catégorie
     print("\n=== Analyse par catégorie ===")
-    categories_ca = ventes_df.groupby('nom_categorie').agg({
-        'quantite': 'sum',
-        'montant_total': ['sum', 'count']
-    }).sort_values(('montant_total', 'sum'), ascending=False)
+    with mesurer("agrégation par catégorie", 'pandas'):
+        categories_ca = agreger_categories(ventes_df)
     
     print("\nChiffre d'affaires par catégorie:")
     print(categories_ca)
     
     # 5. Analyse temporelle
     print("\n=== Analyse temporelle ===")
-    ventes_df['mois'] = ventes_df['date_vente'].dt.to_period('M')
-    ca_mensuel = ventes_df.groupby('mois').agg({
-        'montant_total': 'sum',
-        'id_vente': 'count'
-    }).rename(columns={'montant_total': 'CA_total', 'id_vente': 'nb_ventes'})
+    with mesurer("agrégation mensuelle", 'pandas'):
+        ca_mensuel = agreger_mois(ventes_df)
     
     print("\nChiffre d'affaires mensuel:")
     print(ca_mensuel)
@@ -74,13 +430,8 @@ def analyser_ventes():
     # 6. Analyse des clients
     print("\n=== Analyse des clients ===")
     clients_df = pd.read_sql_query("SELECT * FROM Clients", conn)
-    ventes_client = ventes_df.groupby(['nom_client', 'prenom_client']).agg({
-        'montant_total': 'sum',
-        'id_vente': 'count'
-    }).sort_values('montant_total', ascending=False).rename(columns={
-        'montant_total': 'CA_total', 
-        'id_vente': 'nb_achats'
-    })
+    with mesurer("agrégation par client", 'pandas'):
+        ventes_client = agreger_clients(ventes_df)
     
     print("\nTop 10 des clients par chiffre d'affaires:")
     print(ventes_client.head(10))
@@ -90,13 +441,47 @@ def analyser_ventes():
     
     return ventes_df, produits_ca, categories_ca, ca_mensuel, ventes_client
 
-if __name__ == "__main__":
-    ventes_df, produits_ca, categories_ca, ca_mensuel, ventes_client = analyser_ventes()
+def main(argv=None, prog=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog=prog, description="Analyse des ventes")
+    parser.add_argument("--stats-only", action="store_true",
+                        help="n'afficher que les statistiques de base, calculées dans SQLite (rapide)")
+    parser.add_argument("--agregats", action="store_true", help="lire les tables d'agrégats")
+    parser.add_argument("--chunk", type=int, default=None,
+                        help="lire les ventes par blocs de CHUNK lignes (mémoire bornée)")
+    parser.add_argument("--sql", action="store_true", help="faire les agrégations dans SQLite")
+    parser.add_argument("--sans-cache", action="store_true", help="ne pas utiliser le cache des requêtes")
+    parser.add_argument("--arrow", metavar="DOSSIER", default=None,
+                        help="lire l'export Arrow (voir export_arrow.py) au lieu de SQLite")
+    parser.add_argument("--comparer", action="store_true", help="comparer les temps des modes pandas et SQL")
+    parser.add_argument("--profil", action="store_true",
+                        help="chronométrer SQL, pandas et graphiques (profil JSON et trace Chrome dans profils/)")
+    parser.add_argument("--seuil-lent", type=float, default=0.5, help="durée en secondes d'une requête lente")
+    args = parser.parse_args(argv)
+
+    if args.profil:
+        instrumentation.activer(seuil_lent=args.seuil_lent)
+
+    if args.stats_only:
+        statistiques_de_base()
+        return
+
+    if args.comparer:
+        comparer_pandas_sql()
+        return
+
+    ventes_df, produits_ca, categories_ca, ca_mensuel, ventes_client = analyser_ventes(
+        depuis_agregats=args.agregats, taille_chunk=args.chunk, en_sql=args.sql,
+        dossier_arrow=args.arrow, utiliser_cache=not args.sans_cache)
     
     # Sauvegarde des résultats dans des fichiers CSV pour la visualisation
-    produits_ca.to_csv('produits_ca.csv')
-    categories_ca.to_csv('categories_ca.csv')
-    ca_mensuel.to_csv('ca_mensuel.csv')
-    ventes_client.to_csv('ventes_client.csv')
-    
-    print("\nAnalyse terminée. Les résultats ont été sauvegardés dans le dossier .")
\ No newline at end of file
+    sauvegarder_csv(produits_ca, categories_ca, ca_mensuel, ventes_client)
+
+    print("\nAnalyse terminée. Les résultats ont été sauvegardés dans le dossier .")
+
+    if args.profil:
+        instrumentation.terminer()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import json
+import os
+import platform
+import resource
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+import multiprocessing
+
+# Banc d'essai des quatre scripts : pour chaque taille de jeu de données, la
+# base est créée puis remplie, et chaque étape (schéma, génération, insertion,
+# chaque calcul de analyser_ventes, chaque requête et chaque graphique de
+# visualisation) est chronométrée avec son pic de mémoire résidente.
+# Chaque groupe d'étapes tourne dans un processus neuf : les pics mesurés ne
+# dépendent pas des étapes précédentes et un manque de mémoire n'interrompt
+# pas le banc d'essai. Tout fonctionne hors ligne, sans GPU.
+TAILLES = {'10k': 10_000, '1M': 1_000_000, '10M': 10_000_000}
+
+FICHIER_RESULTATS = 'benchmark_resultats.json'
+FICHIER_REFERENCE = 'benchmark_reference.json'
+SEUIL_REGRESSION = 0.20     # 20 % plus lent que la référence
+ECART_MIN = 0.05            # en secondes : en dessous, l'écart est du bruit de mesure
+
+def reinitialiser_pic_memoire():
+    """Remet à zéro le pic de mémoire résidente du processus (VmHWM, Linux)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def pic_memoire_mo():
+    """Pic de mémoire résidente du processus depuis la dernière remise à zéro, en Mo"""
+    try:
+        with open('/proc/self/status') as f:
+            for ligne in f:
+                if ligne.startswith('VmHWM:'):
+                    return int(ligne.split()[1]) / 1024
+    except OSError:
+        pass
+    # Sans /proc : pic depuis le démarrage du processus (ru_maxrss en Kio sous Linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def mesurer(mesures, etape, fonction, *args):
+    """Exécute fonction(*args) et ajoute à mesures sa durée et son pic de mémoire"""
+    reinitialiser_pic_memoire()
+    debut = time.perf_counter()
+    resultat = fonction(*args)
+    mesures.append({'etape': etape, 'duree_s': time.perf_counter() - debut, 'rss_max_mo': pic_memoire_mo()})
+    return resultat
+
+# Groupes d'étapes, exécutés chacun dans un processus fils
+
+def etape_schema(chemin_bdd, graine):
+    from creation_bdd import creer_base_de_donnees
+    from generation_donnees import generer_donnees
+
+    mesures = []
+    mesurer(mesures, 'schema', creer_base_de_donnees, 'defaut', False, chemin_bdd)
+    # Catégories, produits et clients (sans ventes)
+    mesurer(mesures, 'referentiel', generer_donnees, 150, 150, 0, graine, 100_000, chemin_bdd)
+    return mesures
+
+def etape_ventes(chemin_bdd, nb_ventes, graine, taille_lot):
+    """Génération des ventes (sans base), puis génération et insertion chronométrées séparément.
+
+    Les lots sont ceux de generer_donnees() (mêmes fonctions, même graine).
+    """
+    from generation_donnees import preparer_ventes, generer_lots, inserer_ventes
+
+    conn = sqlite3.connect(chemin_bdd)
+    colonne_date, *donnees = preparer_ventes(conn, 150, 150)
+    mesures = []
+
+    def generer():
+        for _ in generer_lots(nb_ventes, graine, taille_lot, *donnees):
+            pass
+    mesurer(mesures, 'generation', generer)
+
+    # Seul le temps des insertions (et du commit final, comme dans
+    # generer_donnees) est compté
+    conn.execute("PRAGMA synchronous = OFF")
+    reinitialiser_pic_memoire()
+    duree = 0.0
+    for lot in generer_lots(nb_ventes, graine, taille_lot, *donnees):
+        debut = time.perf_counter()
+        inserer_ventes(conn, colonne_date, lot)
+        duree += time.perf_counter() - debut
+    debut = time.perf_counter()
+    conn.commit()
+    duree += time.perf_counter() - debut
+    mesures.append({'etape': 'insertion', 'duree_s': duree, 'rss_max_mo': pic_memoire_mo()})
+    conn.close()
+    return mesures
+
+def etape_analyse(chemin_bdd):
+    """Chaque étape du mode par défaut de analyser_ventes()"""
+    from analyse_ventes import (lire_ventes_df, preparer_ventes_df, agreger_produits, agreger_categories,
+                                agreger_mois, agreger_clients)
+    from creation_bdd import utilise_dates_compactes
+
+    conn = sqlite3.connect(chemin_bdd)
+    compact = utilise_dates_compactes(conn)
+    mesures = []
+    ventes_df = mesurer(mesures, 'analyse_lecture', lire_ventes_df, conn, compact)
+    conn.close()
+
+    ventes_df = mesurer(mesures, 'analyse_conversion', preparer_ventes_df, ventes_df, compact)
+    mesurer(mesures, 'analyse_produits', agreger_produits, ventes_df)
+    mesurer(mesures, 'analyse_categories', agreger_categories, ventes_df)
+    mesurer(mesures, 'analyse_mensuelle', agreger_mois, ventes_df)
+    mesurer(mesures, 'analyse_clients', agreger_clients, ventes_df)
+    return mesures
+
+def etape_visualisation(chemin_bdd, dossier):
+    """Chaque requête puis chaque graphique de generate_visualizations(), sans cache ni affichage"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import pandas as pd
+    from rapports import requetes_rapports
+    from visualisation import appliquer_style, executer_graphique, GRAPHIQUES
+
+    appliquer_style()
+    os.chdir(dossier)
+    conn = sqlite3.connect(chemin_bdd)
+    mesures = []
+    donnees = {cle: mesurer(mesures, f"requete_{cle}", pd.read_sql_query, requete, conn)
+               for cle, requete in requetes_rapports(conn).items()}
+    conn.close()
+
+    for fichier, tracer, cle in GRAPHIQUES:
+        _, _, erreur = mesurer(mesures, f"graphique_{os.path.splitext(fichier)[0]}",
+                               executer_graphique, fichier, tracer, donnees[cle].copy())
+        if erreur:
+            mesures[-1]['erreur'] = erreur
+    return mesures
+
+def executer_groupe(fonction, *args):
+    """Exécute un groupe d'étapes dans un processus neuf ; un échec est enregistré comme étape en erreur"""
+    contexte = multiprocessing.get_context('spawn')
+    try:
+        with ProcessPoolExecutor(max_workers=1, mp_context=contexte) as executor:
+            return executor.submit(fonction, *args).result()
+    except BrokenProcessPool:
+        return [{'etape': fonction.__name__, 'erreur': "processus interrompu (mémoire insuffisante ?)"}]
+    except Exception as e:
+        return [{'etape': fonction.__name__, 'erreur': str(e)}]
+
+def executer_benchmark(tailles=('10k', '1M', '10M'), graine=42, taille_lot=100_000, dossier=None):
+    """Exécute toutes les étapes pour chaque taille ; retourne les résultats (sérialisables en JSON)"""
+    resultats = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'machine': {
+            'plateforme': platform.platform(),
+            'processeur': platform.processor() or platform.machine(),
+            'nb_coeurs': os.cpu_count(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+        },
+        'tailles': {},
+    }
+    for taille in tailles:
+        nb_ventes = TAILLES[taille]
+        with tempfile.TemporaryDirectory(dir=dossier) as dossier_taille:
+            chemin_bdd = os.path.join(dossier_taille, 'ventes_magasin.db')
+            print(f"\n=== {taille} ventes ===")
+            mesures = []
+            for fonction, args in ((etape_schema, (chemin_bdd, graine)),
+                                   (etape_ventes, (chemin_bdd, nb_ventes, graine, taille_lot)),
+                                   (etape_analyse, (chemin_bdd,)),
+                                   (etape_visualisation, (chemin_bdd, dossier_taille))):
+                for mesure in executer_groupe(fonction, *args):
+                    afficher_mesure(mesure)
+                    mesures.append(mesure)
+            resultats['tailles'][taille] = mesures
+    return resultats
+
+def afficher_mesure(mesure):
+    if 'duree_s' in mesure:
+        print(f"{mesure['etape']:<40} {mesure['duree_s']:>9.3f} s {mesure['rss_max_mo']:>9.1f} Mo"
+              + (f"  ERREUR : {mesure['erreur']}" if 'erreur' in mesure else ""))
+    else:
+        print(f"{mesure['etape']:<40} ERREUR : {mesure['erreur']}")
+
+def ecrire_json(resultats, chemin):
+    with open(chemin + '.tmp', 'w') as f:
+        json.dump(resultats, f, indent=2)
+    os.replace(chemin + '.tmp', chemin)
+
+def comparer_reference(resultats, reference, seuil=SEUIL_REGRESSION):
+    """Compare les durées à celles de la référence ; retourne la liste des régressions.
+
+    Une étape régresse si elle est plus lente que la référence de plus de
+    seuil (en proportion) et d'au moins ECART_MIN secondes, ou si elle
+    échoue alors qu'elle réussissait.
+    """
+    regressions = []
+    print(f"\n=== Comparaison avec la référence du {reference.get('date', '?')} ===")
+    for taille, mesures in resultats['tailles'].items():
+        anciennes = {m['etape']: m for m in reference.get('tailles', {}).get(taille, [])}
+        for mesure in mesures:
+            ancienne = anciennes.get(mesure['etape'])
+            if ancienne is None or 'duree_s' not in ancienne:
+                continue
+            if 'duree_s' not in mesure or 'erreur' in mesure:
+                regressions.append((taille, mesure['etape'], None))
+                print(f"{taille:<4} {mesure['etape']:<40} échec (réussissait dans la référence)")
+                continue
+            rapport = mesure['duree_s'] / ancienne['duree_s'] if ancienne['duree_s'] else 1.0
+            ecart = mesure['duree_s'] - ancienne['duree_s']
+            marque = "  RÉGRESSION" if rapport > 1 + seuil and ecart > ECART_MIN else ""
+            print(f"{taille:<4} {mesure['etape']:<40} {ancienne['duree_s']:>9.3f} s -> {mesure['duree_s']:>9.3f} s "
+                  f"(x{rapport:.2f}){marque}")
+            mesure['rapport_reference'] = rapport
+            if marque:
+                regressions.append((taille, mesure['etape'], rapport))
+    return regressions
+
+def main(argv=None, prog=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog=prog, description="Banc d'essai de la génération, du schéma, de l'analyse et des graphiques")
+    parser.add_argument("--tailles", nargs="+", choices=list(TAILLES), default=list(TAILLES))
+    parser.add_argument("--graine", type=int, default=42)
+    parser.add_argument("--taille-lot", type=int, default=100_000)
+    parser.add_argument("--dossier", default=None, help="dossier des bases temporaires (défaut : dossier temporaire du système)")
+    parser.add_argument("--sortie", default=FICHIER_RESULTATS, help="fichier JSON des résultats")
+    parser.add_argument("--reference", default=FICHIER_REFERENCE, help="fichier JSON de référence à comparer")
+    parser.add_argument("--seuil", type=float, default=SEUIL_REGRESSION,
+                        help="ralentissement toléré par rapport à la référence (0.2 = 20 %%)")
+    parser.add_argument("--enregistrer-reference", action="store_true",
+                        help="enregistrer ces résultats comme nouvelle référence")
+    args = parser.parse_args(argv)
+
+    resultats = executer_benchmark(args.tailles, args.graine, args.taille_lot, args.dossier)
+
+    regressions = []
+    if os.path.exists(args.reference) and not args.enregistrer_reference:
+        with open(args.reference) as f:
+            regressions = comparer_reference(resultats, json.load(f), args.seuil)
+    ecrire_json(resultats, args.sortie)
+    print(f"\nRésultats écrits dans {args.sortie}")
+    if args.enregistrer_reference:
+        ecrire_json(resultats, args.reference)
+        print(f"Référence enregistrée dans {args.reference}")
+    if regressions:
+        print(f"{len(regressions)} régression(s) détectée(s).")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
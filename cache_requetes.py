@@ -0,0 +1,207 @@
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import pickle
+import time
+try:
+    import fcntl
+except ImportError:     # Windows : pas de verrou, la fusion avec le dossier limite les pertes
+    fcntl = None
+from acces_bdd import ouvrir_connexion
+from instrumentation import lire_sql
+
+# En WAL, un commit n'écrit que dans le fichier -wal, qui est réutilisé
+# depuis le début après chaque checkpoint : sa taille peut rester la même
+# d'un commit à l'autre, et le fichier principal ne change qu'au checkpoint
+# suivant. Le marqueur comprend donc aussi la date de modification du WAL
+# et son en-tête (numéro de checkpoint et sels, renouvelés à chaque
+# réutilisation). Reste le cas de deux commits dans le même tic d'horloge
+# du système de fichiers, de même taille de WAL : une base modifiée depuis
+# moins de DELAI_STABILITE secondes n'est donc pas servie depuis le cache.
+DELAI_STABILITE = 2.0   # en secondes, au-delà de la résolution des dates de fichiers
+
+def etat_base(chemin_bdd):
+    """Marqueur de l'état de la base (fichier principal et WAL), obtenu sans ouvrir SQLite.
+
+    Retourne (marqueur, date de la dernière modification en nanosecondes).
+    """
+    stat = os.stat(chemin_bdd)
+    marqueur = (stat.st_mtime_ns, stat.st_size)
+    modification = stat.st_mtime_ns
+    try:
+        with open(chemin_bdd + '-wal', 'rb') as f:
+            stat_wal = os.fstat(f.fileno())
+            # Un WAL vide (créé à l'ouverture d'une connexion, supprimé à la
+            # fermeture de la dernière) ne contient aucun commit
+            if stat_wal.st_size:
+                marqueur += (stat_wal.st_mtime_ns, stat_wal.st_size, f.read(32))
+                modification = max(modification, stat_wal.st_mtime_ns)
+    except FileNotFoundError:
+        pass
+    return marqueur, modification
+
+def base_stable(modification, delai=DELAI_STABILITE):
+    """Indique si la dernière modification est assez ancienne pour que le marqueur soit fiable"""
+    return time.time_ns() - modification >= delai * 1e9
+
+class CacheRequetes:
+    """Accès en lecture à la base avec cache disque des résultats de requêtes.
+
+    Un résultat est identifié par le texte SQL, les paramètres et un marqueur
+    de l'état de la base (voir etat_base). Tant que la base ne change pas, les
+    lectures sont servies depuis le disque sans ouvrir SQLite ni rien écrire
+    (les dates d'accès sont enregistrées par fermer()) ; une base en cours
+    d'écriture (modifiée depuis moins de DELAI_STABILITE secondes) est lue
+    directement, sans passer par le cache. Au-delà de taille_max octets ou
+    nb_max entrées, les entrées les moins récemment utilisées sont supprimées.
+
+    Plusieurs processus peuvent partager le dossier : l'index est fusionné
+    avec celui du disque et avec les fichiers présents, sous verrou, avant
+    chaque écriture (voir ecrire_index).
+    """
+
+    def __init__(self, chemin_bdd='ventes_magasin.db', dossier='.cache_requetes',
+                 taille_max=256 * 1024 ** 2, nb_max=1000, actif=True):
+        self.chemin_bdd = chemin_bdd
+        self.dossier = dossier
+        self.taille_max = taille_max
+        self.nb_max = nb_max
+        self.actif = actif
+        self.conn = None
+        self.succes = 0
+        self.echecs = 0
+        self.index_modifie = False
+        if actif:
+            os.makedirs(dossier, exist_ok=True)
+            self.index = self.lire_index()
+
+    def connexion(self):
+        """Ouvre la connexion SQLite (en lecture seule) au premier besoin seulement"""
+        if self.conn is None:
+            self.conn = ouvrir_connexion(self.chemin_bdd, lecture_seule=True)
+        return self.conn
+
+    def fermer(self):
+        if self.index_modifie:
+            self.ecrire_index()
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def etat_base(self):
+        return etat_base(self.chemin_bdd)
+
+    def lire(self, requete, params=()):
+        """Exécute requete (ou la sert depuis le cache) et retourne un DataFrame"""
+        return self.memoiser(('sql', requete, tuple(params)),
+                             lambda conn: lire_sql(requete, conn, params=params))
+
+    def appeler(self, nom, fonction):
+        """Met en cache le résultat de fonction(conn), identifié par nom et l'état de la base"""
+        return self.memoiser(('fonction', nom), fonction)
+
+    def memoiser(self, cle, calcul):
+        if not self.actif:
+            return calcul(self.connexion())
+
+        marqueur, modification = self.etat_base()
+        if not base_stable(modification):
+            self.echecs += 1
+            return calcul(self.connexion())
+
+        empreinte = hashlib.sha256(repr((cle, os.path.realpath(self.chemin_bdd), marqueur)).encode()).hexdigest()
+        chemin = os.path.join(self.dossier, empreinte + '.pkl')
+        # Le fichier peut venir d'un autre processus, absent de l'index lu au démarrage
+        try:
+            with open(chemin, 'rb') as f:
+                resultat = pickle.load(f)
+        except FileNotFoundError:
+            pass
+        else:
+            self.succes += 1
+            self.index[empreinte] = {'taille': os.path.getsize(chemin), 'acces': time.time()}
+            self.index_modifie = True
+            return resultat
+
+        self.echecs += 1
+        resultat = calcul(self.connexion())
+        with open(chemin + '.tmp', 'wb') as f:
+            pickle.dump(resultat, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(chemin + '.tmp', chemin)
+        self.index[empreinte] = {'taille': os.path.getsize(chemin), 'acces': time.time()}
+        self.ecrire_index()
+        return resultat
+
+    def evincer(self):
+        """Supprime les entrées les moins récemment utilisées au-delà des limites"""
+        entrees = sorted(self.index.items(), key=lambda entree: entree[1]['acces'])
+        taille = sum(infos['taille'] for _, infos in entrees)
+        while entrees and (taille > self.taille_max or len(entrees) > self.nb_max):
+            empreinte, infos = entrees.pop(0)
+            taille -= infos['taille']
+            del self.index[empreinte]
+            chemin = os.path.join(self.dossier, empreinte + '.pkl')
+            if os.path.exists(chemin):
+                os.remove(chemin)
+
+    @contextlib.contextmanager
+    def verrou(self):
+        """Verrou exclusif sur l'index, partagé par tous les processus utilisant le dossier"""
+        with open(os.path.join(self.dossier, 'index.lock'), 'w') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def lire_index(self):
+        chemin = os.path.join(self.dossier, 'index.json')
+        if not os.path.exists(chemin):
+            return {}
+        with open(chemin) as f:
+            return json.load(f)
+
+    def fusionner_index(self):
+        """Complète l'index avec celui du disque et les fichiers du dossier (à appeler sous verrou).
+
+        Les entrées écrites par d'autres processus sont reprises, en gardant
+        l'accès le plus récent ; un fichier absent de tout index (écriture
+        perdue) y est ajouté pour être compté et évincé ; une entrée dont le
+        fichier a disparu (évincée ailleurs) est retirée.
+        """
+        fusion = self.lire_index()
+        for empreinte, infos in self.index.items():
+            if empreinte not in fusion or fusion[empreinte]['acces'] < infos['acces']:
+                fusion[empreinte] = infos
+        presents = {}
+        for chemin in glob.glob(os.path.join(self.dossier, '*.pkl')):
+            empreinte = os.path.basename(chemin)[:-len('.pkl')]
+            stat = os.stat(chemin)
+            presents[empreinte] = fusion.get(empreinte) or {'taille': stat.st_size, 'acces': stat.st_mtime}
+        self.index = presents
+
+    def ecrire_index(self):
+        """Fusionne l'index avec le disque, évince au-delà des limites et l'écrit"""
+        chemin = os.path.join(self.dossier, 'index.json')
+        with self.verrou():
+            self.fusionner_index()
+            self.evincer()
+            with open(chemin + '.tmp', 'w') as f:
+                json.dump(self.index, f)
+            os.replace(chemin + '.tmp', chemin)
+        self.index_modifie = False
+
+    def vider(self):
+        """Supprime toutes les entrées du cache, y compris celles des autres processus"""
+        with self.verrou():
+            for chemin in glob.glob(os.path.join(self.dossier, '*.pkl')):
+                os.remove(chemin)
+            self.index = {}
+            with open(os.path.join(self.dossier, 'index.json'), 'w') as f:
+                json.dump(self.index, f)
+        self.index_modifie = False
+
+    def afficher_statistiques(self):
+        total = self.succes + self.echecs
+        taux = 100 * self.succes / total if total else 0
+        print(f"Cache des requêtes : {self.succes} succès, {self.echecs} échecs ({taux:.0f}% de succès)")
@@ -0,0 +1,296 @@
+import heapq
+import math
+import numpy as np
+from acces_bdd import ouvrir_connexion
+from instrumentation import mesurer
+
+# Classements (top-N) des produits et des clients par chiffre d'affaires.
+#
+# Mode exact : SQLite produit les totaux groupe par groupe (dans l'ordre de
+# l'index couvrant, sans tri) et un tas de taille k ne garde que les k
+# meilleurs ; rien n'est trié en entier.
+#
+# Modes approchés, en mémoire constante sur un flux de ventes (ingestion) :
+#   SpaceSaving  m compteurs ; pour chaque clé suivie,
+#                estimation - erreur <= CA réel <= estimation, et toute clé
+#                dont le CA dépasse W / m (W : CA total du flux) est suivie.
+#   CountMin     esquisse de largeur e / epsilon et de profondeur ln(1 / delta) ;
+#                CA réel <= estimation <= CA réel + epsilon * W avec une
+#                probabilité d'au moins 1 - delta, plus k candidats.
+DIMENSIONS = {
+    'produit': {
+        'totaux': "SELECT id_produit, SUM(montant_total) FROM Ventes GROUP BY id_produit",
+        'flux': "SELECT id_produit, montant_total FROM Ventes",
+        'noms': "SELECT id_produit, nom_produit FROM Produits WHERE id_produit IN ({})",
+    },
+    'client': {
+        'totaux': "SELECT id_client, SUM(montant_total) FROM Ventes WHERE id_client IS NOT NULL GROUP BY id_client",
+        'flux': "SELECT id_client, montant_total FROM Ventes WHERE id_client IS NOT NULL",
+        'noms': "SELECT id_client, prenom || ' ' || nom FROM Clients WHERE id_client IN ({})",
+    },
+}
+
+PREMIER = 2 ** 31 - 1     # module des fonctions de hachage de CountMin
+
+class TopKExact:
+    """Les k plus grandes valeurs d'un flux de totaux complets, par un tas min de taille k"""
+
+    def __init__(self, k):
+        if k < 1:
+            raise ValueError(f"k doit être au moins 1 (reçu {k})")
+        self.k = k
+        self.tas = []
+
+    def ajouter(self, cle, valeur):
+        if len(self.tas) < self.k:
+            heapq.heappush(self.tas, (valeur, cle))
+        elif valeur > self.tas[0][0]:
+            heapq.heapreplace(self.tas, (valeur, cle))
+
+    def classement(self):
+        """Liste de (clé, valeur) par valeur décroissante"""
+        return [(cle, valeur) for valeur, cle in sorted(self.tas, reverse=True)]
+
+def top_k_partiels(partiels, k):
+    """Top-k exact à partir d'agrégats partiels (clé, valeur), une clé pouvant revenir.
+
+    Les partiels (par exemple un groupby par bloc de ventes) sont d'abord
+    cumulés par clé : la mémoire est celle du nombre de clés distinctes.
+    """
+    totaux = {}
+    for cle, valeur in partiels:
+        totaux[cle] = totaux.get(cle, 0.0) + valeur
+    top = TopKExact(k)
+    for cle, valeur in totaux.items():
+        top.ajouter(cle, valeur)
+    return top.classement()
+
+def top_k_sql(conn, k, dimension='produit'):
+    """Top-k exact des produits ou clients par CA, sans tri complet des groupes"""
+    top = TopKExact(k)
+    curseur = conn.execute(DIMENSIONS[dimension]['totaux'])
+    while True:
+        lignes = curseur.fetchmany(10_000)
+        if not lignes:
+            break
+        for cle, valeur in lignes:
+            top.ajouter(cle, valeur)
+    return top.classement()
+
+class SpaceSaving:
+    """Heavy hitters pondérés en mémoire constante (algorithme Space-Saving).
+
+    Une clé non suivie remplace la clé de plus petite estimation e_min et
+    reçoit l'estimation e_min + poids, avec une erreur e_min. Le tas des
+    estimations est mis à jour paresseusement : une entrée périmée est
+    corrigée quand elle arrive au sommet.
+    """
+
+    def __init__(self, nb_compteurs=1000):
+        if nb_compteurs < 1:
+            raise ValueError(f"nb_compteurs doit être au moins 1 (reçu {nb_compteurs})")
+        self.nb_compteurs = nb_compteurs
+        self.compteurs = {}     # clé -> [estimation, erreur]
+        self.tas = []           # (estimation, clé), éventuellement périmée
+        self.total = 0.0
+
+    def ajouter(self, cle, poids=1.0):
+        self.total += poids
+        compteur = self.compteurs.get(cle)
+        if compteur is not None:
+            compteur[0] += poids
+            return
+        if len(self.compteurs) < self.nb_compteurs:
+            self.compteurs[cle] = [poids, 0.0]
+            heapq.heappush(self.tas, (poids, cle))
+            return
+        while True:
+            estimation, victime = heapq.heappop(self.tas)
+            actuelle = self.compteurs[victime][0]
+            if actuelle == estimation:
+                break
+            heapq.heappush(self.tas, (actuelle, victime))
+        del self.compteurs[victime]
+        self.compteurs[cle] = [estimation + poids, estimation]
+        heapq.heappush(self.tas, (estimation + poids, cle))
+
+    def ajouter_lot(self, cles, poids):
+        """Ajoute un lot ; les poids d'une même clé sont d'abord cumulés (mêmes garanties)"""
+        uniques, inverse = np.unique(np.asarray(cles), return_inverse=True)
+        sommes = np.bincount(inverse, weights=np.asarray(poids, dtype='float64'))
+        for cle, poids_cle in zip(uniques.tolist(), sommes.tolist()):
+            self.ajouter(cle, poids_cle)
+
+    def borne_erreur(self):
+        """Surestimation maximale d'une clé suivie (W / m)"""
+        return self.total / self.nb_compteurs
+
+    def classement(self, k):
+        """Liste de (clé, estimation, erreur) des k plus grandes estimations"""
+        meilleurs = heapq.nlargest(k, self.compteurs.items(), key=lambda element: element[1][0])
+        return [(cle, estimation, erreur) for cle, (estimation, erreur) in meilleurs]
+
+class CountMin:
+    """Esquisse Count-Min des CA par clé entière, avec les k meilleurs candidats"""
+
+    def __init__(self, k=10, epsilon=0.001, delta=0.01, graine=0):
+        if k < 1:
+            raise ValueError(f"k doit être au moins 1 (reçu {k})")
+        if not 0 < epsilon < 1 or not 0 < delta < 1:
+            raise ValueError(f"epsilon et delta doivent être dans ]0, 1[ (reçus {epsilon} et {delta})")
+        self.k = k
+        self.epsilon = epsilon
+        self.largeur = math.ceil(math.e / epsilon)
+        self.profondeur = math.ceil(math.log(1 / delta))
+        self.table = np.zeros((self.profondeur, self.largeur))
+        rng = np.random.default_rng(graine)
+        self.a = rng.integers(1, PREMIER, self.profondeur, dtype='int64')[:, None]
+        self.b = rng.integers(0, PREMIER, self.profondeur, dtype='int64')[:, None]
+        self.candidats = {}     # clé -> estimation au dernier passage
+        self.total = 0.0
+
+    def positions(self, cles):
+        return (self.a * (cles[None, :] % PREMIER) + self.b) % PREMIER % self.largeur
+
+    def estimer(self, cles):
+        cles = np.asarray(cles, dtype='int64')
+        positions = self.positions(cles)
+        return self.table[np.arange(self.profondeur)[:, None], positions].min(axis=0)
+
+    def ajouter_lot(self, cles, poids):
+        uniques, inverse = np.unique(np.asarray(cles, dtype='int64'), return_inverse=True)
+        sommes = np.bincount(inverse, weights=np.asarray(poids, dtype='float64'))
+        positions = self.positions(uniques)
+        for ligne in range(self.profondeur):
+            np.add.at(self.table[ligne], positions[ligne], sommes)
+        self.total += sommes.sum()
+
+        # Seules les k meilleures clés du lot peuvent entrer dans les candidats
+        estimations = self.table[np.arange(self.profondeur)[:, None], positions].min(axis=0)
+        if len(uniques) > self.k:
+            meilleures = np.argpartition(estimations, -self.k)[-self.k:]
+            uniques, estimations = uniques[meilleures], estimations[meilleures]
+        self.candidats.update(zip(uniques.tolist(), estimations.tolist()))
+        if len(self.candidats) > self.k:
+            self.candidats = dict(heapq.nlargest(self.k, self.candidats.items(), key=lambda element: element[1]))
+
+    def borne_erreur(self):
+        """Surestimation maximale (epsilon * W), avec une probabilité d'au moins 1 - delta"""
+        return self.epsilon * self.total
+
+    def classement(self, k=None):
+        """Liste de (clé, estimation) des candidats, estimations recalculées"""
+        cles = list(self.candidats)
+        if not cles:
+            return []
+        estimations = self.estimer(cles).tolist()
+        return heapq.nlargest(k or self.k, zip(cles, estimations), key=lambda element: element[1])
+
+def lire_flux(conn, dimension='produit', taille_lot=100_000):
+    """Ventes (clé, montant) par lots de tableaux numpy, dans l'ordre de la table"""
+    curseur = conn.execute(DIMENSIONS[dimension]['flux'])
+    while True:
+        lignes = curseur.fetchmany(taille_lot)
+        if not lignes:
+            break
+        cles, montants = zip(*lignes)
+        yield np.array(cles, dtype='int64'), np.array(montants)
+
+def noms(conn, dimension, cles):
+    cles = list(cles)
+    requete = DIMENSIONS[dimension]['noms'].format(", ".join("?" * len(cles)))
+    return dict(conn.execute(requete, cles).fetchall())
+
+def valider_classements(chemin_bdd='ventes_magasin.db', k=10, dimension='produit', nb_compteurs=1000,
+                        epsilon=0.001, delta=0.01):
+    """Compare les classements approchés au classement exact et vérifie les bornes d'erreur.
+
+    Les ventes sont rejouées comme un flux d'ingestion. Retourne un
+    dictionnaire de mesures (rappel du top-k, erreurs maximales et bornes),
+    ou None si le classement exact est vide.
+    """
+    conn = ouvrir_connexion(chemin_bdd, lecture_seule=True)
+    with mesurer(f"top-{k} exact par tas", 'sqlite'):
+        exact = top_k_sql(conn, k, dimension)
+    totaux = dict(conn.execute(DIMENSIONS[dimension]['totaux']).fetchall())
+    # Sans vente, il n'y a aucune clé à comparer
+    if not exact:
+        conn.close()
+        print(f"\nAucun {dimension} classé : rien à valider.")
+        return None
+
+    space_saving = SpaceSaving(nb_compteurs)
+    count_min = CountMin(k, epsilon, delta)
+    with mesurer("flux space-saving et count-min", 'python'):
+        for cles, montants in lire_flux(conn, dimension):
+            space_saving.ajouter_lot(cles, montants)
+            count_min.ajouter_lot(cles, montants)
+    conn.close()
+
+    top_exact = {cle for cle, _ in exact}
+    top_ss = space_saving.classement(k)
+    top_cm = count_min.classement(k)
+    # Garantie de Space-Saving : estimation - erreur <= réel <= estimation, pour chaque clé suivie
+    hors_bornes_ss = sum(1 for cle, (estimation, erreur) in space_saving.compteurs.items()
+                         if not estimation - erreur - 1e-6 <= totaux[cle] <= estimation + 1e-6)
+    ecarts_cm = count_min.estimer(list(totaux)) - np.array(list(totaux.values()))
+    mesures = {
+        'k': k,
+        'rappel_space_saving': len(top_exact & {cle for cle, _, _ in top_ss}) / len(top_exact),
+        'rappel_count_min': len(top_exact & {cle for cle, _ in top_cm}) / len(top_exact),
+        'erreur_max_space_saving': max(estimation - totaux[cle] for cle, estimation, _ in top_ss),
+        'borne_space_saving': space_saving.borne_erreur(),
+        'hors_bornes_space_saving': hors_bornes_ss,
+        'erreur_max_count_min': float(ecarts_cm.max()),
+        'borne_count_min': count_min.borne_erreur(),
+        'part_hors_borne_count_min': float((ecarts_cm > count_min.borne_erreur()).mean()),
+        'sous_estimations_count_min': int((ecarts_cm < -1e-6).sum()),
+    }
+
+    print(f"\n=== Validation du top-{k} des {dimension}s ({len(totaux)} clés) ===")
+    print(f"Space-Saving ({nb_compteurs} compteurs) : rappel {mesures['rappel_space_saving']:.0%}, "
+          f"erreur max {mesures['erreur_max_space_saving']:,.2f}€ (borne W/m {mesures['borne_space_saving']:,.2f}€), "
+          f"{hors_bornes_ss} clé(s) hors de [estimation - erreur, estimation]")
+    print(f"Count-Min ({count_min.profondeur} x {count_min.largeur}) : rappel {mesures['rappel_count_min']:.0%}, "
+          f"erreur max {mesures['erreur_max_count_min']:,.2f}€ (borne epsilon*W {mesures['borne_count_min']:,.2f}€, "
+          f"dépassée pour {mesures['part_hors_borne_count_min']:.2%} des clés, probabilité admise {delta:.0%})")
+    return mesures
+
+def afficher_classement(chemin_bdd='ventes_magasin.db', k=10, dimension='produit'):
+    """Affiche le top-k exact des produits ou des clients par chiffre d'affaires"""
+    conn = ouvrir_connexion(chemin_bdd, lecture_seule=True)
+    with mesurer(f"top-{k} exact par tas", 'sqlite'):
+        classement = top_k_sql(conn, k, dimension)
+    libelles = noms(conn, dimension, [cle for cle, _ in classement])
+    conn.close()
+
+    print(f"\nTop {k} des {dimension}s par chiffre d'affaires:")
+    for rang, (cle, ca) in enumerate(classement, 1):
+        print(f"{rang:>3}. {libelles.get(cle, cle)!s:<30} {ca:>15,.2f}€")
+    return classement
+
+def main(argv=None, prog=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog=prog, description="Classements top-N des produits et des clients")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dimension", choices=list(DIMENSIONS), default="produit")
+    parser.add_argument("--valider", action="store_true",
+                        help="comparer Space-Saving et Count-Min au classement exact")
+    parser.add_argument("--compteurs", type=int, default=1000, help="compteurs de Space-Saving")
+    parser.add_argument("--epsilon", type=float, default=0.001, help="précision de Count-Min (part du CA total)")
+    args = parser.parse_args(argv)
+    if args.k < 1:
+        parser.error("--k doit être au moins 1")
+    if args.compteurs < 1:
+        parser.error("--compteurs doit être au moins 1")
+    if not 0 < args.epsilon < 1:
+        parser.error("--epsilon doit être strictement compris entre 0 et 1")
+
+    if args.valider:
+        valider_classements(k=args.k, dimension=args.dimension, nb_compteurs=args.compteurs, epsilon=args.epsilon)
+    else:
+        afficher_classement(k=args.k, dimension=args.dimension)
+
+if __name__ == "__main__":
+    main()
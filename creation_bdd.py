@@ -1,9 +1,184 @@
-
 import sqlite3
+import uuid
+
+# Profil "analytique" : index couvrants adaptés aux requêtes des rapports
+# (analyse_ventes.py / visualisation.py) et réglages SQLite pour la lecture
+INDEX_ANALYTIQUES = {
+    "idx_ventes_date_montant": "Ventes(date_vente, montant_total)",
+    "idx_ventes_produit_montant": "Ventes(id_produit, montant_total, quantite)",
+    "idx_ventes_client_montant": "Ventes(id_client, montant_total)",
+}
+
+# Schéma compact : date stockée en jours depuis le 1970-01-01 dans une table
+# STRICT ; date_vente, mois_vente et jour_semaine sont des colonnes générées
+# (jour_semaine suit la convention de strftime('%w') : 0 = dimanche).
+# Les rapports agrègent d'abord par jour_vente via un index couvrant, SQLite
+# ne traitant pas un index sur colonne générée comme couvrant.
+SCHEMA_VENTES_COMPACT = """
+CREATE TABLE {table} (
+    id_vente INTEGER PRIMARY KEY AUTOINCREMENT,
+    id_produit INTEGER NOT NULL,
+    id_client INTEGER,
+    jour_vente INTEGER NOT NULL,
+    quantite INTEGER NOT NULL,
+    montant_total REAL NOT NULL,
+    mode_paiement TEXT CHECK(mode_paiement IN ('Carte', 'Especes', 'Virement', 'Cheque')),
+    date_vente TEXT GENERATED ALWAYS AS (date(jour_vente * 86400, 'unixepoch')) VIRTUAL,
+    mois_vente TEXT GENERATED ALWAYS AS (strftime('%Y-%m', jour_vente * 86400, 'unixepoch')) VIRTUAL,
+    jour_semaine INTEGER GENERATED ALWAYS AS ((jour_vente + 4) % 7) VIRTUAL,
+    FOREIGN KEY (id_produit) REFERENCES Produits(id_produit),
+    FOREIGN KEY (id_client) REFERENCES Clients(id_client)
+) STRICT;
+"""
+
+INDEX_DATES_COMPACTES = {
+    "idx_ventes_jour_montant": "Ventes(jour_vente, montant_total)",
+}
+
+# Jeton tiré au hasard à chaque création du schéma : les états incrémentaux
+# (marges.py, export_arrow.py) reconnaissent ainsi une base recréée, même
+# avec autant de ventes qu'avant (voir empreinte_ventes).
+SCHEMA_IDENTITE = """
+CREATE TABLE Base_identite (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    jeton TEXT NOT NULL
+);
+"""
+
+PAGE_SIZE_ANALYTIQUE = 8192
+CACHE_SIZE_ANALYTIQUE = -65536        # en Kio (64 Mo)
+MMAP_SIZE_ANALYTIQUE = 256 * 1024 ** 2
+
+def configurer_connexion(conn):
+    """Applique les réglages de lecture du profil analytique (valables par connexion)"""
+    conn.execute(f"PRAGMA cache_size = {CACHE_SIZE_ANALYTIQUE}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE_ANALYTIQUE}")
+
+def utilise_dates_compactes(conn):
+    """Indique si la table Ventes utilise le schéma compact (jour_vente entier)"""
+    colonnes = [ligne[1] for ligne in conn.execute("PRAGMA table_xinfo(Ventes)")]
+    return 'jour_vente' in colonnes
+
+def empreinte_ventes(conn):
+    """Empreinte bon marché de l'historique des ventes : (jeton de création, sqlite_sequence de Ventes, MAX(id_vente)).
+
+    Quelques pages lues, quelle que soit la taille de Ventes. Le jeton vaut
+    None pour une base créée avant son introduction.
+    """
+    tables = {ligne[0] for ligne in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('Base_identite', 'sqlite_sequence')")}
+    jeton = (conn.execute("SELECT jeton FROM Base_identite").fetchone() or (None,))[0] \
+        if 'Base_identite' in tables else None
+    sequence = (conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'Ventes'").fetchone() or (0,))[0] \
+        if 'sqlite_sequence' in tables else 0
+    dernier = conn.execute("SELECT MAX(id_vente) FROM Ventes").fetchone()[0] or 0
+    return jeton, sequence, dernier
+
+def prolonge(empreinte, reference):
+    """Indique si la base d'empreinte prolonge celle de reference : même création, ventes seulement ajoutées.
+
+    sqlite_sequence ne décroît pas tant que la table existe ; une séquence ou
+    un MAX(id_vente) plus petits signalent des ventes supprimées.
+    """
+    jeton, sequence, dernier = empreinte
+    return jeton == reference[0] and sequence >= reference[1] and dernier >= reference[2]
+
+def creer_index(conn, index):
+    """Crée les index donnés sous la forme {nom: 'Table(colonnes)'}"""
+    for nom, definition in index.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {nom} ON {definition}")
+
+def creer_index_analytiques(chemin_bdd='ventes_magasin.db'):
+    """Crée les index du profil analytique puis met à jour les statistiques.
+
+    À appeler après le chargement en masse quand la base a été créée avec
+    index_differes=True.
+    """
+    conn = sqlite3.connect(chemin_bdd)
+    configurer_connexion(conn)
+    creer_index(conn, INDEX_ANALYTIQUES)
+    if utilise_dates_compactes(conn):
+        creer_index(conn, INDEX_DATES_COMPACTES)
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+
+def verifier_plans_requetes(chemin_bdd='ventes_magasin.db', requetes=None):
+    """Vérifie avec EXPLAIN QUERY PLAN que chaque requête de rapport lit Ventes via un index.
+
+    Par défaut, les requêtes vérifiées sont celles des graphiques de
+    visualisation.py pour cette base (voir rapports.py) (les requêtes servies par les agrégats ne lisent pas Ventes).
+    Lève une AssertionError listant les requêtes qui parcourent la table.
+    """
+    conn = sqlite3.connect(chemin_bdd)
+    if requetes is None:
+        from rapports import requetes_rapports
+        requetes = requetes_rapports(conn)
+
+    echecs = []
+    for nom, requete in requetes.items():
+        plan = [ligne[3] for ligne in conn.execute("EXPLAIN QUERY PLAN " + requete)]
+        # Accès à la table des faits (nommée Ventes ou aliasée v)
+        acces_ventes = [etape for etape in plan
+                        if etape.split(" ")[0] in ("SCAN", "SEARCH") and etape.split(" ")[1] in ("Ventes", "v")]
+        if any("INDEX" not in etape for etape in acces_ventes):
+            echecs.append(f"{nom}: {' | '.join(plan)}")
+        else:
+            print(f"{nom}: {' | '.join(acces_ventes) or 'Ventes non lue'}")
+    conn.close()
+
+    assert not echecs, "Requêtes sans index :\n" + "\n".join(echecs)
 
-def creer_base_de_donnees():
+def migrer_dates_compactes(chemin_bdd='ventes_magasin.db'):
+    """Convertit la table Ventes d'une base existante vers le schéma compact.
+
+    Les identifiants de vente sont conservés ; la conversion est faite en une
+    seule transaction.
+    """
+    conn = sqlite3.connect(chemin_bdd)
+    if utilise_dates_compactes(conn):
+        print("La table Ventes utilise déjà le schéma compact.")
+        conn.close()
+        return
+
+    anciens_index = [ligne[0] for ligne in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'Ventes' AND sql IS NOT NULL")]
+    cursor = conn.cursor()
+    cursor.execute("BEGIN")
+    cursor.execute(SCHEMA_VENTES_COMPACT.format(table="Ventes_compacte"))
+    cursor.execute("""
+    INSERT INTO Ventes_compacte (id_vente, id_produit, id_client, jour_vente, quantite, montant_total, mode_paiement)
+    SELECT id_vente, id_produit, id_client, CAST(julianday(date_vente) - 2440587.5 AS INTEGER),
+           quantite, montant_total, mode_paiement
+    FROM Ventes
+    """)
+    cursor.execute("DROP TABLE Ventes")
+    cursor.execute("ALTER TABLE Ventes_compacte RENAME TO Ventes")
+    creer_index(conn, INDEX_DATES_COMPACTES)
+    # Les index analytiques éventuels sont recréés sur la nouvelle table
+    creer_index(conn, {nom: definition for nom, definition in INDEX_ANALYTIQUES.items() if nom in anciens_index})
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.commit()
+
+    # Les triggers des agrégats ont disparu avec l'ancienne table
+    from agregats import agregats_actifs, creer_triggers_agregats
+    if agregats_actifs(conn):
+        creer_triggers_agregats(conn)
+    conn.close()
+    print("Migration vers le schéma compact terminée.")
+
+def creer_base_de_donnees(profil='defaut', index_differes=False, chemin_bdd='ventes_magasin.db',
+                          dates_compactes=False):
+    """Crée le schéma de la base.
+
+    profil='analytique' passe la base en WAL avec des pages de PAGE_SIZE_ANALYTIQUE
+    octets et crée les INDEX_ANALYTIQUES, sauf si index_differes=True (il faut
+    alors appeler creer_index_analytiques() après le chargement des données).
+    dates_compactes=True crée Ventes selon SCHEMA_VENTES_COMPACT.
+    """
     # Connexion à la base de données (elle sera créée si elle n'existe pas)
-    conn = sqlite3.connect('ventes_magasin.db')
+    conn = sqlite3.connect(chemin_bdd)
     cursor = conn.cursor()
     
     # Suppression des tables existantes (pour éviter les erreurs lors de la ré-exécution)
@@ -11,6 +186,18 @@ def creer_base_de_donnees():
     cursor.execute("DROP TABLE IF EXISTS Produits;")
     cursor.execute("DROP TABLE IF EXISTS Clients;")
     cursor.execute("DROP TABLE IF EXISTS Categories;")
+    for table in ("Agregats_etat", "Agregat_jour_produit", "Agregat_jour_client", "Agregat_jour_paiement",
+                  "Ingestions_etat", "Base_identite"):
+        cursor.execute(f"DROP TABLE IF EXISTS {table};")
+    conn.commit()
+
+    if profil == 'analytique':
+        # La taille de page ne peut changer qu'hors WAL et prend effet au VACUUM
+        cursor.execute("PRAGMA journal_mode = DELETE")
+        cursor.execute(f"PRAGMA page_size = {PAGE_SIZE_ANALYTIQUE}")
+        cursor.execute("VACUUM")
+        cursor.execute("PRAGMA journal_mode = WAL")
+        configurer_connexion(conn)
     
     # Création de la table Categories
     cursor.execute("""
@@ -49,24 +236,61 @@ def creer_base_de_donnees():
     """)
     
     # Création de la table Ventes
-    cursor.execute("""
-    CREATE TABLE Ventes (
-        id_vente INTEGER PRIMARY KEY AUTOINCREMENT,
-        id_produit INTEGER NOT NULL,
-        id_client INTEGER,
-        date_vente DATE NOT NULL,
-        quantite INTEGER NOT NULL,
-        montant_total REAL NOT NULL,
-        mode_paiement TEXT CHECK(mode_paiement IN ('Carte', 'Especes', 'Virement', 'Cheque')),
-        FOREIGN KEY (id_produit) REFERENCES Produits(id_produit),
-        FOREIGN KEY (id_client) REFERENCES Clients(id_client)
-    );
-    """)
+    if dates_compactes:
+        cursor.execute(SCHEMA_VENTES_COMPACT.format(table="Ventes"))
+        if not index_differes:
+            creer_index(conn, INDEX_DATES_COMPACTES)
+    else:
+        cursor.execute("""
+        CREATE TABLE Ventes (
+            id_vente INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_produit INTEGER NOT NULL,
+            id_client INTEGER,
+            date_vente DATE NOT NULL,
+            quantite INTEGER NOT NULL,
+            montant_total REAL NOT NULL,
+            mode_paiement TEXT CHECK(mode_paiement IN ('Carte', 'Especes', 'Virement', 'Cheque')),
+            FOREIGN KEY (id_produit) REFERENCES Produits(id_produit),
+            FOREIGN KEY (id_client) REFERENCES Clients(id_client)
+        );
+        """)
     
+    cursor.execute(SCHEMA_IDENTITE)
+    cursor.execute("INSERT INTO Base_identite VALUES (1, ?)", (uuid.uuid4().hex,))
+
     # Validation des changements et fermeture de la connexion
     conn.commit()
     conn.close()
+
+    if profil == 'analytique' and not index_differes:
+        creer_index_analytiques(chemin_bdd)
     print("Base de données créée avec succès!")
 
+def main(argv=None, prog=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog=prog, description="Création du schéma de la base de ventes")
+    parser.add_argument("--profil", choices=["defaut", "analytique"], default="defaut")
+    parser.add_argument("--index-differes", action="store_true",
+                        help="ne pas créer les index analytiques (à construire après chargement)")
+    parser.add_argument("--dates-compactes", action="store_true",
+                        help="stocker date_vente en jours entiers dans une table STRICT")
+    parser.add_argument("--migrer-dates", action="store_true",
+                        help="convertir la table Ventes existante vers le schéma compact")
+    parser.add_argument("--creer-index", action="store_true",
+                        help="construire les index analytiques sur la base existante")
+    parser.add_argument("--verifier-plans", action="store_true",
+                        help="vérifier que les requêtes des rapports utilisent un index")
+    args = parser.parse_args(argv)
+
+    if args.migrer_dates:
+        migrer_dates_compactes()
+    elif args.creer_index:
+        creer_index_analytiques()
+    elif args.verifier_plans:
+        verifier_plans_requetes()
+    else:
+        creer_base_de_donnees(args.profil, args.index_differes, dates_compactes=args.dates_compactes)
+
 if __name__ == "__main__":
-    creer_base_de_donnees()
\ No newline at end of file
+    main()
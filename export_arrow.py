@@ -0,0 +1,203 @@
+import json
+import os
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from creation_bdd import utilise_dates_compactes, empreinte_ventes, prolonge
+from acces_bdd import ouvrir_connexion
+
+# Export de la table de faits dénormalisée (la jointure de analyser_ventes)
+# en fichiers Arrow IPC non compressés, partitionnés par mois :
+#   <dossier>/mois=2023-01/part-<premier id>-<dernier id>.arrow
+# Les fichiers se lisent par memory-map sans copie ; les noms sont stockés
+# en dictionnaire. L'état garde l'empreinte de la base exportée
+# (creation_bdd.empreinte_ventes) : une base recréée ou des ventes
+# supprimées provoquent un export complet ; des ventes modifiées sur place
+# ne sont pas détectées (exporter avec complet=True).
+COLONNES_DICTIONNAIRE = ['nom_produit', 'nom_client', 'prenom_client', 'mode_paiement', 'nom_categorie', 'mois']
+
+FICHIER_ETAT = '_etat.json'
+
+def requete_export(compact):
+    """Jointure exportée ; la date est ramenée en jours depuis le 1970-01-01"""
+    if compact:
+        jour, mois = "v.jour_vente", "strftime('%Y-%m', v.jour_vente * 86400, 'unixepoch')"
+    else:
+        jour, mois = "CAST(julianday(v.date_vente) - 2440587.5 AS INTEGER)", "substr(v.date_vente, 1, 7)"
+    return f"""
+    SELECT
+        v.id_vente,
+        {jour} as date_vente,
+        {mois} as mois,
+        v.id_produit,
+        p.nom_produit,
+        p.prix_unitaire,
+        v.id_client,
+        c.nom as nom_client,
+        c.prenom as prenom_client,
+        v.quantite,
+        v.montant_total,
+        v.mode_paiement,
+        cat.nom_categorie
+    FROM Ventes v
+    JOIN Produits p ON v.id_produit = p.id_produit
+    LEFT JOIN Clients c ON v.id_client = c.id_client
+    JOIN Categories cat ON p.id_categorie = cat.id_categorie
+    WHERE v.id_vente > ?
+    ORDER BY v.id_vente
+    """
+
+def etat_vide():
+    return {'dernier_id_vente': 0, 'jeton': None, 'sequence': 0}
+
+def lire_etat(dossier):
+    chemin = os.path.join(dossier, FICHIER_ETAT)
+    if not os.path.exists(chemin):
+        return etat_vide()
+    with open(chemin) as f:
+        return json.load(f)
+
+def ecrire_etat(dossier, etat):
+    chemin = os.path.join(dossier, FICHIER_ETAT)
+    with open(chemin + '.tmp', 'w') as f:
+        json.dump(etat, f)
+    os.replace(chemin + '.tmp', chemin)
+
+def vers_arrow(chunk):
+    """Convertit un bloc de la jointure en table Arrow typée"""
+    table = pa.Table.from_pandas(chunk, preserve_index=False)
+    colonnes = {}
+    for nom in table.column_names:
+        colonne = table[nom]
+        if nom == 'date_vente':
+            colonne = colonne.cast(pa.int32()).cast(pa.date32())
+        elif nom in COLONNES_DICTIONNAIRE:
+            colonne = pc.dictionary_encode(colonne.cast(pa.string()))
+        elif nom in ('id_vente', 'id_produit', 'id_client', 'quantite'):
+            colonne = colonne.cast(pa.int32())
+        colonnes[nom] = colonne
+    return pa.table(colonnes)
+
+def vider_export(dossier):
+    """Supprime les partitions exportées et l'état"""
+    for nom in os.listdir(dossier):
+        if nom.startswith('mois='):
+            shutil.rmtree(os.path.join(dossier, nom))
+    if os.path.exists(os.path.join(dossier, FICHIER_ETAT)):
+        os.remove(os.path.join(dossier, FICHIER_ETAT))
+
+def exporter_ventes(dossier='ventes_arrow', chemin_bdd='ventes_magasin.db', taille_chunk=500_000, complet=False):
+    """Exporte vers dossier les ventes postérieures au dernier export.
+
+    Seules les ventes d'id_vente supérieur au dernier id exporté sont lues ;
+    elles sont ajoutées en nouveaux fichiers dans les partitions mensuelles.
+    Si la base ne prolonge plus celle du dernier export (recréée, ventes
+    supprimées), ou si complet=True, l'export est refait entièrement.
+    Retourne le nombre de ventes exportées.
+    """
+    os.makedirs(dossier, exist_ok=True)
+    etat = lire_etat(dossier)
+
+    conn = ouvrir_connexion(chemin_bdd, lecture_seule=True)
+    empreinte = empreinte_ventes(conn)
+    deja_exporte = (etat.get('jeton'), etat.get('sequence', 0), etat['dernier_id_vente'])
+    if complet or (etat['dernier_id_vente'] and not prolonge(empreinte, deja_exporte)):
+        if not complet:
+            print("La base ne correspond plus à l'export : export complet.")
+        vider_export(dossier)
+        etat = etat_vide()
+    etat['jeton'], etat['sequence'] = empreinte[0], empreinte[1]
+
+    query = requete_export(utilise_dates_compactes(conn))
+    nb = 0
+    for chunk in pd.read_sql_query(query, conn, params=(etat['dernier_id_vente'],), chunksize=taille_chunk):
+        if chunk.empty:
+            continue
+        table = vers_arrow(chunk)
+        premier, dernier = int(chunk['id_vente'].iloc[0]), int(chunk['id_vente'].iloc[-1])
+        for mois in chunk['mois'].unique():
+            partition = table.filter(pc.equal(table['mois'].cast(pa.string()), mois)).combine_chunks()
+            dossier_mois = os.path.join(dossier, f"mois={mois}")
+            os.makedirs(dossier_mois, exist_ok=True)
+            with pa.OSFile(os.path.join(dossier_mois, f"part-{premier:012d}-{dernier:012d}.arrow"), 'wb') as sink:
+                with pa.ipc.new_file(sink, partition.schema) as writer:
+                    writer.write_table(partition)
+        nb += len(chunk)
+        # L'état n'avance qu'une fois le bloc entièrement écrit
+        etat['dernier_id_vente'] = dernier
+        ecrire_etat(dossier, etat)
+    conn.close()
+    ecrire_etat(dossier, etat)
+
+    print(f"{nb} ventes exportées vers {dossier}.")
+    return nb
+
+def charger_ventes(dossier='ventes_arrow', colonnes=None, mois=None):
+    """Charge les ventes exportées par memory-map (sans copie des données).
+
+    colonnes restreint les colonnes lues, mois (liste de 'YYYY-MM') les partitions.
+    """
+    tables = []
+    for partition in sorted(os.listdir(dossier)):
+        if not partition.startswith('mois=') or (mois is not None and partition[5:] not in mois):
+            continue
+        for fichier in sorted(os.listdir(os.path.join(dossier, partition))):
+            source = pa.memory_map(os.path.join(dossier, partition, fichier), 'r')
+            table = pa.ipc.open_file(source).read_all()
+            tables.append(table.select(colonnes) if colonnes else table)
+    if not tables:
+        raise FileNotFoundError(f"Aucune vente exportée dans {dossier}")
+    # Les dictionnaires diffèrent d'un fichier à l'autre : on les unifie
+    return pa.concat_tables(tables).unify_dictionaries()
+
+def analyser_arrow(dossier='ventes_arrow'):
+    """Calcule produits_ca, categories_ca, ca_mensuel et ventes_client depuis l'export Arrow.
+
+    Les DataFrames ont la même forme que ceux de analyse_ventes.analyser_ventes().
+    """
+    table = charger_ventes(dossier, ['id_vente', 'mois', 'nom_produit', 'nom_client', 'prenom_client',
+                                     'quantite', 'montant_total', 'nom_categorie'])
+
+    def regrouper(cles, agregations):
+        resultat = table.group_by(cles).aggregate(agregations).to_pandas()
+        for cle in cles:
+            resultat[cle] = resultat[cle].astype(str)
+        return resultat.set_index(cles).sort_index()
+
+    produits_ca = regrouper(['nom_produit'], [('quantite', 'sum'), ('montant_total', 'sum')])
+    produits_ca.columns = ['quantite', 'montant_total']
+    produits_ca = produits_ca.sort_values('montant_total', ascending=False)
+
+    categories_ca = regrouper(['nom_categorie'], [('quantite', 'sum'), ('montant_total', 'sum'),
+                                                  ('montant_total', 'count')])
+    categories_ca.columns = pd.MultiIndex.from_tuples(
+        [('quantite', 'sum'), ('montant_total', 'sum'), ('montant_total', 'count')])
+    categories_ca = categories_ca.sort_values(('montant_total', 'sum'), ascending=False)
+
+    ca_mensuel = regrouper(['mois'], [('montant_total', 'sum'), ('id_vente', 'count')])
+    ca_mensuel.columns = ['CA_total', 'nb_ventes']
+    ca_mensuel.index = pd.PeriodIndex(ca_mensuel.index, freq='M', name='mois')
+
+    # Comme groupby de pandas, on écarte les ventes sans nom ou prénom de client
+    table = table.filter(pc.and_(pc.is_valid(table['nom_client']), pc.is_valid(table['prenom_client'])))
+    ventes_client = regrouper(['nom_client', 'prenom_client'], [('montant_total', 'sum'), ('id_vente', 'count')])
+    ventes_client.columns = ['CA_total', 'nb_achats']
+    ventes_client = ventes_client.sort_values('CA_total', ascending=False)
+
+    return produits_ca, categories_ca, ca_mensuel, ventes_client
+
+def main(argv=None, prog=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog=prog, description="Export Arrow IPC des ventes, partitionné par mois")
+    parser.add_argument("--dossier", default="ventes_arrow")
+    parser.add_argument("--chunk", type=int, default=500_000)
+    parser.add_argument("--complet", action="store_true",
+                        help="refaire tout l'export (par exemple après des ventes modifiées sur place)")
+    args = parser.parse_args(argv)
+
+    exporter_ventes(args.dossier, taille_chunk=args.chunk, complet=args.complet)
+
+if __name__ == "__main__":
+    main()
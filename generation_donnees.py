@@ -1,8 +1,15 @@
-
+import os
 import sqlite3
 import random
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 import numpy as np
+from creation_bdd import utilise_dates_compactes
+from acces_bdd import ouvrir_connexion
+
+MODES_PAIEMENT = np.array(["Carte", "Especes", "Virement", "Cheque"])
+REDUCTIONS = np.array([0, 0, 0, 0, 0.05, 0.1])
 
 # Fonctions utilitaires pour générer des données aléatoires
 def random_date(start_date, end_date):
@@ -16,8 +23,111 @@ def random_email(nom, prenom):
     domains = ["gmail.com", "yahoo.com", "hotmail.com", "outlook.com"]
     return f"{prenom.lower()}.{nom.lower()}{random.randint(1, 99)}@{random.choice(domains)}"
 
-def generer_donnees():
-    conn = sqlite3.connect('ventes_magasin.db')
+REQUETE_INSERTION_VENTES = """
+INSERT INTO Ventes (id_produit, id_client, {colonne_date}, quantite, montant_total, mode_paiement)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+def generateur_lot(entropie, num_lot):
+    """Générateur aléatoire propre à un lot, dérivé de la graine principale"""
+    return np.random.default_rng(np.random.SeedSequence(entropie, spawn_key=(num_lot,)))
+
+def generer_lot_ventes(rng, nb, ids_produits, prix, ids_clients, dates):
+    """Génère un lot de nb ventes de manière vectorisée.
+
+    ids_produits / ids_clients sont les identifiants existants, prix est un
+    tableau dense indexé par id_produit et dates le tableau des dates possibles
+    ('YYYY-MM-DD', ou jours entiers pour le schéma compact). Retourne une liste de tuples prête pour executemany.
+    """
+    idx_produits = ids_produits[rng.integers(0, len(ids_produits), nb)]
+    idx_clients = ids_clients[rng.integers(0, len(ids_clients), nb)]
+    jours = rng.integers(0, len(dates), nb)
+    quantites = rng.integers(1, 6, nb)
+
+    # Calcul du montant total avec possibilité de petite réduction (20% de chance)
+    reductions = REDUCTIONS[rng.integers(0, len(REDUCTIONS), nb)]
+    montants = np.round(prix[idx_produits] * quantites * (1 - reductions), 2)
+
+    modes = rng.integers(0, len(MODES_PAIEMENT), nb)
+
+    return list(zip(idx_produits.tolist(), idx_clients.tolist(), dates[jours].tolist(),
+                    quantites.tolist(), montants.tolist(), MODES_PAIEMENT[modes].tolist()))
+
+def generer_lot_fichier(tache):
+    """Génère un lot de ventes dans un fichier SQLite temporaire (exécuté dans un processus fils).
+
+    Retourne le chemin du fichier créé.
+    """
+    num_lot, nb, entropie, ids_produits, prix, ids_clients, dates, dossier = tache
+    ventes = generer_lot_ventes(generateur_lot(entropie, num_lot), nb, ids_produits, prix, ids_clients, dates)
+
+    chemin_lot = os.path.join(dossier, f"lot_{num_lot:06d}.db")
+    conn = sqlite3.connect(chemin_lot)
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("""
+    CREATE TABLE Ventes (id_produit INTEGER, id_client INTEGER, date_vente DATE,
+                         quantite INTEGER, montant_total REAL, mode_paiement TEXT)
+    """)
+    conn.executemany("INSERT INTO Ventes VALUES (?, ?, ?, ?, ?, ?)", ventes)
+    conn.commit()
+    conn.close()
+    return chemin_lot
+
+def preparer_ventes(conn, nb_produits, nb_clients):
+    """Tables en mémoire servant à générer les ventes des nb_produits et nb_clients derniers insérés.
+
+    Retourne (colonne_date, ids_produits, prix, ids_clients, dates) : prix est
+    indexé par id_produit (plus de SELECT par vente) et dates contient les
+    dates possibles, précalculées une seule fois.
+    """
+    lignes = conn.execute("SELECT id_produit, prix_unitaire FROM Produits ORDER BY id_produit DESC LIMIT ?",
+                          (nb_produits,)).fetchall()
+    ids_produits = np.array([l[0] for l in lignes], dtype=np.int64)
+    prix = np.zeros(int(ids_produits.max(initial=0)) + 1)
+    prix[ids_produits] = [l[1] for l in lignes]
+    ids_clients = np.array([l[0] for l in conn.execute(
+        "SELECT id_client FROM Clients ORDER BY id_client DESC LIMIT ?", (nb_clients,))], dtype=np.int64)
+    ids_produits.sort()
+    ids_clients.sort()
+
+    start_date = datetime(2023, 1, 1)
+    end_date = datetime(2023, 12, 31)
+    if utilise_dates_compactes(conn):
+        # Schéma compact : la date est stockée en jours depuis le 1970-01-01
+        premier_jour = (start_date - datetime(1970, 1, 1)).days
+        return ('jour_vente', ids_produits, prix, ids_clients,
+                np.arange(premier_jour, premier_jour + (end_date - start_date).days))
+    dates = np.array([(start_date + timedelta(days=d)).strftime('%Y-%m-%d')
+                      for d in range((end_date - start_date).days)])
+    return 'date_vente', ids_produits, prix, ids_clients, dates
+
+def generer_lots(nb_ventes, graine, taille_lot, ids_produits, prix, ids_clients, dates):
+    """Génère un par un les lots de ventes de taille_lot lignes (le dernier pouvant être plus court)"""
+    entropie = np.random.SeedSequence(graine).entropy
+    for num_lot, debut in enumerate(range(0, nb_ventes, taille_lot)):
+        yield generer_lot_ventes(generateur_lot(entropie, num_lot), min(taille_lot, nb_ventes - debut),
+                                 ids_produits, prix, ids_clients, dates)
+
+def inserer_ventes(conn, colonne_date, ventes):
+    conn.executemany(REQUETE_INSERTION_VENTES.format(colonne_date=colonne_date), ventes)
+
+def generer_donnees(nb_produits=150, nb_clients=150, nb_ventes=500, graine=None,
+                    taille_lot=100_000, chemin_bdd='ventes_magasin.db', nb_processus=1):
+    """Remplit la base avec des données synthétiques.
+
+    Les ventes sont générées par lots de taille_lot lignes (mémoire bornée),
+    chaque lot ayant sa propre graine dérivée de la graine principale. Avec
+    nb_processus > 1, les lots sont générés en parallèle puis fusionnés ; à
+    graine et taille_lot égales, la table Ventes obtenue est identique quel que
+    soit le nombre de processus.
+    """
+    if nb_ventes > 0 and (nb_produits < 1 or nb_clients < 1):
+        raise ValueError("Il faut au moins un produit et un client pour générer des ventes")
+    if graine is not None:
+        random.seed(graine)
+
+    conn = ouvrir_connexion(chemin_bdd)
     cursor = conn.cursor()
     
     # Liste des catégories de produits
@@ -38,7 +148,7 @@ def generer_donnees():
     cursor.executemany("INSERT INTO Categories (nom_categorie, description) VALUES (?, ?)", categories)
     conn.commit()
     
-    # Génération des produits (150 produits)
+    # Génération des produits
     produits = []
     noms_produits = {
         "Electronique": ["Smartphone", "Ordinateur portable", "Casque audio", "Tablette", "Montre connectée", 
@@ -63,13 +173,18 @@ def generer_donnees():
                       "Câble de démarrage", "Huile moteur", "Antigel", "Balai d'essuie-glace", "Chargeur allume-cigare"]
     }
     
-    for id_categorie in range(1, 11):
-        categorie_nom = categories[id_categorie-1][0]
-        for produit in noms_produits[categorie_nom]:
-            prix = round(random.uniform(5, 500), 2)
-            cout = round(prix * random.uniform(0.3, 0.7), 2)
-            stock = random.randint(0, 100)
-            produits.append((produit, id_categorie, prix, cout, stock))
+    catalogue = [(nom, id_categorie)
+                 for id_categorie, (categorie_nom, _) in enumerate(categories, start=1)
+                 for nom in noms_produits[categorie_nom]]
+    for i in range(nb_produits):
+        produit, id_categorie = catalogue[i % len(catalogue)]
+        # Au-delà du catalogue de base, on numérote les variantes
+        if i >= len(catalogue):
+            produit = f"{produit} {i // len(catalogue) + 1}"
+        prix = round(random.uniform(5, 500), 2)
+        cout = round(prix * random.uniform(0.3, 0.7), 2)
+        stock = random.randint(0, 100)
+        produits.append((produit, id_categorie, prix, cout, stock))
     
     cursor.executemany("""
     INSERT INTO Produits (nom_produit, id_categorie, prix_unitaire, cout_production, stock_actuel)
@@ -77,7 +192,7 @@ def generer_donnees():
     """, produits)
     conn.commit()
     
-    # Génération des clients (150 clients)
+    # Génération des clients
     noms = ["Martin", "Bernard", "Dubois", "Thomas", "Robert", "Richard", "Petit", "Durand", "Leroy", "Moreau",
             "Simon", "Laurent", "Lefebvre", "Michel", "Garcia", "David", "Bertrand", "Roux", "Vincent", "Fournier",
             "Morel", "Girard", "Andre", "Lefevre", "Mercier", "Dupont", "Lambert", "Bonnet", "Francois", "Martinez"]
@@ -90,7 +205,7 @@ def generer_donnees():
              "Rennes", "Reims", "Le Havre", "Saint-Étienne", "Toulon", "Grenoble", "Dijon", "Angers", "Nîmes", "Villeurbanne"]
     
     clients = []
-    for i in range(150):
+    for i in range(nb_clients):
         nom = random.choice(noms)
         prenom = random.choice(prenoms)
         email = random_email(nom, prenom)
@@ -106,38 +221,58 @@ def generer_donnees():
     """, clients)
     conn.commit()
     
-    # Génération des ventes (500 ventes)
-    ventes = []
-    start_date = datetime(2023, 1, 1)
-    end_date = datetime(2023, 12, 31)
-    
-    for _ in range(500):
-        id_produit = random.randint(1, 150)
-        id_client = random.randint(1, 150)
-        date_vente = random_date(start_date, end_date)
-        quantite = random.randint(1, 5)
-        
-        # Récupération du prix unitaire
-        cursor.execute("SELECT prix_unitaire FROM Produits WHERE id_produit = ?", (id_produit,))
-        prix_unitaire = cursor.fetchone()[0]
-        
-        # Calcul du montant total avec possibilité de petite réduction
-        reduction = random.choice([0, 0, 0, 0, 0.05, 0.1])  # 20% chance de réduction
-        montant_total = round(prix_unitaire * quantite * (1 - reduction), 2)
-        
-        mode_paiement = random.choice(["Carte", "Especes", "Virement", "Cheque"])
-        
-        ventes.append((id_produit, id_client, date_vente.strftime('%Y-%m-%d'), quantite, montant_total, mode_paiement))
-    
-    cursor.executemany("""
-    INSERT INTO Ventes (id_produit, id_client, date_vente, quantite, montant_total, mode_paiement)
-    VALUES (?, ?, ?, ?, ?, ?)
-    """, ventes)
-    conn.commit()
+    # Génération des ventes par lots
+    colonne_date, ids_produits, prix, ids_clients, dates = preparer_ventes(conn, nb_produits, nb_clients)
+    sequence = np.random.SeedSequence(graine)
+
+    # Chargement en masse : pas de fsync intermédiaire
+    cursor.execute("PRAGMA synchronous = OFF")
+    lots = [(num_lot, min(taille_lot, nb_ventes - debut))
+            for num_lot, debut in enumerate(range(0, nb_ventes, taille_lot))]
+
+    if nb_processus > 1:
+        # Chaque lot est généré dans son propre fichier SQLite par un processus,
+        # puis fusionné dans l'ordre des lots : le résultat ne dépend pas du
+        # nombre de processus.
+        with tempfile.TemporaryDirectory() as dossier, \
+                ProcessPoolExecutor(max_workers=nb_processus) as executor:
+            taches = [(num_lot, nb, sequence.entropy, ids_produits, prix, ids_clients, dates, dossier)
+                      for num_lot, nb in lots]
+            for chemin_lot in executor.map(generer_lot_fichier, taches):
+                cursor.execute("ATTACH DATABASE ? AS lot", (chemin_lot,))
+                cursor.execute(f"""
+                INSERT INTO Ventes (id_produit, id_client, {colonne_date}, quantite, montant_total, mode_paiement)
+                SELECT id_produit, id_client, date_vente, quantite, montant_total, mode_paiement
+                FROM lot.Ventes ORDER BY rowid
+                """)
+                conn.commit()
+                cursor.execute("DETACH DATABASE lot")
+                os.remove(chemin_lot)
+    else:
+        for ventes in generer_lots(nb_ventes, graine, taille_lot, ids_produits, prix, ids_clients, dates):
+            inserer_ventes(cursor, colonne_date, ventes)
+        conn.commit()
     
     # Fermeture de la connexion
     conn.close()
     print("Données générées avec succès!")
 
+def main(argv=None, prog=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog=prog, description="Génération de données de ventes synthétiques")
+    parser.add_argument("--produits", type=int, default=150)
+    parser.add_argument("--clients", type=int, default=150)
+    parser.add_argument("--ventes", type=int, default=500)
+    parser.add_argument("--graine", type=int, default=None)
+    parser.add_argument("--taille-lot", type=int, default=100_000)
+    parser.add_argument("--processus", type=int, default=1)
+    args = parser.parse_args(argv)
+    if args.ventes > 0 and (args.produits < 1 or args.clients < 1):
+        parser.error("--produits et --clients doivent être au moins 1 pour générer des ventes")
+
+    generer_donnees(args.produits, args.clients, args.ventes, args.graine, args.taille_lot,
+                    nb_processus=args.processus)
+
 if __name__ == "__main__":
-    generer_donnees()
\ No newline at end of file
+    main()
@@ -0,0 +1,335 @@
+import csv
+import json
+import math
+import os
+import time
+from datetime import datetime
+from itertools import islice
+from operator import itemgetter
+from creation_bdd import utilise_dates_compactes
+from acces_bdd import ouvrir_connexion, DELAI_ATTENTE
+
+# Ingestion en masse des ventes des caisses (fichiers CSV avec en-tête ou
+# JSONL, un objet par ligne). Les lignes sont lues par un générateur, puis
+# validées et insérées par lots de taille_lot (une transaction par lot).
+COLONNES = ('id_produit', 'id_client', 'date_vente', 'quantite', 'montant_total', 'mode_paiement')
+COLONNES_OBLIGATOIRES = ('id_produit', 'date_vente', 'quantite', 'mode_paiement')
+
+# Motifs de rejet des lignes illisibles : lire_csv() et lire_jsonl() les
+# produisent à la place des valeurs de la ligne (voir convertir_vente)
+LIGNE_JSON_INVALIDE = "ligne JSON invalide"
+LIGNE_CSV_INVALIDE = "nombre de champs différent de l'en-tête"
+
+# Même liste que la contrainte CHECK de la table Ventes
+MODES_PAIEMENT = frozenset(('Carte', 'Especes', 'Virement', 'Cheque'))
+
+# Point de reprise par fichier : nombre de lignes de données déjà traitées
+# (insérées ou rejetées). Il est mis à jour dans la transaction de chaque lot.
+SCHEMA_ETAT = """
+CREATE TABLE IF NOT EXISTS Ingestions_etat (
+    fichier TEXT PRIMARY KEY,
+    lignes_traitees INTEGER NOT NULL,
+    nb_inseres INTEGER NOT NULL,
+    nb_rejetes INTEGER NOT NULL
+);
+"""
+
+def lire_csv(chemin):
+    """Génère les lignes d'un CSV avec en-tête, sous forme de tuples dans l'ordre de COLONNES"""
+    with open(chemin, newline='', encoding='utf-8') as f:
+        lecteur = csv.reader(f)
+        entete = next(lecteur, [])
+        manquantes = [c for c in COLONNES_OBLIGATOIRES if c not in entete]
+        if manquantes:
+            raise ValueError(f"{chemin} : colonnes manquantes {', '.join(manquantes)}")
+        positions = [entete.index(c) if c in entete else None for c in COLONNES]
+        if None not in positions:
+            extraire = itemgetter(*positions)
+            for ligne in lecteur:
+                yield extraire(ligne) if len(ligne) == len(entete) else LIGNE_CSV_INVALIDE
+        else:
+            for ligne in lecteur:
+                yield tuple(ligne[p] if p is not None and p < len(ligne) else None for p in positions)
+
+def lire_jsonl(chemin):
+    """Génère les lignes d'un fichier JSONL (un objet par ligne), sous forme de tuples dans l'ordre de COLONNES.
+
+    Les booléens sont rendus sous leur forme JSON ('true', 'false') : égaux à
+    1 et 0, ils passeraient sinon pour des identifiants ou des quantités
+    valides ; ils sont ainsi rejetés comme le même texte dans un CSV.
+    """
+    with open(chemin, encoding='utf-8') as f:
+        for ligne in f:
+            try:
+                vente = json.loads(ligne)
+            except ValueError:
+                vente = None
+            if not isinstance(vente, dict):
+                yield LIGNE_JSON_INVALIDE
+                continue
+            valeurs = tuple(vente.get(c) for c in COLONNES)
+            if bool in map(type, valeurs):
+                valeurs = tuple(json.dumps(v) if isinstance(v, bool) else v for v in valeurs)
+            yield valeurs
+
+def lire_ventes(chemin):
+    if chemin.endswith(('.jsonl', '.ndjson')):
+        return lire_jsonl(chemin)
+    return lire_csv(chemin)
+
+def charger_referentiel(conn, compact):
+    """Prix et identifiants valides, chargés une fois en mémoire.
+
+    Les dictionnaires associent une valeur brute lue dans un fichier (texte
+    ou nombre) à la valeur validée ; ils sont complétés au fil de l'ingestion
+    (dates, quantités), si bien que chaque valeur distincte n'est analysée
+    qu'une fois.
+    """
+    prix = dict(conn.execute("SELECT id_produit, prix_unitaire FROM Produits"))
+    clients = {None: None, '': None}
+    for (id_client,) in conn.execute("SELECT id_client FROM Clients"):
+        clients[id_client] = clients[str(id_client)] = id_client
+    return {
+        'compact': compact,
+        'prix': prix,
+        'produits': {cle: id_produit for id_produit in prix for cle in (id_produit, str(id_produit))},
+        'clients': clients,
+        'quantites': {},
+        'dates': {},
+    }
+
+def entier(valeur, nom):
+    """Convertit un identifiant ou une quantité en int sans arrondir.
+
+    Un nombre JSON doit être entier (2 ou 2.0, pas 2.7) ; les booléens,
+    que int() accepterait, sont refusés.
+    """
+    if isinstance(valeur, bool) or (isinstance(valeur, float) and not valeur.is_integer()):
+        raise ValueError(f"{nom} invalide {valeur!r}")
+    return int(valeur)
+
+def convertir_montant(valeur):
+    """Convertit un montant en float ; NaN (qui deviendrait NULL dans SQLite), l'infini et les booléens sont refusés"""
+    montant = float(valeur) if not isinstance(valeur, bool) else math.nan
+    if not math.isfinite(montant):
+        raise ValueError(f"montant invalide {valeur!r}")
+    return montant
+
+def convertir_vente(ligne, referentiel):
+    """Valide une ligne brute et la convertit en vente ; lève ValueError avec le motif du rejet.
+
+    Vérifie les contraintes de la table Ventes (NOT NULL, CHECK sur
+    mode_paiement) et les clés étrangères. Un montant absent est calculé
+    depuis le prix unitaire du produit.
+    """
+    if isinstance(ligne, str):
+        # Ligne illisible : le lecteur a donné le motif du rejet à la place des valeurs
+        raise ValueError(ligne)
+    id_produit, id_client, date_vente, quantite, montant, mode = ligne
+    # True == 1 : un booléen trouverait l'entier correspondant dans le référentiel
+    for nom, valeur in (('client', id_client), ('quantité', quantite)):
+        if isinstance(valeur, bool):
+            raise ValueError(f"{nom} invalide {valeur!r}")
+    produit = entier(id_produit, 'produit')
+    if produit not in referentiel['prix']:
+        raise ValueError(f"produit inconnu {id_produit}")
+    referentiel['produits'][id_produit] = produit
+
+    if id_client not in referentiel['clients']:
+        client = entier(id_client, 'client')
+        if client not in referentiel['clients']:
+            raise ValueError(f"client inconnu {id_client}")
+        referentiel['clients'][id_client] = client
+
+    if quantite not in referentiel['quantites']:
+        valeur = entier(quantite, 'quantité')
+        if valeur <= 0:
+            raise ValueError(f"quantité invalide {quantite}")
+        referentiel['quantites'][quantite] = valeur
+
+    if date_vente not in referentiel['dates']:
+        date = datetime.strptime(date_vente, '%Y-%m-%d')
+        referentiel['dates'][date_vente] = ((date - datetime(1970, 1, 1)).days if referentiel['compact']
+                                            else date.strftime('%Y-%m-%d'))
+
+    if mode not in MODES_PAIEMENT:
+        raise ValueError(f"mode de paiement invalide {mode!r}")
+
+    q = referentiel['quantites'][quantite]
+    if montant is None or montant == '':
+        montant = round(referentiel['prix'][produit] * q, 2)
+    else:
+        montant = convertir_montant(montant)
+    return (produit, referentiel['clients'][id_client], referentiel['dates'][date_vente], q, montant, mode)
+
+def valider_lot(lignes, premier, referentiel, rejets):
+    """Retourne les ventes valides de lignes, prêtes pour executemany.
+
+    Les valeurs déjà rencontrées sont validées par simple recherche dans les
+    dictionnaires du référentiel ; les autres passent par convertir_vente().
+    Les lignes invalides sont ajoutées à rejets sous la forme (numéro, motif),
+    les lignes étant numérotées à partir de premier.
+    """
+    produits, clients, prix = referentiel['produits'], referentiel['clients'], referentiel['prix']
+    quantites, dates = referentiel['quantites'], referentiel['dates']
+    ventes = []
+    ajouter, isfinite = ventes.append, math.isfinite
+    for num, ligne in enumerate(lignes, premier):
+        try:
+            id_produit, id_client, date_vente, quantite, montant, mode = ligne
+            if mode not in MODES_PAIEMENT:
+                raise KeyError(mode)
+            produit = produits[id_produit]
+            q = quantites[quantite]
+            montant = round(prix[produit] * q, 2) if montant is None or montant == '' else float(montant)
+            if not isfinite(montant):
+                raise ValueError(montant)
+            ajouter((produit, clients[id_client], dates[date_vente], q, montant, mode))
+        except (KeyError, TypeError, ValueError):
+            try:
+                ajouter(convertir_vente(ligne, referentiel))
+            except (TypeError, ValueError) as e:
+                rejets.append((num, str(e)))
+    return ventes
+
+def tronquer_rejets(chemin_rejets, deja_traitees):
+    """Retire de chemin_rejets les rejets des lignes au-delà de deja_traitees.
+
+    Les rejets d'un lot sont écrits avant son commit : si l'ingestion s'est
+    arrêtée entre les deux, le lot est retraité à la reprise et ses rejets
+    seraient sinon écrits deux fois.
+    """
+    if not os.path.exists(chemin_rejets):
+        return
+    with open(chemin_rejets, encoding='utf-8') as f:
+        gardes = [ligne for ligne in f if int(ligne.split('\t', 1)[0]) <= deja_traitees]
+    with open(chemin_rejets + '.tmp', 'w', encoding='utf-8') as f:
+        f.writelines(gardes)
+    os.replace(chemin_rejets + '.tmp', chemin_rejets)
+
+def lire_etat(conn, fichier):
+    conn.execute(SCHEMA_ETAT)
+    ligne = conn.execute("SELECT lignes_traitees, nb_inseres, nb_rejetes FROM Ingestions_etat WHERE fichier = ?",
+                         (fichier,)).fetchone()
+    return ligne or (0, 0, 0)
+
+def ingerer_fichier(conn, chemin, referentiel, taille_lot=200_000, reprendre=True, suivis=()):
+    """Insère les ventes de chemin par transactions de taille_lot lignes.
+
+    Le point de reprise est enregistré dans la même transaction que le lot :
+    après une interruption, l'ingestion reprend à la première ligne non
+    traitée. Les lignes rejetées sont écrites dans <chemin>.rejets (numéro de
+    ligne et motif), sans doublon après une reprise (voir tronquer_rejets).
+    Chaque suivi (par exemple classements.SpaceSaving) reçoit les id_produit
+    et montants de chaque lot validé.
+    Retourne (nb insérées, nb rejetées) pour cette exécution.
+    """
+    fichier = os.path.abspath(chemin)
+    if not reprendre:
+        conn.execute(SCHEMA_ETAT)
+        conn.execute("DELETE FROM Ingestions_etat WHERE fichier = ?", (fichier,))
+        conn.commit()
+    deja_traitees, total_inseres, total_rejetes = lire_etat(conn, fichier)
+    if deja_traitees:
+        print(f"{chemin} : reprise après {deja_traitees} lignes déjà traitées")
+    tronquer_rejets(chemin + '.rejets', deja_traitees)
+
+    colonne_date = 'jour_vente' if referentiel['compact'] else 'date_vente'
+    insertion = f"""
+    INSERT INTO Ventes (id_produit, id_client, {colonne_date}, quantite, montant_total, mode_paiement)
+    VALUES (?, ?, ?, ?, ?, ?)
+    """
+
+    lignes = islice(lire_ventes(chemin), deja_traitees, None)
+    traitees, nb_inseres, nb_rejetes = deja_traitees, 0, 0
+    while True:
+        lot = list(islice(lignes, taille_lot))
+        if not lot:
+            break
+        rejets = []
+        ventes = valider_lot(lot, traitees + 1, referentiel, rejets)
+        if rejets:
+            with open(chemin + '.rejets', 'a', encoding='utf-8') as f:
+                f.writelines(f"{num}\t{motif}\n" for num, motif in rejets)
+        conn.executemany(insertion, ventes)
+        traitees += len(lot)
+        nb_inseres += len(ventes)
+        nb_rejetes += len(rejets)
+        conn.execute("""
+        INSERT INTO Ingestions_etat VALUES (?, ?, ?, ?)
+        ON CONFLICT (fichier) DO UPDATE SET lignes_traitees = excluded.lignes_traitees,
+                                            nb_inseres = excluded.nb_inseres, nb_rejetes = excluded.nb_rejetes
+        """, (fichier, traitees, total_inseres + nb_inseres, total_rejetes + nb_rejetes))
+        conn.commit()
+        for suivi in suivis:
+            suivi.ajouter_lot([vente[0] for vente in ventes], [vente[4] for vente in ventes])
+    return nb_inseres, nb_rejetes
+
+def ingerer_ventes(fichiers, chemin_bdd='ventes_magasin.db', taille_lot=200_000, reprendre=True,
+                   delai_attente=DELAI_ATTENTE, suivis=()):
+    """Ajoute à la table Ventes les ventes des fichiers CSV/JSONL donnés.
+
+    La base est en WAL (voir acces_bdd) : les rapports peuvent la lire pendant
+    le chargement. Pendant celui-ci, synchronous=OFF et la contrainte CHECK
+    de Ventes n'est pas réévaluée par SQLite (valider_lot applique la même
+    règle). Les tables d'agrégats et l'export Arrow intègrent ensuite les
+    nouvelles ventes à leur prochain rafraîchissement (ils suivent le dernier
+    id_vente traité). Les suivis sont transmis à ingerer_fichier().
+    Retourne un dictionnaire de statistiques (lignes insérées, rejetées, débit).
+    """
+    conn = ouvrir_connexion(chemin_bdd, delai_attente=delai_attente)
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA ignore_check_constraints = ON")
+    referentiel = charger_referentiel(conn, utilise_dates_compactes(conn))
+
+    debut = time.perf_counter()
+    nb_inseres = nb_rejetes = 0
+    try:
+        for chemin in fichiers:
+            debut_fichier = time.perf_counter()
+            inseres, rejetes = ingerer_fichier(conn, chemin, referentiel, taille_lot, reprendre, suivis)
+            duree = time.perf_counter() - debut_fichier
+            print(f"{chemin} : {inseres} ventes insérées, {rejetes} rejetées "
+                  f"({(inseres + rejetes) / duree if duree else 0:,.0f} lignes/s)")
+            nb_inseres += inseres
+            nb_rejetes += rejetes
+    finally:
+        # Les lots déjà validés restent acquis ; le lot en cours est annulé
+        conn.rollback()
+        conn.close()
+    duree = time.perf_counter() - debut
+
+    debit = (nb_inseres + nb_rejetes) / duree if duree else 0
+    print(f"Ingestion terminée : {nb_inseres} ventes insérées, {nb_rejetes} rejetées en {duree:.2f} s "
+          f"({debit:,.0f} lignes/s)")
+    return {'nb_inseres': nb_inseres, 'nb_rejetes': nb_rejetes, 'duree': duree, 'lignes_par_seconde': debit}
+
+def main(argv=None, prog=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog=prog, description="Ingestion des ventes des caisses (CSV ou JSONL)")
+    parser.add_argument("fichiers", nargs="+")
+    parser.add_argument("--taille-lot", type=int, default=200_000, help="lignes par transaction")
+    parser.add_argument("--recommencer", action="store_true",
+                        help="ignorer les points de reprise et relire les fichiers depuis le début")
+    parser.add_argument("--delai-attente", type=float, default=DELAI_ATTENTE,
+                        help="attente maximale d'un verrou en secondes")
+    parser.add_argument("--top", type=int, default=None, metavar="K",
+                        help="afficher les K produits au plus fort CA parmi les ventes ingérées (Space-Saving)")
+    args = parser.parse_args(argv)
+    if args.top is not None and args.top < 1:
+        parser.error("--top doit être au moins 1")
+
+    suivis = ()
+    if args.top:
+        from classements import SpaceSaving
+        suivis = (SpaceSaving(),)
+    ingerer_ventes(args.fichiers, taille_lot=args.taille_lot, reprendre=not args.recommencer,
+                   delai_attente=args.delai_attente, suivis=suivis)
+    if args.top:
+        print(f"\nTop {args.top} des produits ingérés (CA estimé par Space-Saving) :")
+        for id_produit, estimation, erreur in suivis[0].classement(args.top):
+            print(f"  produit {id_produit:<8} {estimation:>15,.2f}€  (surestimation ≤ {erreur:,.2f}€)")
+
+if __name__ == "__main__":
+    main()
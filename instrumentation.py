@@ -0,0 +1,284 @@
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Instrumentation optionnelle des rapports : chaque instruction SQL (via les
+# callbacks trace et progress de sqlite3), chaque agrégation pandas et chaque
+# rendu / sauvegarde de graphique est chronométré. Elle est activée par
+# activer() (option --profil des scripts) ou par la variable d'environnement
+# VENTES_PROFIL=<dossier>, héritée par les processus de rendu. Désactivée,
+# elle ne coûte qu'un test par appel.
+#
+# Chaque exécution produit dans le dossier :
+#   profil_<id>.json        événements, requêtes (durée, lignes, plan) et totaux
+#   profil_<id>.trace.json  format Chrome trace (chrome://tracing, Perfetto)
+VARIABLE_DOSSIER = 'VENTES_PROFIL'
+VARIABLE_SEUIL = 'VENTES_PROFIL_SEUIL'
+VARIABLE_EXECUTION = 'VENTES_PROFIL_EXECUTION'
+VARIABLE_PID = 'VENTES_PROFIL_PID'
+
+DOSSIER_PROFILS = 'profils'
+SEUIL_LENT = 0.5            # en secondes
+PAS_PROGRESSION = 1000      # instructions de la VM SQLite entre deux appels du callback progress
+
+class Profileur:
+    """Collecte les événements d'une exécution (ou de sa part dans un processus de rendu)"""
+
+    def __init__(self, dossier, seuil_lent, execution, processus_fils=False):
+        self.dossier = dossier
+        self.seuil_lent = seuil_lent
+        self.execution = execution
+        self.processus_fils = processus_fils
+        self.pid = os.getpid()
+        self.debut = time.time()
+        self.evenements = []
+        self.requetes = []
+        self.verrou = threading.Lock()
+        self.en_cours = {}      # instruction SQL en cours par connexion
+
+    def ajouter(self, nom, categorie, debut, duree, **details):
+        with self.verrou:
+            self.evenements.append({'nom': nom, 'categorie': categorie, 'debut': debut, 'duree': duree,
+                                    'pid': os.getpid(), 'tid': threading.get_ident(), 'details': details})
+
+    def instrumenter(self, conn):
+        """Chronomètre les instructions SQL de conn.
+
+        Le callback trace marque le début de chaque instruction ; le callback
+        progress, appelé toutes les PAS_PROGRESSION instructions de la VM,
+        en repousse la fin et compte le travail effectué. La durée mesurée
+        couvre donc l'exécution dans SQLite, lecture des résultats comprise.
+        """
+        chemin = next((ligne[2] for ligne in conn.execute("PRAGMA database_list") if ligne[1] == 'main'), '')
+        cle = id(conn)
+
+        def tracer(sql):
+            maintenant = time.time()
+            courante = self.en_cours.get(cle)
+            # Les sous-programmes des triggers sont rapportés avec le texte de l'instruction
+            if courante is not None and courante['sql'] == sql and courante['fin'] >= maintenant - 0.001:
+                return
+            courante = {'sql': sql, 'base': chemin, 'debut': maintenant, 'fin': maintenant, 'pas_vm': 0,
+                        'lignes': None, 'tid': threading.get_ident()}
+            self.en_cours[cle] = courante
+            with self.verrou:
+                self.requetes.append(courante)
+
+        def progresser():
+            courante = self.en_cours.get(cle)
+            if courante is not None:
+                courante['fin'] = time.time()
+                courante['pas_vm'] += PAS_PROGRESSION
+            return 0
+
+        conn.set_trace_callback(tracer)
+        conn.set_progress_handler(progresser, PAS_PROGRESSION)
+        return conn
+
+    def compter_lignes(self, conn, nb):
+        courante = self.en_cours.get(id(conn))
+        if courante is not None:
+            courante['lignes'] = (courante['lignes'] or 0) + nb
+            courante['fin'] = max(courante['fin'], time.time())
+
+    def evenements_requetes(self):
+        for requete in self.requetes:
+            requete['duree'] = requete['fin'] - requete['debut']
+        return [{'nom': requete['sql'][:80], 'categorie': 'sqlite', 'debut': requete['debut'],
+                 'duree': requete['duree'], 'pid': self.pid, 'tid': requete['tid'],
+                 'details': {'lignes': requete['lignes'], 'pas_vm': requete['pas_vm']}}
+                for requete in self.requetes]
+
+    def vider_fragment(self):
+        """Processus de rendu : ajoute ses événements au fragment lu par le processus principal"""
+        evenements = self.evenements + self.evenements_requetes()
+        if not evenements:
+            return
+        chemin = os.path.join(self.dossier, f"profil_{self.execution}.{os.getpid()}.jsonl")
+        with open(chemin, 'a') as f:
+            f.writelines(json.dumps(evenement) + '\n' for evenement in evenements)
+        self.evenements, self.requetes = [], []
+
+    def lire_fragments(self):
+        prefixe = f"profil_{self.execution}."
+        evenements = []
+        for fichier in sorted(os.listdir(self.dossier)):
+            if fichier.startswith(prefixe) and fichier.endswith('.jsonl'):
+                chemin = os.path.join(self.dossier, fichier)
+                with open(chemin) as f:
+                    evenements.extend(json.loads(ligne) for ligne in f)
+                os.remove(chemin)
+        return evenements
+
+    def capturer_plans(self):
+        """EXPLAIN QUERY PLAN de chaque requête de lecture distincte, sur une connexion séparée"""
+        plans = {}
+        for requete in self.requetes:
+            sql = requete['sql']
+            if not sql.lstrip().upper().startswith(('SELECT', 'WITH')) or not requete['base']:
+                continue
+            if (requete['base'], sql) not in plans:
+                try:
+                    conn = sqlite3.connect(pathlib.Path(requete['base']).absolute().as_uri() + '?mode=ro', uri=True)
+                    # Requête non développée : des paramètres NULL suffisent, le plan ne dépend pas de leurs valeurs
+                    parametres = (None,) * sql.count('?')
+                    plans[requete['base'], sql] = [ligne[3] for ligne in
+                                                   conn.execute("EXPLAIN QUERY PLAN " + sql, parametres)]
+                    conn.close()
+                except sqlite3.Error as e:
+                    plans[requete['base'], sql] = [f"plan indisponible : {e}"]
+            requete['plan'] = plans[requete['base'], sql]
+
+    def terminer(self):
+        """Écrit le profil JSON et la trace Chrome ; retourne le chemin du profil"""
+        os.makedirs(self.dossier, exist_ok=True)
+        self.capturer_plans()
+        evenements = self.evenements + self.evenements_requetes() + self.lire_fragments()
+        evenements.sort(key=lambda evenement: evenement['debut'])
+
+        lentes = [requete for requete in self.requetes if requete['duree'] > self.seuil_lent]
+        for requete in lentes:
+            requete['lente'] = True
+        totaux = temps_propres(evenements)
+
+        profil = {
+            'execution': self.execution,
+            'debut': self.debut,
+            'duree_totale': time.time() - self.debut,
+            'seuil_lent': self.seuil_lent,
+            # Temps propres : un événement imbriqué n'est compté que dans sa catégorie
+            'totaux_par_categorie': totaux,
+            'requetes': [{cle: valeur for cle, valeur in requete.items() if cle != 'tid'} for requete in self.requetes],
+            'requetes_lentes': [requete['sql'] for requete in lentes],
+            'evenements': evenements,
+        }
+        chemin = os.path.join(self.dossier, f"profil_{self.execution}.json")
+        with open(chemin, 'w') as f:
+            json.dump(profil, f, indent=2)
+
+        # Format Chrome trace : événements complets ("X"), temps en microsecondes
+        trace = [{'name': evenement['nom'], 'cat': evenement['categorie'], 'ph': 'X',
+                  'ts': (evenement['debut'] - self.debut) * 1e6, 'dur': evenement['duree'] * 1e6,
+                  'pid': evenement['pid'], 'tid': evenement['tid'], 'args': evenement['details']}
+                 for evenement in evenements]
+        with open(os.path.join(self.dossier, f"profil_{self.execution}.trace.json"), 'w') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+
+        print(f"\n=== Profil de l'exécution ({profil['duree_totale']:.2f} s) ===")
+        for categorie, duree in sorted(totaux.items(), key=lambda total: -total[1]):
+            print(f"{categorie:<12} {duree:>8.3f} s")
+        for requete in lentes:
+            print(f"\nRequête lente ({requete['duree']:.3f} s, {requete['lignes']} lignes) :\n{requete['sql'].strip()}")
+            print("Plan : " + " | ".join(requete.get('plan', [])))
+        print(f"\nProfil écrit dans {chemin}")
+        return chemin
+
+def temps_propres(evenements):
+    """Durée par catégorie, sans compter deux fois les événements imbriqués (sauvegarde dans un rendu, etc.)"""
+    totaux = {}
+    piles = {}
+    for evenement in evenements:
+        pile = piles.setdefault((evenement['pid'], evenement['tid']), [])
+        while pile and pile[-1]['debut'] + pile[-1]['duree'] <= evenement['debut']:
+            pile.pop()
+        if pile:
+            parent = pile[-1]
+            totaux[parent['categorie']] -= min(evenement['duree'], parent['debut'] + parent['duree'] - evenement['debut'])
+        totaux[evenement['categorie']] = totaux.get(evenement['categorie'], 0.0) + evenement['duree']
+        pile.append(evenement)
+    return totaux
+
+_profileur = None
+
+def profileur():
+    """Profileur actif du processus, ou None si l'instrumentation est désactivée"""
+    global _profileur
+    dossier = os.environ.get(VARIABLE_DOSSIER)
+    if not dossier:
+        return None
+    if _profileur is None or _profileur.pid != os.getpid():
+        # Premier appel dans un processus de rendu (fork ou spawn) : profil à part
+        _profileur = Profileur(dossier, float(os.environ.get(VARIABLE_SEUIL, SEUIL_LENT)),
+                               os.environ.get(VARIABLE_EXECUTION, str(os.getpid())),
+                               processus_fils=os.environ.get(VARIABLE_PID) != str(os.getpid()))
+    return _profileur
+
+def activer(dossier=DOSSIER_PROFILS, seuil_lent=SEUIL_LENT):
+    """Active l'instrumentation pour ce processus et ceux qu'il lance"""
+    os.makedirs(dossier, exist_ok=True)
+    os.environ[VARIABLE_DOSSIER] = os.path.abspath(dossier)
+    os.environ[VARIABLE_SEUIL] = str(seuil_lent)
+    os.environ[VARIABLE_EXECUTION] = time.strftime('%Y%m%d_%H%M%S')
+    os.environ[VARIABLE_PID] = str(os.getpid())
+    return profileur()
+
+def terminer():
+    """Écrit le profil de l'exécution si l'instrumentation est active"""
+    actif = profileur()
+    if actif is not None and not actif.processus_fils:
+        return actif.terminer()
+
+def vider_processus_fils():
+    """À appeler dans un processus de rendu après chaque tâche"""
+    actif = profileur()
+    if actif is not None and actif.processus_fils:
+        actif.vider_fragment()
+
+@contextmanager
+def mesurer(nom, categorie='python', **details):
+    """Chronomètre le bloc comme un événement du profil"""
+    actif = profileur()
+    if actif is None:
+        yield
+        return
+    debut = time.time()
+    try:
+        yield
+    finally:
+        actif.ajouter(nom, categorie, debut, time.time() - debut, **details)
+
+def instrumenter_connexion(conn):
+    """Chronomètre les instructions SQL de conn si l'instrumentation est active"""
+    actif = profileur()
+    if actif is not None:
+        actif.instrumenter(conn)
+    return conn
+
+def compter_lignes(conn, nb):
+    """Associe nb lignes lues à l'instruction SQL en cours sur conn"""
+    actif = profileur()
+    if actif is not None:
+        actif.compter_lignes(conn, nb)
+
+def lire_sql(requete, conn, params=(), **kwargs):
+    """pd.read_sql_query, avec le nombre de lignes lues enregistré dans le profil"""
+    import pandas as pd
+
+    resultat = pd.read_sql_query(requete, conn, params=params, **kwargs)
+    compter_lignes(conn, len(resultat))
+    return resultat
+
+@contextmanager
+def chronometrer_sauvegardes(nom):
+    """Chronomètre séparément les plt.savefig appelés dans le bloc"""
+    actif = profileur()
+    if actif is None:
+        yield
+        return
+    import matplotlib.pyplot as plt
+
+    savefig = plt.savefig
+
+    def savefig_mesure(*args, **kwargs):
+        with mesurer(f"sauvegarde {nom}", 'sauvegarde'):
+            return savefig(*args, **kwargs)
+
+    plt.savefig = savefig_mesure
+    try:
+        yield
+    finally:
+        plt.savefig = savefig
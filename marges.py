@@ -0,0 +1,302 @@
+import datetime
+import os
+import time
+import numpy as np
+import pandas as pd
+from creation_bdd import utilise_dates_compactes, empreinte_ventes, prolonge
+from acces_bdd import ouvrir_connexion
+from instrumentation import mesurer, compter_lignes, lire_sql
+from periodes import EPOQUE, derniere_date
+
+# Marges (avec cout_production) par produit, catégorie et mois, et couverture
+# du stock (stock_actuel en jours de ventes au rythme récent).
+#
+# Les ventes sont cumulées dans deux matrices denses produit x mois
+# (quantités et CA), indexées par id_produit : chaque bloc de ventes est
+# ajouté par np.bincount, sans groupby. Les matrices et le dernier id_vente
+# lu sont conservés dans FICHIER_ETAT ; une exécution suivante ne lit que
+# les ventes ajoutées depuis, donc ne met à jour que les produits touchés.
+# Les marges sont calculées au coût de production actuel de chaque produit.
+# Comme les agrégats, l'état suppose que les ventes déjà lues ne sont ni
+# modifiées ni supprimées ; sinon il faut le recalculer (complet=True).
+# L'état garde l'empreinte de la base (creation_bdd.empreinte_ventes) : une
+# base recréée ou des ventes supprimées sont détectées sans relire Ventes,
+# et l'état est reconstruit. verifier=True compare en plus les totaux de
+# l'état à ceux de la base (parcours de toutes les ventes déjà cumulées).
+FICHIER_ETAT = '.marges_etat.npz'
+FENETRE_VITESSE = 30     # jours de ventes servant à estimer le rythme de vente
+
+REQUETE_VENTES = """
+SELECT id_produit, {date}, quantite, montant_total
+FROM Ventes
+WHERE id_vente > ? AND id_vente <= ?
+"""
+
+# Totaux des ventes déjà cumulées (vérification explicite) : parcours de la plage de id_vente
+REQUETE_TOTAUX_CUMULES = """
+SELECT COALESCE(SUM(quantite), 0), COALESCE(SUM(montant_total), 0)
+FROM Ventes
+WHERE id_vente <= ?
+"""
+
+REQUETE_QUANTITES_RECENTES = """
+SELECT id_produit, SUM(quantite)
+FROM Ventes
+WHERE {date} BETWEEN ? AND ?
+GROUP BY id_produit
+"""
+
+def etat_vide(chemin_bdd):
+    return {
+        'chemin_bdd': os.path.abspath(chemin_bdd),
+        'dernier_id_vente': 0,
+        'jeton': '',                                    # empreinte de la base (voir empreinte_ventes)
+        'sequence': 0,
+        'mois': np.zeros(0, dtype='int64'),             # mois depuis janvier 1970
+        'quantites': np.zeros((0, 0)),
+        'ca': np.zeros((0, 0)),
+    }
+
+def lire_etat(chemin_bdd, fichier=FICHIER_ETAT):
+    """État sauvegardé pour cette base, ou un état vide"""
+    if not os.path.exists(fichier):
+        return etat_vide(chemin_bdd)
+    with np.load(fichier) as donnees:
+        etat = {cle: donnees[cle] for cle in donnees.files}
+    # Un état d'une autre base, ou antérieur à l'empreinte, est ignoré
+    if set(etat) != set(etat_vide(chemin_bdd)) or str(etat['chemin_bdd']) != os.path.abspath(chemin_bdd):
+        return etat_vide(chemin_bdd)
+    etat['chemin_bdd'] = str(etat['chemin_bdd'])
+    etat['jeton'] = str(etat['jeton'])
+    etat['dernier_id_vente'] = int(etat['dernier_id_vente'])
+    etat['sequence'] = int(etat['sequence'])
+    return etat
+
+def etat_valide(etat, empreinte):
+    """Indique si la base d'empreinte prolonge celle que décrit l'état (sans lire Ventes)"""
+    if not etat['dernier_id_vente']:
+        return True
+    return prolonge((empreinte[0] or '',) + tuple(empreinte[1:]),
+                    (etat['jeton'], etat['sequence'], etat['dernier_id_vente']))
+
+def totaux_valides(conn, etat):
+    """Compare les totaux des matrices aux sommes de quantite et de montant_total des ventes déjà cumulées.
+
+    Détecte aussi des ventes modifiées, au prix d'un parcours de toutes ces ventes.
+    """
+    if not etat['dernier_id_vente']:
+        return True
+    quantite, ca = conn.execute(REQUETE_TOTAUX_CUMULES, (etat['dernier_id_vente'],)).fetchone()
+    # Les sommes de CA diffèrent au plus de quelques erreurs d'arrondi (ordre d'addition)
+    return quantite == etat['quantites'].sum() and np.isclose(ca, etat['ca'].sum(), rtol=1e-9, atol=0.005)
+
+def ecrire_etat(etat, fichier=FICHIER_ETAT):
+    # Écriture dans un fichier temporaire puis renommage : l'état reste lisible en cas d'interruption
+    temporaire = fichier + '.tmp.npz'
+    np.savez(temporaire, **etat)
+    os.replace(temporaire, fichier)
+
+def agrandir(etat, nb_produits, mois):
+    """Ajoute aux matrices les lignes (produits) et colonnes (mois) manquantes"""
+    tous_mois = np.union1d(etat['mois'], mois)
+    lignes = max(nb_produits, etat['quantites'].shape[0])
+    if len(tous_mois) == len(etat['mois']) and lignes == etat['quantites'].shape[0]:
+        return
+    colonnes = np.searchsorted(tous_mois, etat['mois'])
+    for cle in ('quantites', 'ca'):
+        matrice = np.zeros((lignes, len(tous_mois)))
+        matrice[:etat[cle].shape[0], colonnes] = etat[cle]
+        etat[cle] = matrice
+    etat['mois'] = tous_mois
+
+def cumuler(etat, produits, mois, quantites, montants):
+    """Ajoute un bloc de ventes aux matrices produit x mois"""
+    agrandir(etat, int(produits.max()) + 1, np.unique(mois))
+    nb_produits, nb_mois = etat['quantites'].shape
+    index = produits * nb_mois + np.searchsorted(etat['mois'], mois)
+    etat['quantites'] += np.bincount(index, weights=quantites, minlength=nb_produits * nb_mois).reshape(
+        nb_produits, nb_mois)
+    etat['ca'] += np.bincount(index, weights=montants, minlength=nb_produits * nb_mois).reshape(
+        nb_produits, nb_mois)
+
+def lire_nouvelles_ventes(conn, etat, taille_lot=200_000):
+    """Cumule les ventes postérieures à l'état ; retourne les id_produit touchés"""
+    compact = utilise_dates_compactes(conn)
+    dernier = etat['dernier_id_vente']
+    nouveau = conn.execute("SELECT MAX(id_vente) FROM Ventes").fetchone()[0] or 0
+    touches = np.zeros(0, dtype='int64')
+    curseur = conn.execute(REQUETE_VENTES.format(date='jour_vente' if compact else 'date_vente'),
+                           (dernier, nouveau))
+    while True:
+        with mesurer("lecture d'un bloc de ventes", 'sqlite'):
+            lignes = curseur.fetchmany(taille_lot)
+            compter_lignes(conn, len(lignes))
+        if not lignes:
+            break
+        with mesurer("cumul par bincount", 'python'):
+            produits, dates, quantites, montants = zip(*lignes)
+            produits = np.array(produits, dtype='int64')
+            if compact:
+                mois = np.array(dates, dtype='int64').astype('datetime64[D]').astype('datetime64[M]')
+            else:
+                mois = np.array(dates, dtype='datetime64[M]')
+            cumuler(etat, produits, mois.astype('int64'), np.array(quantites, dtype='float64'),
+                    np.array(montants, dtype='float64'))
+            touches = np.union1d(touches, produits)
+    etat['dernier_id_vente'] = max(dernier, nouveau)
+    return touches
+
+def charger_produits(conn, nb_lignes):
+    """Produits sous forme de colonnes denses indexées par id_produit (lignes vides : NaN)"""
+    produits = lire_sql("""
+    SELECT p.id_produit, p.nom_produit, cat.nom_categorie, p.cout_production, p.stock_actuel
+    FROM Produits p
+    LEFT JOIN Categories cat ON p.id_categorie = cat.id_categorie
+    """, conn, index_col='id_produit')
+    return produits.reindex(range(max(nb_lignes, int(produits.index.max()) + 1 if len(produits) else 0)))
+
+def vitesses_de_vente(conn, nb_produits, fenetre=FENETRE_VITESSE):
+    """Quantité moyenne vendue par jour et par produit sur les fenetre derniers jours de ventes.
+
+    Seule la plage de dates est lue (parcours d'index quand la date est indexée).
+    """
+    fin = derniere_date(conn)
+    vitesses = np.zeros(nb_produits)
+    if fin is None:
+        return vitesses
+    debut = fin - datetime.timedelta(days=fenetre - 1)
+    if utilise_dates_compactes(conn):
+        requete, bornes = REQUETE_QUANTITES_RECENTES.format(date='jour_vente'), (
+            (debut - EPOQUE).days, (fin - EPOQUE).days)
+    else:
+        requete, bornes = REQUETE_QUANTITES_RECENTES.format(date='date_vente'), (debut.isoformat(), fin.isoformat())
+    lignes = conn.execute(requete, bornes).fetchall()
+    if lignes:
+        produits, quantites = zip(*lignes)
+        vitesses += np.bincount(produits, weights=quantites, minlength=nb_produits)[:nb_produits]
+    return vitesses / fenetre
+
+def rapports_marges(etat, produits, vitesses):
+    """Retourne (marges_produits, marges_categories, marges_mensuelles, couverture_stock).
+
+    Les matrices de l'état ont une ligne par ligne de produits (voir charger_produits).
+    """
+    quantites, ca = etat['quantites'], etat['ca']
+    cout_unitaire = produits['cout_production'].to_numpy(dtype='float64')
+    connus = produits['nom_produit'].notna().to_numpy()
+
+    marges_produits = pd.DataFrame({
+        'nom_produit': produits['nom_produit'],
+        'nom_categorie': produits['nom_categorie'],
+        'quantite': quantites.sum(axis=1),
+        'ca': ca.sum(axis=1),
+    })
+    marges_produits['cout'] = marges_produits['quantite'] * cout_unitaire
+    marges_produits['marge'] = marges_produits['ca'] - marges_produits['cout']
+    marges_produits['taux_marge'] = marges_produits['marge'] / marges_produits['ca'].where(
+        marges_produits['ca'] != 0) * 100
+    marges_produits = marges_produits[connus]
+
+    # Catégories : même agrégation dense, sur le code de catégorie de chaque produit
+    codes, categories = pd.factorize(marges_produits['nom_categorie'])
+    avec_categorie = codes >= 0
+    marges_categories = pd.DataFrame({
+        colonne: np.bincount(codes[avec_categorie],
+                             weights=marges_produits[colonne].to_numpy()[avec_categorie],
+                             minlength=len(categories))
+        for colonne in ('quantite', 'ca', 'cout', 'marge')
+    }, index=pd.Index(categories, name='nom_categorie'))
+    marges_categories['taux_marge'] = marges_categories['marge'] / marges_categories['ca'] * 100
+
+    cout_mensuel = (quantites[connus] * cout_unitaire[connus, None]).sum(axis=0)
+    marges_mensuelles = pd.DataFrame({
+        'ca': ca[connus].sum(axis=0),
+        'cout': cout_mensuel,
+    }, index=pd.PeriodIndex(etat['mois'].astype('datetime64[M]'), freq='M', name='mois'))
+    marges_mensuelles['marge'] = marges_mensuelles['ca'] - marges_mensuelles['cout']
+    marges_mensuelles['taux_marge'] = marges_mensuelles['marge'] / marges_mensuelles['ca'] * 100
+
+    stock = produits['stock_actuel'].to_numpy(dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        jours = np.where(vitesses > 0, stock / vitesses, np.inf)
+    couverture_stock = pd.DataFrame({
+        'nom_produit': produits['nom_produit'],
+        'stock_actuel': stock,
+        'ventes_par_jour': vitesses,
+        'jours_couverture': jours,
+    })[connus].sort_values('jours_couverture')
+
+    return (marges_produits.sort_values('marge', ascending=False),
+            marges_categories.sort_values('marge', ascending=False), marges_mensuelles, couverture_stock)
+
+def analyser_marges(chemin_bdd='ventes_magasin.db', complet=False, fenetre=FENETRE_VITESSE,
+                    fichier_etat=FICHIER_ETAT, sauvegarder=False, verifier=False):
+    """Met à jour l'état avec les nouvelles ventes, puis calcule et affiche les rapports.
+
+    complet=True ignore l'état sauvegardé et relit toutes les ventes ;
+    verifier=True contrôle les totaux de l'état avant de le réutiliser.
+    """
+    debut = time.perf_counter()
+    etat = etat_vide(chemin_bdd) if complet else lire_etat(chemin_bdd, fichier_etat)
+    conn = ouvrir_connexion(chemin_bdd, lecture_seule=True)
+    # Base recréée ou ventes supprimées depuis la dernière exécution : l'état ne la décrit plus
+    empreinte = empreinte_ventes(conn)
+    if not etat_valide(etat, empreinte):
+        print("L'état sauvegardé ne correspond plus à la base : recalcul complet.")
+        etat = etat_vide(chemin_bdd)
+    elif verifier:
+        with mesurer("vérification des totaux de l'état", 'sqlite'):
+            if not totaux_valides(conn, etat):
+                print("Les totaux de l'état ne correspondent pas à la base : recalcul complet.")
+                etat = etat_vide(chemin_bdd)
+    etat['jeton'], etat['sequence'] = empreinte[0] or '', empreinte[1]
+    dernier = etat['dernier_id_vente']
+    touches = lire_nouvelles_ventes(conn, etat)
+    produits = charger_produits(conn, etat['quantites'].shape[0])
+    vitesses = vitesses_de_vente(conn, len(produits), fenetre)
+    conn.close()
+    agrandir(etat, len(produits), etat['mois'])
+    ecrire_etat(etat, fichier_etat)
+
+    mode = "complet" if not dernier else f"incrémental depuis la vente {dernier}"
+    print(f"Cumuls mis à jour ({mode}) : {len(touches)} produit(s) touché(s) "
+          f"en {time.perf_counter() - debut:.2f} s")
+
+    with mesurer("rapports de marges", 'python'):
+        marges_produits, marges_categories, marges_mensuelles, couverture_stock = rapports_marges(
+            etat, produits, vitesses)
+
+    with pd.option_context('display.max_columns', None, 'display.width', 140, 'display.float_format',
+                           '{:,.2f}'.format):
+        print("\n=== Marges par produit (10 premières) ===")
+        print(marges_produits.head(10))
+        print("\n=== Marges par catégorie ===")
+        print(marges_categories)
+        print("\n=== Marges mensuelles ===")
+        print(marges_mensuelles)
+        print(f"\n=== Couverture du stock (rythme des {fenetre} derniers jours, 10 plus courtes) ===")
+        print(couverture_stock.head(10))
+
+    if sauvegarder:
+        marges_produits.to_csv('marges_produits.csv')
+        marges_categories.to_csv('marges_categories.csv')
+        marges_mensuelles.to_csv('marges_mensuelles.csv')
+        couverture_stock.to_csv('couverture_stock.csv')
+    return marges_produits, marges_categories, marges_mensuelles, couverture_stock
+
+def main(argv=None, prog=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog=prog, description="Marges et couverture du stock")
+    parser.add_argument("--complet", action="store_true", help="relire toutes les ventes au lieu des nouvelles")
+    parser.add_argument("--fenetre", type=int, default=FENETRE_VITESSE,
+                        help="jours de ventes servant à estimer le rythme de vente")
+    parser.add_argument("--csv", action="store_true", help="sauvegarder les rapports en CSV")
+    parser.add_argument("--verifier", action="store_true",
+                        help="comparer les totaux de l'état à ceux de la base avant de le réutiliser (relit les ventes)")
+    args = parser.parse_args(argv)
+
+    analyser_marges(complet=args.complet, fenetre=args.fenetre, sauvegarder=args.csv, verifier=args.verifier)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import datetime
+import pandas as pd
+from creation_bdd import utilise_dates_compactes
+from agregats import agregats_actifs
+from acces_bdd import ouvrir_connexion
+from instrumentation import mesurer, lire_sql
+
+# Rapports sur une plage de dates : seuls les jours de la plage sont lus,
+# par un parcours d'index sur la date, puis les totaux journaliers sont
+# regroupés et lissés dans pandas. Le coût dépend donc de la largeur de la
+# fenêtre et non de la taille de Ventes, à condition que la date soit
+# indexée (profil analytique, schéma compact ou tables d'agrégats).
+GRANULARITES = {'jour': 'D', 'semaine': 'W-MON', 'mois': 'MS'}
+FENETRES_GLISSANTES = (7, 30)   # en jours
+
+REQUETE_JOURS = """
+SELECT date_vente as jour, SUM(montant_total) as ca, COUNT(*) as nb_ventes
+FROM Ventes
+WHERE date_vente BETWEEN ? AND ?
+GROUP BY date_vente
+"""
+
+# Schéma compact : bornes en jours depuis le 1970-01-01, index idx_ventes_jour_montant
+REQUETE_JOURS_COMPACT = """
+SELECT jour_vente as jour, SUM(montant_total) as ca, COUNT(*) as nb_ventes
+FROM Ventes
+WHERE jour_vente BETWEEN ? AND ?
+GROUP BY jour_vente
+"""
+
+# Agrégats : la plage de la clé primaire (jour, cle), plus les ventes pas
+# encore intégrées (plage de id_vente, la connexion étant en lecture seule)
+REQUETE_JOURS_AGREGATS = """
+SELECT jour, SUM(ca) as ca, SUM(nb_ventes) as nb_ventes
+FROM (SELECT jour, ca, nb_ventes FROM Agregat_jour_produit WHERE jour BETWEEN ? AND ?
+      UNION ALL
+      SELECT date_vente, montant_total, 1 FROM Ventes
+      WHERE id_vente > (SELECT dernier_id_vente FROM Agregats_etat) AND date_vente BETWEEN ? AND ?)
+GROUP BY jour
+"""
+
+EPOQUE = datetime.date(1970, 1, 1)
+
+def requete_jours(conn, debut, fin):
+    """Requête des totaux journaliers adaptée à la base, et ses paramètres"""
+    if agregats_actifs(conn):
+        return REQUETE_JOURS_AGREGATS, (debut.isoformat(), fin.isoformat()) * 2
+    if utilise_dates_compactes(conn):
+        return REQUETE_JOURS_COMPACT, ((debut - EPOQUE).days, (fin - EPOQUE).days)
+    return REQUETE_JOURS, (debut.isoformat(), fin.isoformat())
+
+def plage_indexee(conn, requete, params):
+    """Indique si SQLite lit Ventes par un index (et non par un parcours complet)"""
+    plan = [ligne[3] for ligne in conn.execute("EXPLAIN QUERY PLAN " + requete, params)]
+    return not any(etape.startswith("SCAN Ventes") and "INDEX" not in etape for etape in plan)
+
+def derniere_date(conn):
+    """Date de la dernière vente (lue en bout d'index quand la date est indexée)"""
+    colonne = 'jour_vente' if utilise_dates_compactes(conn) else 'date_vente'
+    valeur = conn.execute(f"SELECT MAX({colonne}) FROM Ventes").fetchone()[0]
+    if valeur is None:
+        return None
+    if isinstance(valeur, int):
+        return EPOQUE + datetime.timedelta(days=valeur)
+    return datetime.date.fromisoformat(valeur)
+
+def totaux_journaliers(conn, debut, fin):
+    """CA et nombre de ventes de chaque jour de [debut, fin], jours sans vente compris.
+
+    Retourne un DataFrame indexé par un DatetimeIndex quotidien.
+    """
+    requete, params = requete_jours(conn, debut, fin)
+    if not plage_indexee(conn, requete, params):
+        print("Attention : la date n'est pas indexée, Ventes est parcourue en entier "
+              "(voir creation_bdd.py --creer-index).")
+    jours = lire_sql(requete, conn, params=params)
+    if utilise_dates_compactes(conn) and not agregats_actifs(conn):
+        jours['jour'] = pd.to_datetime(jours['jour'], unit='D')
+    else:
+        jours['jour'] = pd.to_datetime(jours['jour'], format='%Y-%m-%d')
+    calendrier = pd.date_range(debut, fin, freq='D', name='jour')
+    return jours.set_index('jour').reindex(calendrier, fill_value=0).astype({'ca': 'float64', 'nb_ventes': 'int64'})
+
+def bornes(conn, debut=None, fin=None):
+    """Bornes de la plage en datetime.date ; par défaut les 365 jours se terminant à la dernière vente"""
+    fin = datetime.date.fromisoformat(fin) if isinstance(fin, str) else fin
+    debut = datetime.date.fromisoformat(debut) if isinstance(debut, str) else debut
+    if fin is None:
+        fin = derniere_date(conn) or datetime.date.today()
+    if debut is None:
+        debut = fin - datetime.timedelta(days=364)
+    if debut > fin:
+        raise ValueError(f"Début de période postérieur à la fin : {debut} > {fin}")
+    return debut, fin
+
+def annee_precedente(date):
+    """Même jour un an plus tôt (le 29 février devient le 28)"""
+    try:
+        return date.replace(year=date.year - 1)
+    except ValueError:
+        return date.replace(year=date.year - 1, day=28)
+
+def rapport_periode(conn, debut=None, fin=None, granularite='jour'):
+    """CA par jour, semaine ou mois sur [debut, fin], avec cumul et comparaison à l'année précédente.
+
+    Colonnes : ca, nb_ventes, ca_cumule, ca_annee_precedente et
+    evolution_annuelle (en %, NaN si l'année précédente est sans vente).
+    Seules la plage et la même plage un an plus tôt sont lues.
+    """
+    if granularite not in GRANULARITES:
+        raise ValueError(f"Granularité inconnue : {granularite} (choix : {', '.join(GRANULARITES)})")
+    debut, fin = bornes(conn, debut, fin)
+    frequence = GRANULARITES[granularite]
+    # L'année précédente est ramenée sur le calendrier de la période : au
+    # jour près pour les jours et les mois, à 52 semaines près (même jour
+    # de la semaine) pour les semaines ; la plage lue est décalée d'autant
+    if granularite == 'semaine':
+        decalage = datetime.timedelta(weeks=52)
+        debut_precedent, fin_precedente = debut - decalage, fin - decalage
+    else:
+        debut_precedent, fin_precedente = annee_precedente(debut), annee_precedente(fin)
+
+    with mesurer("totaux journaliers de la période", 'sqlite'):
+        jours = totaux_journaliers(conn, debut, fin)
+        precedents = totaux_journaliers(conn, debut_precedent, fin_precedente)
+
+    with mesurer(f"rapport par {granularite}", 'pandas'):
+        rapport = jours.resample(frequence, closed='left', label='left').sum()
+        if granularite == 'semaine':
+            precedents.index = precedents.index + pd.Timedelta(decalage)
+        else:
+            precedents.index = precedents.index + pd.DateOffset(years=1)
+        precedents = precedents[(precedents.index >= jours.index[0]) & (precedents.index <= jours.index[-1])]
+        rapport['ca_cumule'] = rapport['ca'].cumsum()
+        ca_annuel = precedents['ca'].resample(frequence, closed='left', label='left').sum()
+        rapport['ca_annee_precedente'] = ca_annuel.reindex(rapport.index, fill_value=0.0)
+        ca_precedent = rapport['ca_annee_precedente'].where(rapport['ca_annee_precedente'] != 0)
+        rapport['evolution_annuelle'] = (rapport['ca'] / ca_precedent - 1) * 100
+    rapport.index.name = granularite
+    return rapport
+
+def indicateurs_glissants(conn, debut=None, fin=None, fenetres=FENETRES_GLISSANTES):
+    """CA journalier de [debut, fin] avec moyennes mobiles sur chaque fenêtre (en jours) et CA cumulé.
+
+    Les jours précédant debut nécessaires aux premières fenêtres sont lus
+    aussi, de sorte que chaque moyenne porte toujours sur une fenêtre complète.
+    """
+    debut, fin = bornes(conn, debut, fin)
+    marge = datetime.timedelta(days=max(fenetres) - 1)
+
+    with mesurer("totaux journaliers de la période", 'sqlite'):
+        jours = totaux_journaliers(conn, debut - marge, fin)
+
+    with mesurer("fenêtres glissantes", 'pandas'):
+        for fenetre in fenetres:
+            jours[f'ca_moyen_{fenetre}j'] = jours['ca'].rolling(fenetre).mean()
+        jours = jours.loc[pd.Timestamp(debut):].copy()
+        jours['ca_cumule'] = jours['ca'].cumsum()
+    return jours
+
+def analyser_periode(debut=None, fin=None, granularite='mois', glissant=False, chemin_bdd='ventes_magasin.db',
+                     fichier_csv=None):
+    """Affiche (et sauvegarde en CSV si fichier_csv est donné) le rapport de la période"""
+    conn = ouvrir_connexion(chemin_bdd, lecture_seule=True)
+    if glissant:
+        resultat = indicateurs_glissants(conn, debut, fin)
+        titre = "Indicateurs glissants"
+    else:
+        resultat = rapport_periode(conn, debut, fin, granularite)
+        titre = f"Chiffre d'affaires par {granularite}"
+    conn.close()
+
+    print(f"\n=== {titre} du {resultat.index[0]:%Y-%m-%d} au {resultat.index[-1]:%Y-%m-%d} ===")
+    with pd.option_context('display.max_rows', 60, 'display.max_columns', None, 'display.width', 140,
+                           'display.float_format', '{:,.2f}'.format):
+        print(resultat)
+    if fichier_csv:
+        resultat.to_csv(fichier_csv)
+        print(f"\nRapport sauvegardé dans {fichier_csv}")
+    return resultat
+
+def main(argv=None, prog=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog=prog, description="Rapports de ventes sur une plage de dates")
+    parser.add_argument("--debut", default=None, help="AAAA-MM-JJ (par défaut : 364 jours avant --fin)")
+    parser.add_argument("--fin", default=None, help="AAAA-MM-JJ (par défaut : date de la dernière vente)")
+    parser.add_argument("--granularite", choices=list(GRANULARITES), default="mois")
+    parser.add_argument("--glissant", action="store_true",
+                        help="CA journalier avec moyennes mobiles sur 7 et 30 jours et CA cumulé")
+    parser.add_argument("--csv", default=None, help="fichier CSV où sauvegarder le rapport")
+    args = parser.parse_args(argv)
+
+    analyser_periode(args.debut, args.fin, args.granularite, args.glissant, fichier_csv=args.csv)
+
+if __name__ == "__main__":
+    main()
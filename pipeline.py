@@ -0,0 +1,158 @@
+import time
+import pandas as pd
+from creation_bdd import utilise_dates_compactes
+from acces_bdd import ouvrir_connexion
+import instrumentation
+from instrumentation import mesurer, compter_lignes
+from analyse_ventes import requete_ventes, convertir_dates, cumuler, afficher_resultats, sauvegarder_csv
+
+# Point d'entrée commun à analyse_ventes.py et visualisation.py : la jointure
+# des ventes est lue une seule fois, par blocs, et chaque bloc alimente tous
+# les agrégats des deux scripts (sommes et comptages fusionnés par cumuler).
+# Les résultats vont ensuite aux CSV et aux graphiques.
+
+def agreger_bloc(chunk, compact):
+    """Agrégats partiels d'un bloc de la jointure, par clé de regroupement"""
+    convertir_dates(chunk, compact)
+    chunk['mois'] = chunk['date_vente'].dt.to_period('M')
+    # Même numérotation que strftime('%w') de SQLite : 0 = dimanche
+    chunk['jour_semaine'] = (chunk['date_vente'].dt.dayofweek + 1) % 7
+    chunk['heure'] = chunk['date_vente'].dt.hour
+
+    return {
+        'produits': chunk.groupby('nom_produit').agg({
+            'quantite': 'sum',
+            'montant_total': 'sum'
+        }),
+        'categories': chunk.groupby('nom_categorie').agg({
+            'quantite': 'sum',
+            'montant_total': ['sum', 'count']
+        }),
+        'mois': chunk.groupby('mois').agg({
+            'montant_total': 'sum',
+            'id_vente': 'count'
+        }),
+        'clients': chunk.groupby(['nom_client', 'prenom_client']).agg({
+            'montant_total': 'sum',
+            'id_vente': 'count'
+        }),
+        'noms_clients': chunk.groupby('nom_client').agg({
+            'montant_total': 'sum',
+            'id_vente': 'count'
+        }),
+        'frequences': chunk.groupby('frequence_achat').agg({
+            'id_vente': 'count',
+            'montant_total': 'sum'
+        }),
+        'heatmap': chunk.groupby(['jour_semaine', 'heure']).agg({
+            'id_vente': 'count'
+        }),
+    }
+
+def extraire_agregats(conn, taille_chunk=500_000):
+    """Lit la jointure des ventes une seule fois et calcule tous les agrégats.
+
+    Retourne (nb_ventes, ca_total, quantite_totale), les quatre DataFrames de
+    analyser_ventes() (produits_ca, categories_ca, ca_mensuel, ventes_client)
+    et le dictionnaire des données des graphiques, de même forme que les
+    résultats des requêtes de rapports.requetes_rapports().
+    """
+    compact = utilise_dates_compactes(conn)
+    nb_ventes, ca_total, quantite_totale = 0, 0.0, 0
+    totaux = {}
+
+    for chunk in pd.read_sql_query(requete_ventes(compact, avec_frequence=True), conn, chunksize=taille_chunk):
+        compter_lignes(conn, len(chunk))
+        with mesurer("agrégation d'un bloc", 'pandas', lignes=len(chunk)):
+            nb_ventes += len(chunk)
+            ca_total += chunk['montant_total'].sum()
+            quantite_totale += chunk['quantite'].sum()
+            for cle, partiel in agreger_bloc(chunk, compact).items():
+                totaux[cle] = cumuler(totaux.get(cle), partiel)
+
+    if not nb_ventes:
+        raise ValueError("Aucune vente dans la base")
+
+    # Résultats de l'analyse, comme analyser_ventes()
+    produits_ca = totaux['produits'].sort_values('montant_total', ascending=False)
+    categories_ca = totaux['categories'].sort_values(('montant_total', 'sum'), ascending=False)
+    ca_mensuel = totaux['mois'].rename(columns={'montant_total': 'CA_total', 'id_vente': 'nb_ventes'})
+    ventes_client = totaux['clients'].sort_values('montant_total', ascending=False).rename(columns={
+        'montant_total': 'CA_total',
+        'id_vente': 'nb_achats'
+    })
+
+    # Données des graphiques, comme les requêtes de visualisation.py
+    frequences = totaux['frequences'].rename(columns={'id_vente': 'nb_achats', 'montant_total': 'ca_total'})
+    frequences['panier_moyen'] = frequences['ca_total'] / frequences['nb_achats']
+    top_produits = produits_ca.head(5).reset_index().rename(columns={
+        'montant_total': 'ca_total',
+        'quantite': 'quantite_totale'
+    })[['nom_produit', 'ca_total', 'quantite_totale']]
+    # Sélection partielle : seuls les 5 premiers sont triés
+    top_clients = totaux['noms_clients'].nlargest(5, 'montant_total')
+
+    donnees = {
+        'ca_mensuel': pd.DataFrame({
+            'mois': ca_mensuel.index.astype(str),
+            'ca_total': ca_mensuel['CA_total'].values,
+            'nb_ventes': ca_mensuel['nb_ventes'].values,
+        }),
+        'top_produits': top_produits,
+        'heatmap': totaux['heatmap'].rename(columns={'id_vente': 'nb_ventes'}).reset_index(),
+        'clients': frequences.reset_index(),
+        'top_clients': top_clients.reset_index().rename(columns={
+            'nom_client': 'nom',
+            'montant_total': 'ca_total',
+            'id_vente': 'nb_achats'
+        }),
+    }
+
+    return ((nb_ventes, ca_total, quantite_totale),
+            (produits_ca, categories_ca, ca_mensuel, ventes_client),
+            donnees)
+
+def executer_pipeline(chemin_bdd='ventes_magasin.db', taille_chunk=500_000, graphiques=True,
+                      batch=False, nb_processus=None, force=False):
+    """Analyse, CSV et graphiques à partir d'une seule lecture de la table Ventes"""
+    debut = time.perf_counter()
+    conn = ouvrir_connexion(chemin_bdd, lecture_seule=True)
+    (nb_ventes, ca_total, quantite_totale), resultats, donnees = extraire_agregats(conn, taille_chunk)
+    conn.close()
+    print(f"Extraction en une lecture : {time.perf_counter() - debut:.2f} s")
+
+    afficher_resultats(nb_ventes, ca_total, quantite_totale, *resultats)
+    sauvegarder_csv(*resultats)
+    print("\nAnalyse terminée. Les résultats ont été sauvegardés dans le dossier .")
+
+    if graphiques:
+        from visualisation import rendre_graphiques
+        print("Génération des visualisations obligatoires...")
+        rendre_graphiques(donnees, batch=batch, nb_processus=nb_processus, force=force)
+
+    return resultats, donnees
+
+def main(argv=None, prog=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog=prog, description="Analyse et graphiques des ventes en une seule lecture")
+    parser.add_argument("--chunk", type=int, default=500_000, help="taille des blocs lus")
+    parser.add_argument("--sans-graphiques", action="store_true", help="ne produire que l'analyse et les CSV")
+    parser.add_argument("--batch", action="store_true",
+                        help="mode sans affichage : rendu parallèle, aucun plt.show()")
+    parser.add_argument("--processus", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="regénérer tous les graphiques")
+    parser.add_argument("--profil", action="store_true",
+                        help="chronométrer SQL, pandas et graphiques (profil JSON et trace Chrome dans profils/)")
+    parser.add_argument("--seuil-lent", type=float, default=0.5, help="durée en secondes d'une requête lente")
+    args = parser.parse_args(argv)
+
+    if args.profil:
+        instrumentation.activer(seuil_lent=args.seuil_lent)
+    executer_pipeline(taille_chunk=args.chunk, graphiques=not args.sans_graphiques, batch=args.batch,
+                      nb_processus=args.processus, force=args.force)
+    if args.profil:
+        instrumentation.terminer()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+from creation_bdd import utilise_dates_compactes
+from agregats import (agregats_actifs, REQUETE_CA_MENSUEL_AGREGATS,
+                      REQUETE_TOP_PRODUITS_AGREGATS, REQUETE_HEATMAP_AGREGATS,
+                      REQUETE_CLIENTS_AGREGATS, REQUETE_TOP_CLIENTS_AGREGATS)
+
+# Requêtes des graphiques de visualisation.py, sans dépendance à matplotlib :
+# creation_bdd, acces_bdd, benchmark et serveur les réutilisent (plans
+# d'exécution, contention, mesures, API) sans charger les bibliothèques de tracé.
+REQUETE_CA_MENSUEL = """
+SELECT strftime('%Y-%m', date_vente) as mois, 
+       SUM(montant_total) as ca_total,
+       COUNT(id_vente) as nb_ventes
+FROM Ventes
+GROUP BY strftime('%Y-%m', date_vente)
+ORDER BY mois
+"""
+
+# Variante pour le schéma compact : agrégation par jour sur l'index couvrant,
+# le mois n'est calculé qu'une fois par jour distinct
+REQUETE_CA_MENSUEL_COMPACT = """
+SELECT strftime('%Y-%m', jour_vente * 86400, 'unixepoch') as mois,
+       SUM(ca_jour) as ca_total,
+       SUM(nb_jour) as nb_ventes
+FROM (SELECT jour_vente, SUM(montant_total) as ca_jour, COUNT(id_vente) as nb_jour
+      FROM Ventes
+      GROUP BY jour_vente)
+GROUP BY mois
+ORDER BY mois
+"""
+
+REQUETE_TOP_PRODUITS = """
+SELECT p.nom_produit, 
+       SUM(v.montant_total) as ca_total,
+       SUM(v.quantite) as quantite_totale
+FROM Ventes v
+JOIN Produits p ON v.id_produit = p.id_produit
+GROUP BY p.nom_produit
+ORDER BY ca_total DESC
+LIMIT 5
+"""
+
+REQUETE_HEATMAP = """
+SELECT 
+    strftime('%w', date_vente) as jour_semaine,
+    strftime('%H', date_vente) as heure,
+    COUNT(id_vente) as nb_ventes
+FROM Ventes
+GROUP BY jour_semaine, heure
+ORDER BY jour_semaine, heure
+"""
+
+# Variante pour le schéma compact (les dates n'y portent pas d'heure)
+REQUETE_HEATMAP_COMPACT = """
+SELECT 
+    (jour_vente + 4) % 7 as jour_semaine,
+    0 as heure,
+    SUM(nb_jour) as nb_ventes
+FROM (SELECT jour_vente, COUNT(id_vente) as nb_jour
+      FROM Ventes
+      GROUP BY jour_vente)
+GROUP BY jour_semaine
+ORDER BY jour_semaine
+"""
+
+REQUETE_CLIENTS = """
+SELECT 
+    c.frequence_achat,
+    COUNT(v.id_vente) as nb_achats,
+    SUM(v.montant_total) as ca_total,
+    AVG(v.montant_total) as panier_moyen
+FROM Ventes v
+JOIN Clients c ON v.id_client = c.id_client
+GROUP BY c.frequence_achat
+"""
+
+REQUETE_TOP_CLIENTS = """
+SELECT c.nom, 
+    SUM(v.montant_total) as ca_total,
+    COUNT(v.id_vente) as nb_achats
+FROM Ventes v
+JOIN Clients c ON v.id_client = c.id_client
+GROUP BY c.nom
+ORDER BY ca_total DESC
+LIMIT 5
+"""
+
+def requetes_rapports(conn):
+    """Choisit les requêtes des graphiques selon la base : agrégats, schéma compact ou schéma d'origine"""
+    if agregats_actifs(conn):
+        return {
+            "ca_mensuel": REQUETE_CA_MENSUEL_AGREGATS,
+            "top_produits": REQUETE_TOP_PRODUITS_AGREGATS,
+            "heatmap": REQUETE_HEATMAP_AGREGATS,
+            "clients": REQUETE_CLIENTS_AGREGATS,
+            "top_clients": REQUETE_TOP_CLIENTS_AGREGATS,
+        }
+    compact = utilise_dates_compactes(conn)
+    return {
+        "ca_mensuel": REQUETE_CA_MENSUEL_COMPACT if compact else REQUETE_CA_MENSUEL,
+        "top_produits": REQUETE_TOP_PRODUITS,
+        "heatmap": REQUETE_HEATMAP_COMPACT if compact else REQUETE_HEATMAP,
+        "clients": REQUETE_CLIENTS,
+        "top_clients": REQUETE_TOP_CLIENTS,
+    }
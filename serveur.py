@@ -0,0 +1,611 @@
+import asyncio
+import io
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+import pandas as pd
+from acces_bdd import ouvrir_connexion, copier_base, PoolLecture, Ecrivain, CHEMIN_BDD
+from agregats import agregats_actifs, rafraichir_agregats
+from analyse_ventes import calculer_ventes_sql
+from cache_requetes import etat_base
+from classements import DIMENSIONS, top_k_sql, noms
+from creation_bdd import utilise_dates_compactes
+from instrumentation import lire_sql
+from periodes import GRANULARITES, rapport_periode
+from rapports import requetes_rapports
+from statistiques import lire_statistiques
+import visualisation
+
+# Serveur HTTP des rapports (asyncio, bibliothèque standard) pour l'équipe BI :
+#
+#   GET /stats                              statistiques de base
+#   GET /produits?limite=N, /categories, /ca_mensuel, /clients?limite=N
+#                                           agrégats de analyse_ventes (JSON)
+#   GET /periode?debut=&fin=&granularite=   rapport de periodes.py
+#   GET /classement?dimension=&k=           top-k exact de classements.py
+#   GET /graphiques, /graphiques/<fichier>  liste et images PNG de visualisation.py
+#   GET /sante                              état du serveur et du cache
+#
+# Le travail SQLite est fait dans un pool de threads, chacun avec une
+# connexion en lecture seule (acces_bdd.PoolLecture) ; le rendu des
+# graphiques, pyplot n'étant pas thread-safe, dans un thread dédié. Les
+# réponses sont mémorisées pendant ttl secondes tant que la base ne change
+# pas (voir ServeurRapports.marqueur), et les requêtes identiques
+# arrivant pendant un calcul attendent ce calcul au lieu de le relancer.
+# Au démarrage et après chaque modification de la base, les réponses par
+# défaut sont recalculées en tâche de fond.
+HOTE = '127.0.0.1'
+PORT = 8080
+TTL = 60.0                  # en secondes
+INTERVALLE_SURVEILLANCE = 2.0
+TAILLE_MEMO = 1000          # réponses mémorisées au plus
+PAGES_PRECALCULEES = ['/stats', '/produits', '/categories', '/ca_mensuel', '/clients', '/classement',
+                      '/periode'] + [f'/graphiques/{fichier}' for fichier, _, _ in visualisation.GRAPHIQUES]
+
+STATUTS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error'}
+
+class ErreurRequete(ValueError):
+    """Paramètre invalide : réponse 400 (ou 404 pour une ressource inconnue)"""
+
+    def __init__(self, message, statut=400):
+        super().__init__(message)
+        self.statut = statut
+
+class Memo:
+    """Réponses mémorisées, avec durée de vie, invalidation et regroupement des calculs en cours.
+
+    Une entrée n'est servie que si elle a moins de ttl secondes et que le
+    marqueur de la base n'a pas changé depuis son calcul. Au-delà de nb_max
+    entrées, les moins récemment utilisées sont oubliées.
+    """
+
+    def __init__(self, ttl=TTL, nb_max=TAILLE_MEMO):
+        self.ttl = ttl
+        self.nb_max = nb_max
+        self.entrees = OrderedDict()    # clé -> (marqueur, expiration, valeur)
+        self.en_cours = {}              # clé -> (marqueur, tâche)
+        self.succes = 0
+        self.echecs = 0
+        self.regroupees = 0
+
+    async def obtenir(self, cle, marqueur, calcul):
+        """Valeur de cle pour cet état de la base ; calcul() est une coroutine appelée au plus une fois"""
+        entree = self.entrees.get(cle)
+        if entree is not None and entree[0] == marqueur and entree[1] > time.monotonic():
+            self.entrees.move_to_end(cle)
+            self.succes += 1
+            return entree[2]
+
+        en_cours = self.en_cours.get(cle)
+        if en_cours is not None and en_cours[0] == marqueur:
+            self.regroupees += 1
+            return await asyncio.shield(en_cours[1])
+
+        self.echecs += 1
+        tache = asyncio.ensure_future(calcul())
+        self.en_cours[cle] = (marqueur, tache)
+        tache.add_done_callback(lambda tache: self.terminer(cle, marqueur, tache))
+        # shield : un client qui se déconnecte n'annule pas le calcul attendu par les autres
+        return await asyncio.shield(tache)
+
+    def terminer(self, cle, marqueur, tache):
+        if self.en_cours.get(cle, (None, None))[1] is tache:
+            del self.en_cours[cle]
+        if tache.cancelled() or tache.exception() is not None:
+            return
+        self.entrees[cle] = (marqueur, time.monotonic() + self.ttl, tache.result())
+        self.entrees.move_to_end(cle)
+        while len(self.entrees) > self.nb_max:
+            self.entrees.popitem(last=False)
+
+class BaseConnexion:
+    """Interface lire() / appeler() de CacheRequetes sur une connexion du pool, sans cache disque"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def lire(self, requete, params=()):
+        return lire_sql(requete, self.conn, params=params)
+
+    def appeler(self, nom, fonction):
+        return fonction(self.conn)
+
+def en_json(objet):
+    return json.dumps(objet, ensure_ascii=False, default=str).encode('utf-8')
+
+def tableau(df):
+    """DataFrame en liste d'objets JSON (index compris, NaN en null)"""
+    df = df.reset_index()
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = ['_'.join(str(niveau) for niveau in colonne if niveau) for colonne in df.columns]
+    df = df.astype(object).where(df.notna(), None)
+    return df.to_dict(orient='records')
+
+def entier(params, nom, defaut, minimum=1, maximum=10_000):
+    try:
+        valeur = int(params.get(nom, [defaut])[0])
+    except ValueError:
+        raise ErreurRequete(f"{nom} doit être un entier")
+    if not minimum <= valeur <= maximum:
+        raise ErreurRequete(f"{nom} doit être compris entre {minimum} et {maximum}")
+    return valeur
+
+def rendre_png(tracer, donnees):
+    """Trace un graphique de visualisation.py en mémoire ; retourne l'image PNG"""
+    import matplotlib.pyplot as plt
+
+    tampon = io.BytesIO()
+    try:
+        tracer(donnees, tampon)
+    finally:
+        plt.close('all')
+    return tampon.getvalue()
+
+class ServeurRapports:
+    def __init__(self, chemin_bdd=CHEMIN_BDD, nb_threads=4, ttl=TTL):
+        self.chemin_bdd = chemin_bdd
+        self.pool = PoolLecture(chemin_bdd, taille=nb_threads)
+        self.executor = ThreadPoolExecutor(nb_threads, thread_name_prefix='sqlite')
+        self.rendu = ThreadPoolExecutor(1, thread_name_prefix='rendu')
+        self.ecrivain = None
+        self.verrou_ecrivain = threading.Lock()
+        self.conn_version = None
+        self.memo = Memo(ttl)
+        self.debut = time.time()
+        self.nb_requetes = 0
+        self.routes = {
+            '/stats': self.stats,
+            '/produits': self.produits,
+            '/categories': self.categories,
+            '/ca_mensuel': self.ca_mensuel,
+            '/clients': self.clients,
+            '/periode': self.periode,
+            '/classement': self.classement,
+            '/graphiques': self.graphiques,
+        }
+        visualisation.initialiser_processus()
+
+    def marqueur(self):
+        """État de la base, qui change à chaque commit.
+
+        PRAGMA data_version, lu sur une connexion dédiée (utilisée seulement
+        par la boucle d'événements), change dès qu'une autre connexion valide
+        une transaction, même si les fichiers gardent leur taille et leur
+        date ; le marqueur des fichiers détecte en plus une base remplacée.
+        """
+        if self.conn_version is None:
+            self.conn_version = ouvrir_connexion(self.chemin_bdd, lecture_seule=True)
+        return self.conn_version.execute("PRAGMA data_version").fetchone()[0], etat_base(self.chemin_bdd)[0]
+
+    async def en_thread(self, fonction, *args):
+        """Exécute fonction(conn, *args) dans le pool de threads, avec une connexion en lecture seule"""
+        def executer():
+            with self.pool.connexion() as conn:
+                return fonction(conn, *args)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, executer)
+
+    # Données partagées par plusieurs pages, mémorisées comme elles
+
+    async def analyse(self, marqueur):
+        return await self.memo.obtenir(('analyse',), marqueur,
+                                       lambda: self.en_thread(lambda conn: calculer_ventes_sql(BaseConnexion(conn))))
+
+    def obtenir_ecrivain(self):
+        """Connexion d'écriture, ouverte au premier besoin par un seul des threads du pool"""
+        with self.verrou_ecrivain:
+            if self.ecrivain is None:
+                self.ecrivain = Ecrivain(self.chemin_bdd)
+            return self.ecrivain
+
+    def lire_donnees_graphiques(self, conn):
+        if agregats_actifs(conn):
+            # Les connexions du pool sont en lecture seule : les agrégats sont
+            # rafraîchis par l'unique connexion d'écriture du serveur
+            with self.obtenir_ecrivain().transaction() as ecriture:
+                rafraichir_agregats(ecriture)
+        return {cle: lire_sql(requete, conn) for cle, requete in requetes_rapports(conn).items()}
+
+    async def donnees_graphiques(self, marqueur):
+        return await self.memo.obtenir(('donnees_graphiques',), marqueur,
+                                       lambda: self.en_thread(self.lire_donnees_graphiques))
+
+    # Pages : chacune retourne (type de contenu, corps)
+
+    async def stats(self, params, marqueur):
+        nb_ventes, ca_total, quantite_totale = await self.en_thread(lire_statistiques)
+        return 'application/json', en_json({
+            'nb_ventes': nb_ventes,
+            'ca_total': round(ca_total, 2),
+            'montant_moyen': round(ca_total / nb_ventes, 2) if nb_ventes else None,
+            'quantite_moyenne': round(quantite_totale / nb_ventes, 2) if nb_ventes else None,
+        })
+
+    async def produits(self, params, marqueur):
+        limite = entier(params, 'limite', 10)
+        _, produits_ca, _, _, _ = await self.analyse(marqueur)
+        return 'application/json', en_json(tableau(produits_ca.head(limite)))
+
+    async def categories(self, params, marqueur):
+        _, _, categories_ca, _, _ = await self.analyse(marqueur)
+        categories = categories_ca.copy()
+        categories.columns = ['quantite', 'montant_total', 'nb_ventes']
+        return 'application/json', en_json(tableau(categories))
+
+    async def ca_mensuel(self, params, marqueur):
+        _, _, _, ca_mensuel, _ = await self.analyse(marqueur)
+        return 'application/json', en_json(tableau(ca_mensuel))
+
+    async def clients(self, params, marqueur):
+        limite = entier(params, 'limite', 10)
+        _, _, _, _, ventes_client = await self.analyse(marqueur)
+        return 'application/json', en_json(tableau(ventes_client.head(limite)))
+
+    async def periode(self, params, marqueur):
+        granularite = params.get('granularite', ['mois'])[0]
+        if granularite not in GRANULARITES:
+            raise ErreurRequete(f"granularite doit valoir {', '.join(GRANULARITES)}")
+        debut, fin = params.get('debut', [None])[0], params.get('fin', [None])[0]
+        try:
+            rapport = await self.en_thread(rapport_periode, debut, fin, granularite)
+        except ValueError as e:
+            raise ErreurRequete(str(e))
+        rapport.index = rapport.index.strftime('%Y-%m-%d')
+        return 'application/json', en_json(tableau(rapport))
+
+    async def classement(self, params, marqueur):
+        dimension = params.get('dimension', ['produit'])[0]
+        if dimension not in DIMENSIONS:
+            raise ErreurRequete(f"dimension doit valoir {', '.join(DIMENSIONS)}")
+        k = entier(params, 'k', 10, maximum=1000)
+
+        def calculer(conn):
+            classement = top_k_sql(conn, k, dimension)
+            libelles = noms(conn, dimension, [cle for cle, _ in classement])
+            return [{'rang': rang, 'id': cle, 'nom': libelles.get(cle), 'ca': round(ca, 2)}
+                    for rang, (cle, ca) in enumerate(classement, 1)]
+        return 'application/json', en_json(await self.en_thread(calculer))
+
+    async def graphiques(self, params, marqueur, fichier=None):
+        if fichier is None:
+            return 'application/json', en_json([f'/graphiques/{nom}' for nom, _, _ in visualisation.GRAPHIQUES])
+        graphique = next((g for g in visualisation.GRAPHIQUES if g[0] == fichier), None)
+        if graphique is None:
+            raise ErreurRequete(f"graphique inconnu : {fichier}", statut=404)
+        _, tracer, cle = graphique
+        donnees = await self.donnees_graphiques(marqueur)
+        image = await asyncio.get_running_loop().run_in_executor(self.rendu, rendre_png, tracer, donnees[cle])
+        return 'image/png', image
+
+    async def sante(self):
+        return 'application/json', en_json({
+            'uptime': round(time.time() - self.debut, 1),
+            'requetes': self.nb_requetes,
+            'memo': {'entrees': len(self.memo.entrees), 'succes': self.memo.succes, 'echecs': self.memo.echecs,
+                     'regroupees': self.memo.regroupees, 'en_cours': len(self.memo.en_cours)},
+        })
+
+    async def traiter(self, methode, cible):
+        """Retourne (statut, type de contenu, corps) de la requête"""
+        if methode != 'GET':
+            return 405, 'application/json', en_json({'erreur': 'seule la méthode GET est acceptée'})
+        url = urlsplit(cible)
+        params = parse_qs(url.query)
+        chemin = url.path.rstrip('/') or '/'
+        if chemin == '/sante':
+            return (200, *await self.sante())
+
+        route, arguments = self.routes.get(chemin), ()
+        if route is None and chemin.startswith('/graphiques/'):
+            route, arguments = self.graphiques, (chemin[len('/graphiques/'):],)
+        if route is None:
+            return 404, 'application/json', en_json({'erreur': f"page inconnue : {chemin}", 'pages': list(self.routes)})
+
+        # Une réponse par page et paramètres (dans un ordre canonique) et par état de la base
+        cle = (chemin, tuple(sorted((nom, tuple(valeurs)) for nom, valeurs in params.items())))
+        marqueur = self.marqueur()
+        try:
+            type_contenu, corps = await self.memo.obtenir(cle, marqueur,
+                                                          lambda: route(params, marqueur, *arguments))
+            return 200, type_contenu, corps
+        except ErreurRequete as e:
+            return e.statut, 'application/json', en_json({'erreur': str(e)})
+        except Exception as e:
+            return 500, 'application/json', en_json({'erreur': f"{type(e).__name__}: {e}"})
+
+    async def servir_client(self, reader, writer):
+        """Une connexion HTTP/1.1, éventuellement persistante (keep-alive)"""
+        try:
+            while True:
+                ligne = await reader.readline()
+                if not ligne:
+                    break
+                try:
+                    methode, cible, version = ligne.decode('latin-1').split()
+                except ValueError:
+                    break
+                entetes = {}
+                while True:
+                    entete = await reader.readline()
+                    if entete in (b'\r\n', b'\n', b''):
+                        break
+                    nom, _, valeur = entete.decode('latin-1').partition(':')
+                    entetes[nom.strip().lower()] = valeur.strip().lower()
+
+                self.nb_requetes += 1
+                statut, type_contenu, corps = await self.traiter(methode, cible)
+                persistante = version == 'HTTP/1.1' and entetes.get('connection') != 'close'
+                writer.write(f"HTTP/1.1 {statut} {STATUTS[statut]}\r\n"
+                             f"Content-Type: {type_contenu}"
+                             f"{'; charset=utf-8' if type_contenu == 'application/json' else ''}\r\n"
+                             f"Content-Length: {len(corps)}\r\n"
+                             f"Connection: {'keep-alive' if persistante else 'close'}\r\n\r\n".encode('latin-1')
+                             + corps)
+                await writer.drain()
+                if not persistante:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def precalculer(self):
+        """Calcule les pages par défaut pour l'état courant de la base"""
+        debut = time.perf_counter()
+        resultats = await asyncio.gather(*(self.traiter('GET', page) for page in PAGES_PRECALCULEES))
+        erreurs = [page for page, (statut, _, _) in zip(PAGES_PRECALCULEES, resultats) if statut != 200]
+        print(f"{len(PAGES_PRECALCULEES) - len(erreurs)} page(s) précalculée(s) en "
+              f"{time.perf_counter() - debut:.2f} s" + (f", erreurs : {', '.join(erreurs)}" if erreurs else ""))
+
+    async def surveiller(self, intervalle=INTERVALLE_SURVEILLANCE):
+        """Recalcule les pages par défaut dès que la base change"""
+        marqueur = self.marqueur()
+        await self.precalculer()
+        while True:
+            await asyncio.sleep(intervalle)
+            if self.marqueur() != marqueur:
+                marqueur = self.marqueur()
+                await self.precalculer()
+
+    async def demarrer(self, hote=HOTE, port=PORT):
+        serveur = await asyncio.start_server(self.servir_client, hote, port, backlog=1024)
+        print(f"Serveur des rapports sur http://{hote}:{port}/ (base {self.chemin_bdd})", flush=True)
+        surveillance = asyncio.ensure_future(self.surveiller())
+        try:
+            async with serveur:
+                await serveur.serve_forever()
+        finally:
+            surveillance.cancel()
+            self.executor.shutdown(wait=False)
+            self.rendu.shutdown(wait=False)
+            self.pool.fermer()
+            if self.conn_version is not None:
+                self.conn_version.close()
+            if self.ecrivain is not None:
+                self.ecrivain.fermer()
+
+def servir(chemin_bdd=CHEMIN_BDD, hote=HOTE, port=PORT, nb_threads=4, ttl=TTL):
+    try:
+        asyncio.run(ServeurRapports(chemin_bdd, nb_threads, ttl).demarrer(hote, port))
+    except KeyboardInterrupt:
+        print("Serveur arrêté.")
+
+# Test de charge : nb_clients connexions persistantes envoient chacune
+# nb_requetes requêtes, réparties sur les pages données, séparées par une
+# pause aléatoire de pause secondes en moyenne (un tableau de bord qui
+# interroge le serveur) ; pause=0 mesure le serveur saturé. Une seconde
+# phase mesure le serveur pendant que la base change : une vente est
+# ajoutée toutes les INTERVALLE_INVALIDATION secondes, chaque commit
+# invalide les réponses mémorisées et les clients qui demandent la même
+# page pendant son recalcul sont regroupés (voir Memo).
+PAUSE = 0.5
+INTERVALLE_INVALIDATION = 1.0   # en secondes
+
+PAGES_CHARGE = ['/stats', '/produits', '/categories', '/ca_mensuel', '/clients?limite=20', '/classement',
+                '/classement?dimension=client&k=5', '/periode', '/periode?granularite=semaine']
+
+def percentile(valeurs, p):
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(p / 100 * len(valeurs)))] if valeurs else 0.0
+
+async def client_charge(hote, port, pages, nb_requetes, decalage, pause, latences, erreurs):
+    # Départs étalés sur la première pause
+    await asyncio.sleep(random.uniform(0, pause))
+    try:
+        reader, writer = await asyncio.open_connection(hote, port)
+    except OSError as e:
+        erreurs.append(str(e))
+        return
+    try:
+        for i in range(nb_requetes):
+            if i:
+                await asyncio.sleep(random.uniform(0, 2 * pause))
+            page = pages[(decalage + i) % len(pages)]
+            debut = time.perf_counter()
+            writer.write(f"GET {page} HTTP/1.1\r\nHost: {hote}\r\n\r\n".encode('latin-1'))
+            await writer.drain()
+            statut = int((await reader.readline()).split()[1])
+            longueur = 0
+            while True:
+                entete = await reader.readline()
+                if entete in (b'\r\n', b''):
+                    break
+                if entete.lower().startswith(b'content-length:'):
+                    longueur = int(entete.split(b':')[1])
+            await reader.readexactly(longueur)
+            latences.append(time.perf_counter() - debut)
+            if statut != 200:
+                erreurs.append(f"{page} : {statut}")
+    except (ConnectionError, asyncio.IncompleteReadError, IndexError, ValueError) as e:
+        erreurs.append(f"{type(e).__name__}: {e}")
+    finally:
+        writer.close()
+
+async def tester_charge(hote=HOTE, port=PORT, nb_clients=300, nb_requetes=20, pause=PAUSE, pages=PAGES_CHARGE):
+    """Lance nb_clients clients simultanés ; retourne les latences (p50, p95, p99) et le débit"""
+    latences, erreurs = [], []
+    debut = time.perf_counter()
+    await asyncio.gather(*(client_charge(hote, port, pages, nb_requetes, num, pause, latences, erreurs)
+                           for num in range(nb_clients)))
+    duree = time.perf_counter() - debut
+    return {
+        'clients': nb_clients,
+        'requetes': len(latences),
+        'erreurs': len(erreurs),
+        'requetes_par_seconde': len(latences) / duree,
+        'p50_ms': percentile(latences, 50) * 1000,
+        'p95_ms': percentile(latences, 95) * 1000,
+        'p99_ms': percentile(latences, 99) * 1000,
+        'max_ms': max(latences, default=0.0) * 1000,
+        'exemples_erreurs': erreurs[:5],
+    }
+
+def ajouter_ventes(chemin_bdd, intervalle, arret, ajoutees):
+    """Ajoute une vente (copie de la première) toutes les intervalle secondes jusqu'à arret.set()
+
+    Exécuté dans un thread pendant la phase d'invalidation ; ajoutees reçoit
+    le nombre de commits.
+    """
+    conn = ouvrir_connexion(chemin_bdd)
+    colonne_date = 'jour_vente' if utilise_dates_compactes(conn) else 'date_vente'
+    insertion = f"""
+    INSERT INTO Ventes (id_produit, id_client, {colonne_date}, quantite, montant_total, mode_paiement)
+    SELECT id_produit, id_client, {colonne_date}, quantite, montant_total, mode_paiement
+    FROM Ventes ORDER BY id_vente LIMIT 1
+    """
+    while not arret.wait(intervalle):
+        conn.execute(insertion)
+        conn.commit()
+        ajoutees.append(1)
+    conn.close()
+
+def lire_sante(hote, port):
+    """Compteurs du Memo du serveur (page /sante)"""
+    import urllib.request
+
+    with urllib.request.urlopen(f"http://{hote}:{port}/sante", timeout=5) as reponse:
+        return json.loads(reponse.read())['memo']
+
+def afficher_charge(titre, resultat, nb_requetes):
+    print(f"\n{titre} : {resultat['clients']} clients x {nb_requetes} requêtes : {resultat['requetes']} réponses, "
+          f"{resultat['erreurs']} erreur(s), {resultat['requetes_par_seconde']:,.0f} requêtes/s")
+    print(f"latence p50 {resultat['p50_ms']:.1f} ms, p95 {resultat['p95_ms']:.1f} ms, "
+          f"p99 {resultat['p99_ms']:.1f} ms, max {resultat['max_ms']:.1f} ms")
+    for erreur in resultat['exemples_erreurs']:
+        print(f"  {erreur}")
+
+def attendre_serveur(hote, port, delai=60.0):
+    """Attend que /sante réponde (serveur lancé dans un autre processus)"""
+    import urllib.request
+
+    fin = time.monotonic() + delai
+    while time.monotonic() < fin:
+        try:
+            with urllib.request.urlopen(f"http://{hote}:{port}/sante", timeout=1) as reponse:
+                if reponse.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"Le serveur http://{hote}:{port}/ ne répond pas")
+
+def charge(hote=HOTE, port=PORT, nb_clients=300, nb_requetes=20, pause=PAUSE, seuil_p99=0.1, demarrer=False,
+           chemin_bdd=CHEMIN_BDD, intervalle_invalidation=INTERVALLE_INVALIDATION):
+    """Test de charge ; avec demarrer=True, le serveur est lancé dans un processus séparé puis arrêté.
+
+    Un premier passage (un client par page précalculée) attend la fin du
+    précalcul ; le passage mesuré vérifie que le p99 reste sous seuil_p99 secondes.
+    Avec demarrer=True et intervalle_invalidation > 0, le serveur sert une
+    copie temporaire de la base et un second passage est mesuré pendant
+    qu'une vente y est ajoutée toutes les intervalle_invalidation secondes
+    (sans seuil de latence : les recalculs sont attendus).
+    Retourne True si le p99 du régime établi est sous le seuil et qu'aucune
+    requête n'a échoué.
+    """
+    import shutil
+    import subprocess
+    import sys
+    import tempfile
+
+    processus = dossier = None
+    invalider = demarrer and intervalle_invalidation > 0
+    if invalider:
+        # Les ventes de la phase d'invalidation ne sont pas ajoutées à la vraie base
+        dossier = tempfile.mkdtemp(prefix='charge_')
+        copie = os.path.join(dossier, os.path.basename(chemin_bdd))
+        copier_base(chemin_bdd, copie)
+        chemin_bdd = copie
+    if demarrer:
+        processus = subprocess.Popen([sys.executable, os.path.abspath(__file__), 'servir', '--hote', hote,
+                                      '--port', str(port), '--base', chemin_bdd])
+    try:
+        attendre_serveur(hote, port)
+        # Attend la fin du précalcul (graphiques compris) et calcule une fois
+        # les autres pages du test : seul le régime établi est mesuré
+        pages = list(dict.fromkeys(PAGES_PRECALCULEES + PAGES_CHARGE))
+        amorce = asyncio.run(tester_charge(hote, port, len(pages), 1, 0, pages))
+        print(f"Amorçage : {len(pages)} pages, la plus lente en {amorce['max_ms']:.0f} ms")
+        resultat = asyncio.run(tester_charge(hote, port, nb_clients, nb_requetes, pause))
+
+        if invalider:
+            avant, arret, ajoutees = lire_sante(hote, port), threading.Event(), []
+            ecrivain = threading.Thread(target=ajouter_ventes,
+                                        args=(chemin_bdd, intervalle_invalidation, arret, ajoutees))
+            ecrivain.start()
+            try:
+                invalidation = asyncio.run(tester_charge(hote, port, nb_clients, nb_requetes, pause))
+            finally:
+                arret.set()
+                ecrivain.join()
+            apres = lire_sante(hote, port)
+    finally:
+        if processus is not None:
+            processus.terminate()
+            processus.wait()
+        if dossier is not None:
+            shutil.rmtree(dossier, ignore_errors=True)
+
+    afficher_charge("Régime établi", resultat, nb_requetes)
+    print(f"(seuil p99 {seuil_p99 * 1000:.0f} ms)")
+    if invalider:
+        afficher_charge(f"Base modifiée toutes les {intervalle_invalidation:g} s", invalidation, nb_requetes)
+        print(f"{len(ajoutees)} commit(s) : {apres['echecs'] - avant['echecs']} calcul(s), "
+              f"{apres['regroupees'] - avant['regroupees']} requête(s) regroupée(s) sur un calcul en cours")
+    return (resultat['erreurs'] == 0 and resultat['p99_ms'] <= seuil_p99 * 1000
+            and (not invalider or invalidation['erreurs'] == 0))
+
+def main(argv=None, prog=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog=prog, description="Serveur HTTP des rapports de ventes")
+    parser.add_argument("action", choices=["servir", "charge"],
+                        help="servir : lancer le serveur ; charge : test de charge")
+    parser.add_argument("--hote", default=HOTE)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--base", default=CHEMIN_BDD)
+    parser.add_argument("--threads", type=int, default=4, help="threads (et connexions) SQLite")
+    parser.add_argument("--ttl", type=float, default=TTL, help="durée de vie d'une réponse mémorisée en secondes")
+    parser.add_argument("--clients", type=int, default=300, help="clients simultanés du test de charge")
+    parser.add_argument("--requetes", type=int, default=20, help="requêtes par client")
+    parser.add_argument("--pause", type=float, default=PAUSE,
+                        help="pause moyenne entre deux requêtes d'un client en secondes (0 : sans pause)")
+    parser.add_argument("--seuil-p99", type=float, default=0.1, help="p99 maximal accepté en secondes")
+    parser.add_argument("--demarrer", action="store_true",
+                        help="lancer le serveur le temps du test de charge")
+    parser.add_argument("--invalidation", type=float, default=INTERVALLE_INVALIDATION,
+                        help="avec --demarrer, secondes entre deux ventes ajoutées pendant la phase "
+                             "d'invalidation, sur une copie de la base (0 : pas de phase d'invalidation)")
+    args = parser.parse_args(argv)
+
+    if args.action == "servir":
+        servir(args.base, args.hote, args.port, args.threads, args.ttl)
+    elif not charge(args.hote, args.port, args.clients, args.requetes, args.pause, args.seuil_p99, args.demarrer,
+                    args.base, args.invalidation):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import os
+import sqlite3
+
+# Statistiques de base (nombre de ventes, CA total, panier et quantité
+# moyens) calculées dans SQLite, sans pandas : c'est le chemin rapide de
+# `ventes.py analyse --stats-only`. Ce module ne doit importer que la
+# bibliothèque standard (pas même acces_bdd, dont threading et queue
+# doubleraient le temps de démarrage).
+
+def lire_statistiques(conn):
+    """Retourne (nb_ventes, ca_total, quantite_totale).
+
+    Si les tables d'agrégats existent, les ventes déjà intégrées sont lues
+    dans Agregat_jour_produit et seules les suivantes dans Ventes (plage
+    de id_vente) ; sinon la table Ventes est parcourue en entier.
+    """
+    dernier = 0
+    nb_ventes, ca_total, quantite_totale = 0, 0.0, 0
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Agregats_etat'").fetchone():
+        dernier = conn.execute("SELECT dernier_id_vente FROM Agregats_etat").fetchone()[0]
+        nb_ventes, ca_total, quantite_totale = conn.execute(
+            "SELECT TOTAL(nb_ventes), TOTAL(ca), TOTAL(quantite) FROM Agregat_jour_produit").fetchone()
+    nb, ca, quantite = conn.execute(
+        "SELECT COUNT(*), TOTAL(montant_total), TOTAL(quantite) FROM Ventes WHERE id_vente > ?",
+        (dernier,)).fetchone()
+    return int(nb_ventes + nb), ca_total + ca, int(quantite_totale + quantite)
+
+def afficher_statistiques(nb_ventes, ca_total, quantite_totale):
+    print("\n=== Statistiques de base ===")
+    print(f"Nombre total de ventes: {nb_ventes}")
+    print(f"Chiffre d'affaires total: {ca_total:.2f}€")
+    if nb_ventes:
+        print(f"Montant moyen par vente: {ca_total / nb_ventes:.2f}€")
+        print(f"Quantité moyenne par vente: {quantite_totale / nb_ventes:.2f} articles")
+
+def statistiques_de_base(chemin_bdd='ventes_magasin.db'):
+    """Calcule et affiche les statistiques de base ; retourne (nb_ventes, ca_total, quantite_totale)"""
+    # Même URI en lecture seule que acces_bdd.ouvrir_connexion(lecture_seule=True)
+    conn = sqlite3.connect('file:' + os.path.abspath(chemin_bdd).replace('?', '%3f') + '?mode=ro', uri=True)
+    statistiques = lire_statistiques(conn)
+    conn.close()
+    afficher_statistiques(*statistiques)
+    return statistiques
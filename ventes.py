@@ -0,0 +1,102 @@
+import sys
+
+# Point d'entrée unique : python ventes.py <commande> [options] (voir COMMANDES).
+# Chaque sous-commande n'importe son module (et donc numpy, pandas ou
+# matplotlib) qu'au moment de s'exécuter ; `analyse --stats-only` ne passe
+# que par sqlite3 et la bibliothèque standard.
+COMMANDES = {
+    "generate": "générer des données synthétiques (generation_donnees.py)",
+    "schema": "créer ou modifier le schéma de la base (creation_bdd.py)",
+    "analyse": "analyser les ventes (analyse_ventes.py), --stats-only pour le chemin rapide",
+    "periode": "rapports sur une plage de dates, CA glissant et comparaison annuelle (periodes.py)",
+    "classement": "top-N exact des produits ou clients, validation des modes approchés (classements.py)",
+    "marges": "marges par produit, catégorie et mois, couverture du stock (marges.py)",
+    "serveur": "servir les rapports en HTTP ou lancer le test de charge (serveur.py)",
+    "ingestion": "ingérer les fichiers CSV ou JSONL des caisses (ingestion.py)",
+    "agregats": "créer, rafraîchir ou vérifier les tables d'agrégats (agregats.py)",
+    "export": "exporter les ventes en Arrow IPC partitionné par mois (export_arrow.py)",
+    "benchmark": "banc d'essai de la génération, de l'analyse et des graphiques (benchmark.py)",
+    "plot": "générer les graphiques (visualisation.py)",
+    "all": "schéma, données, analyse et graphiques en une commande",
+}
+
+def commande_all(argv, prog):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog=prog, description="Schéma, données, analyse et graphiques")
+    parser.add_argument("--produits", type=int, default=150)
+    parser.add_argument("--clients", type=int, default=150)
+    parser.add_argument("--ventes", type=int, default=500)
+    parser.add_argument("--graine", type=int, default=None)
+    parser.add_argument("--profil", choices=["defaut", "analytique"], default="defaut",
+                        help="profil du schéma (voir creation_bdd.py)")
+    parser.add_argument("--batch", action="store_true",
+                        help="mode sans affichage : rendu parallèle, aucun plt.show()")
+    parser.add_argument("--processus", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    from creation_bdd import creer_base_de_donnees
+    from generation_donnees import generer_donnees
+    from pipeline import executer_pipeline
+
+    creer_base_de_donnees(args.profil)
+    generer_donnees(args.produits, args.clients, args.ventes, args.graine)
+    # Analyse et graphiques à partir d'une seule lecture de Ventes
+    executer_pipeline(batch=args.batch, nb_processus=args.processus, force=True)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in COMMANDES:
+        print("usage: ventes.py {" + ",".join(COMMANDES) + "} [options]\n")
+        for commande, aide in COMMANDES.items():
+            print(f"  {commande:<11} {aide}")
+        print("\nOptions d'une commande : ventes.py <commande> --help")
+        return 0 if argv and argv[0] in ("-h", "--help") else 2
+
+    commande, options = argv[0], argv[1:]
+    prog = f"ventes.py {commande}"
+    if commande == "analyse" and "--stats-only" in options and len(options) == 1:
+        from statistiques import statistiques_de_base
+        statistiques_de_base()
+    elif commande == "analyse":
+        from analyse_ventes import main as principal
+        principal(options, prog)
+    elif commande == "generate":
+        from generation_donnees import main as principal
+        principal(options, prog)
+    elif commande == "schema":
+        from creation_bdd import main as principal
+        principal(options, prog)
+    elif commande == "periode":
+        from periodes import main as principal
+        principal(options, prog)
+    elif commande == "classement":
+        from classements import main as principal
+        principal(options, prog)
+    elif commande == "marges":
+        from marges import main as principal
+        principal(options, prog)
+    elif commande == "serveur":
+        from serveur import main as principal
+        principal(options, prog)
+    elif commande == "ingestion":
+        from ingestion import main as principal
+        principal(options, prog)
+    elif commande == "agregats":
+        from agregats import main as principal
+        principal(options, prog)
+    elif commande == "export":
+        from export_arrow import main as principal
+        principal(options, prog)
+    elif commande == "benchmark":
+        from benchmark import main as principal
+        principal(options, prog)
+    elif commande == "plot":
+        from visualisation import main as principal
+        principal(options, prog)
+    else:
+        commande_all(options, prog)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
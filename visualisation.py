@@ -1,39 +1,31 @@
 # scripts/04_visualisation_complete.py
-import sqlite3
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from matplotlib.ticker import FuncFormatter
+from cache_requetes import CacheRequetes
+import instrumentation
+from instrumentation import mesurer, chronometrer_sauvegardes, vider_processus_fils
+from agregats import rafraichir_si_actifs
+from rapports import requetes_rapports
 
-# Configuration de style
-sns.set_style("whitegrid")
-plt.rcParams['figure.figsize'] = (12, 6)
-sns.set_palette("husl")
+def appliquer_style():
+    """Configuration de style, appliquée au moment du rendu et non à l'import du module"""
+    sns.set_style("whitegrid")
+    plt.rcParams['figure.figsize'] = (12, 6)
+    sns.set_palette("husl")
 
 def formatter_euros(x, pos):
     """Formate les nombres en euros"""
     return f'€{x:,.0f}'
 
-def generate_visualizations():
-    # Connexion à la base de données
-    conn = sqlite3.connect('ventes_magasin.db')
-    
-    # ==============================================
-    # VISUALISATIONS OBLIGATOIRES (ÉTAPE 5 DU TP)
-    # ==============================================
-
-    # 1. Évolution temporelle des ventes (Graphique en courbe)
-    print("Génération des visualisations obligatoires...")
-    query_ca_mensuel = """
-    SELECT strftime('%Y-%m', date_vente) as mois, 
-           SUM(montant_total) as ca_total,
-           COUNT(id_vente) as nb_ventes
-    FROM Ventes
-    GROUP BY strftime('%Y-%m', date_vente)
-    ORDER BY mois
-    """
-    df_mois = pd.read_sql_query(query_ca_mensuel, conn)
-    
+def tracer_evolution_mensuelle(df_mois, fichier):
+    """1. Évolution temporelle des ventes (Graphique en courbe)"""
     fig, ax1 = plt.subplots(figsize=(14, 7))
     
     ax1.plot(df_mois['mois'], df_mois['ca_total'], 
@@ -57,22 +49,10 @@ def generate_visualizations():
     
     plt.xticks(rotation=45)
     plt.tight_layout()
-    plt.savefig('1_evolution_mensuelle.png', dpi=300, bbox_inches='tight')
-    plt.show()
-    
-    # 2. Répartition des ventes par produit (Diagramme en secteurs)
-    query_top_produits = """
-    SELECT p.nom_produit, 
-           SUM(v.montant_total) as ca_total,
-           SUM(v.quantite) as quantite_totale
-    FROM Ventes v
-    JOIN Produits p ON v.id_produit = p.id_produit
-    GROUP BY p.nom_produit
-    ORDER BY ca_total DESC
-    LIMIT 5
-    """
-    top_produits = pd.read_sql_query(query_top_produits, conn)
-    
+    plt.savefig(fichier, dpi=300, bbox_inches='tight')
+
+def tracer_repartition_produits(top_produits, fichier):
+    """2. Répartition des ventes par produit (Diagramme en secteurs)"""
     plt.figure(figsize=(10, 8))
     explode = (0.05, 0, 0, 0, 0)
     plt.pie(top_produits['ca_total'], 
@@ -83,22 +63,10 @@ def generate_visualizations():
             shadow=True,
             textprops={'fontsize': 10})
     plt.title("Répartition du CA par produit (Top 5)", fontsize=16, pad=20)
-    plt.savefig('2_repartition_produits.png', dpi=300, bbox_inches='tight')
-    plt.show()
-
-
-    query_top_produits = """
-    SELECT p.nom_produit, 
-           SUM(v.montant_total) as ca_total,
-           SUM(v.quantite) as quantite_totale
-    FROM Ventes v
-    JOIN Produits p ON v.id_produit = p.id_produit
-    GROUP BY p.nom_produit
-    ORDER BY ca_total DESC
-    LIMIT 5
-    """
-    top_produits = pd.read_sql_query(query_top_produits, conn)
-    
+    plt.savefig(fichier, dpi=300, bbox_inches='tight')
+
+def tracer_top5_produits(top_produits, fichier):
+    """3. Top 5 des produits par chiffre d'affaires (Barres)"""
     plt.figure(figsize=(10, 6))
     barplot = sns.barplot(data=top_produits, x='ca_total', y='nom_produit', 
                          hue='nom_produit', legend=False, palette='viridis')
@@ -111,24 +79,10 @@ def generate_visualizations():
         barplot.text(value, index, f'€{value:,.0f}', ha='left', va='center', fontsize=10)
     
     plt.tight_layout()
-    plt.savefig('3_top5_produits.png', dpi=300, bbox_inches='tight')
-    plt.show()
-
-    
-    # ==============================================
-    # HEATMAP CORRIGÉE (VERSION À GARDER)
-    # ==============================================
-    query_heatmap = """
-    SELECT 
-        strftime('%w', date_vente) as jour_semaine,
-        strftime('%H', date_vente) as heure,
-        COUNT(id_vente) as nb_ventes
-    FROM Ventes
-    GROUP BY jour_semaine, heure
-    ORDER BY jour_semaine, heure
-    """
-    df_heatmap = pd.read_sql_query(query_heatmap, conn)
+    plt.savefig(fichier, dpi=300, bbox_inches='tight')
 
+def tracer_heatmap(df_heatmap, fichier):
+    """4. Heatmap des ventes par heure et jour de semaine"""
     df_heatmap['nb_ventes'] = pd.to_numeric(df_heatmap['nb_ventes'])
     df_heatmap['jour_semaine'] = pd.to_numeric(df_heatmap['jour_semaine'])
     df_heatmap['heure'] = pd.to_numeric(df_heatmap['heure'])
@@ -165,24 +119,10 @@ def generate_visualizations():
     ax.add_patch(plt.Rectangle((1, 0), 1, 24, fill=False, edgecolor='blue', lw=2, linestyle='--'))  # Lundi
 
     plt.tight_layout()
-    plt.savefig('4_heatmap_ventes_corrigee.png', dpi=300, bbox_inches='tight')
-    plt.show()
-
-    # ==============================================
-    # ANALYSE DES CLIENTS
-    # ==============================================
-    query_clients = """
-    SELECT 
-        c.frequence_achat,
-        COUNT(v.id_vente) as nb_achats,
-        SUM(v.montant_total) as ca_total,
-        AVG(v.montant_total) as panier_moyen
-    FROM Ventes v
-    JOIN Clients c ON v.id_client = c.id_client
-    GROUP BY c.frequence_achat
-    """
-    df_clients = pd.read_sql_query(query_clients, conn)
-    
+    plt.savefig(fichier, dpi=300, bbox_inches='tight')
+
+def tracer_analyse_clients(df_clients, fichier):
+    """5. Analyse des ventes par type de client"""
     fig, axes = plt.subplots(1, 3, figsize=(18, 6))
     
     sns.barplot(data=df_clients, x='frequence_achat', y='nb_achats', ax=axes[0])
@@ -203,42 +143,180 @@ def generate_visualizations():
     
     plt.suptitle('Analyse des ventes par type de client', fontsize=16, y=1.05)
     plt.tight_layout()
-    plt.savefig('5_analyse_clients.png', dpi=300, bbox_inches='tight')
-    plt.show()
+    plt.savefig(fichier, dpi=300, bbox_inches='tight')
+
+def tracer_top5_clients(top_clients, fichier):
+    """6. Top 5 des clients par chiffre d'affaires (Barres)"""
+    plt.figure(figsize=(10, 6))
+    barplot = sns.barplot(data=top_clients, x='ca_total', y='nom', 
+                        hue='nom', legend=False, palette='rocket')
+    plt.title("Top 5 des clients par chiffre d'affaires", fontsize=16, pad=20)
+    plt.xlabel("Chiffre d'affaires (€)", fontsize=12)
+    plt.ylabel("Client", fontsize=12)
+    barplot.xaxis.set_major_formatter(FuncFormatter(formatter_euros))
+    
+    for index, value in enumerate(top_clients['ca_total']):
+        barplot.text(value, index, f'€{value:,.0f}', ha='left', va='center', fontsize=10)
+    
+    plt.tight_layout()
+    plt.savefig(fichier, dpi=300, bbox_inches='tight')
+
+# Graphiques à produire : (fichier, fonction de tracé, clé des données)
+GRAPHIQUES = [
+    ('1_evolution_mensuelle.png', tracer_evolution_mensuelle, 'ca_mensuel'),
+    ('2_repartition_produits.png', tracer_repartition_produits, 'top_produits'),
+    ('3_top5_produits.png', tracer_top5_produits, 'top_produits'),
+    ('4_heatmap_ventes_corrigee.png', tracer_heatmap, 'heatmap'),
+    ('5_analyse_clients.png', tracer_analyse_clients, 'clients'),
+    ('6_top5_clients.png', tracer_top5_clients, 'top_clients'),
+]
 
+FICHIER_MANIFESTE = '.manifeste_graphiques.json'
+
+def empreinte_code(code, h):
+    """Ajoute à h le bytecode et les constantes de code, fonctions imbriquées comprises"""
+    h.update(code.co_code)
+    for constante in code.co_consts:
+        if hasattr(constante, 'co_code'):
+            empreinte_code(constante, h)
+        else:
+            h.update(repr(constante).encode())
+
+def empreinte_graphique(tracer, donnees):
+    """Empreinte des données d'entrée et du code de tracé (qui porte les paramètres de rendu)"""
+    h = hashlib.sha256()
+    h.update(tracer.__name__.encode())
+    empreinte_code(tracer.__code__, h)
+    h.update(repr(list(donnees.columns)).encode())
+    h.update(pd.util.hash_pandas_object(donnees, index=True).values.tobytes())
+    return h.hexdigest()
+
+def lire_manifeste():
+    if not os.path.exists(FICHIER_MANIFESTE):
+        return {}
+    with open(FICHIER_MANIFESTE) as f:
+        return json.load(f)
+
+def ecrire_manifeste(manifeste):
+    with open(FICHIER_MANIFESTE + '.tmp', 'w') as f:
+        json.dump(manifeste, f, indent=2)
+    os.replace(FICHIER_MANIFESTE + '.tmp', FICHIER_MANIFESTE)
+
+def executer_graphique(fichier, tracer, donnees, afficher=False):
+    """Trace et enregistre un graphique ; retourne (fichier, durée en secondes, erreur éventuelle)"""
+    debut = time.perf_counter()
     try:
-            query_top_clients = """
-            SELECT c.nom, 
-                SUM(v.montant_total) as ca_total,
-                COUNT(v.id_vente) as nb_achats
-            FROM Ventes v
-            JOIN Clients c ON v.id_client = c.id_client
-            GROUP BY c.nom
-            ORDER BY ca_total DESC
-            LIMIT 5
-            """
-            top_clients = pd.read_sql_query(query_top_clients, conn)
-            
-            plt.figure(figsize=(10, 6))
-            barplot = sns.barplot(data=top_clients, x='ca_total', y='nom', 
-                                hue='nom', legend=False, palette='rocket')
-            plt.title("Top 5 des clients par chiffre d'affaires", fontsize=16, pad=20)
-            plt.xlabel("Chiffre d'affaires (€)", fontsize=12)
-            plt.ylabel("Client", fontsize=12)
-            barplot.xaxis.set_major_formatter(FuncFormatter(formatter_euros))
-            
-            for index, value in enumerate(top_clients['ca_total']):
-                barplot.text(value, index, f'€{value:,.0f}', ha='left', va='center', fontsize=10)
-            
-            plt.tight_layout()
-            plt.savefig('6_top5_clients.png', dpi=300, bbox_inches='tight')
+        with mesurer(f"rendu {fichier}", 'matplotlib'), chronometrer_sauvegardes(fichier):
+            tracer(donnees, fichier)
+        if afficher:
             plt.show()
+        erreur = None
     except Exception as e:
-            print(f"Erreur lors de la génération du graphique des clients: {str(e)}")
-    
-    conn.close()
-    print("Visualisations générées avec succès")
-    
+        erreur = str(e)
+    finally:
+        plt.close('all')
+        # Processus de rendu : les mesures sont transmises au profil principal
+        vider_processus_fils()
+    return fichier, time.perf_counter() - debut, erreur
+
+def initialiser_processus():
+    """Backend sans affichage et style des graphiques pour les processus de rendu"""
+    plt.switch_backend('Agg')
+    appliquer_style()
+
+def generate_visualizations(utiliser_cache=True, batch=False, nb_processus=None, force=False):
+    """Génère les six graphiques.
+
+    Les données sont lues une seule fois (voir CacheRequetes), puis chaque
+    graphique est tracé indépendamment. En mode batch, le backend Agg est
+    utilisé, plt.show() n'est jamais appelé et les graphiques sont rendus en
+    parallèle dans nb_processus processus (par défaut, un par cœur).
+
+    Un graphique dont l'empreinte (données et code de tracé) n'a pas changé
+    depuis le dernier rendu enregistré dans FICHIER_MANIFESTE n'est pas
+    regénéré, sauf avec force=True.
+    """
+    # Accès à la base via le cache des requêtes : SQLite n'est ouvert que si
+    # la base a changé depuis la dernière exécution
+    # Sans nouvelle vente, rien n'est écrit : le cache des requêtes reste valable
+    rafraichir_si_actifs('ventes_magasin.db')
+    base = CacheRequetes('ventes_magasin.db', actif=utiliser_cache)
+    requetes = base.appeler('requetes_rapports', requetes_rapports)
+
+    print("Génération des visualisations obligatoires...")
+    donnees = {cle: base.lire(requete) for cle, requete in requetes.items()}
+    base.fermer()
+    base.afficher_statistiques()
+
+    rendre_graphiques(donnees, batch=batch, nb_processus=nb_processus, force=force)
+
+def rendre_graphiques(donnees, batch=False, nb_processus=None, force=False):
+    """Trace les graphiques de GRAPHIQUES à partir de donnees (DataFrames indexés par clé).
+
+    Utilisé par generate_visualizations() et par pipeline.py, qui calcule
+    les mêmes DataFrames en une seule lecture des ventes.
+    """
+    appliquer_style()
+
+    # Sélection des graphiques dont les entrées ont changé
+    manifeste = lire_manifeste()
+    empreintes = {fichier: empreinte_graphique(tracer, donnees[cle]) for fichier, tracer, cle in GRAPHIQUES}
+    a_generer = [(fichier, tracer, cle) for fichier, tracer, cle in GRAPHIQUES
+                 if force or manifeste.get(fichier) != empreintes[fichier] or not os.path.exists(fichier)]
+    ignores = [fichier for fichier, _, _ in GRAPHIQUES if fichier not in {g[0] for g in a_generer}]
+
+    debut = time.perf_counter()
+    resultats = []
+    if batch and a_generer:
+        initialiser_processus()
+        with ProcessPoolExecutor(max_workers=nb_processus, initializer=initialiser_processus) as executor:
+            taches = [executor.submit(executer_graphique, fichier, tracer, donnees[cle])
+                      for fichier, tracer, cle in a_generer]
+            # Chaque graphique est écrit par son processus dès qu'il est prêt
+            for tache in as_completed(taches):
+                resultats.append(tache.result())
+                afficher_resultat_graphique(*resultats[-1])
+    else:
+        for fichier, tracer, cle in a_generer:
+            resultats.append(executer_graphique(fichier, tracer, donnees[cle], afficher=not batch))
+            afficher_resultat_graphique(*resultats[-1])
+
+    # Seuls les rendus réussis sont enregistrés dans le manifeste
+    for fichier, _, erreur in resultats:
+        if erreur is None:
+            manifeste[fichier] = empreintes[fichier]
+    ecrire_manifeste(manifeste)
+
+    if ignores:
+        print(f"{len(ignores)} graphique(s) inchangé(s), non regénéré(s) : {', '.join(ignores)}")
+    print(f"Visualisations générées avec succès en {time.perf_counter() - debut:.2f} s")
+
+def afficher_resultat_graphique(fichier, duree, erreur):
+    if erreur:
+        print(f"Erreur lors de la génération du graphique {fichier}: {erreur}")
+    else:
+        print(f"{fichier} : {duree:.2f} s")
+
+def main(argv=None, prog=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog=prog, description="Génération des graphiques de ventes")
+    parser.add_argument("--sans-cache", action="store_true", help="ne pas utiliser le cache des requêtes")
+    parser.add_argument("--batch", action="store_true",
+                        help="mode sans affichage : rendu parallèle, aucun plt.show()")
+    parser.add_argument("--processus", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="regénérer tous les graphiques")
+    parser.add_argument("--profil", action="store_true",
+                        help="chronométrer SQL, pandas et graphiques (profil JSON et trace Chrome dans profils/)")
+    parser.add_argument("--seuil-lent", type=float, default=0.5, help="durée en secondes d'une requête lente")
+    args = parser.parse_args(argv)
+
+    if args.profil:
+        instrumentation.activer(seuil_lent=args.seuil_lent)
+    generate_visualizations(utiliser_cache=not args.sans_cache, batch=args.batch, nb_processus=args.processus,
+                            force=args.force)
+    if args.profil:
+        instrumentation.terminer()
 
 if __name__ == "__main__":
-    generate_visualizations()
+    main()